@@ -1,12 +1,15 @@
 from datetime import datetime, timezone
-from sqlalchemy import String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import String, Boolean, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from app.shared.db import Base
-import uuid, json
+from app.shared.jsoncol import JsonText
+import uuid
 
 def _id32() -> str:
     return uuid.uuid4().hex  # 32 chars
 
+PREVIEW_CHARS = 200
+
 class Conversation(Base):
     __tablename__ = "conversations"
     id: Mapped[str] = mapped_column(String(32), primary_key=True, default=_id32)
@@ -15,6 +18,16 @@ class Conversation(Base):
     archived: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    # denormalized from the newest message, so inbox listings need no per-row message query
+    last_message_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_message_role: Mapped[str] = mapped_column(String(16), nullable=True)
+    last_message_preview: Mapped[str] = mapped_column(String(200), nullable=True)
+    # set while the messages are in the cold archive (app/shared/retention.py)
+    cold_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_conversations_user_archived_created_id", "user_id", "archived", "created_at", "id"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -22,17 +35,12 @@ class Message(Base):
     conversation_id: Mapped[str] = mapped_column(String(32), ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
     role: Mapped[str] = mapped_column(String(16), default="user")  # user|assistant|system
     text: Mapped[str] = mapped_column(Text, default="")
-    # store attachments as JSON text for SQLite; service will dump/load list[str]
+    # store attachments as JSON text for SQLite; read/write list[str] through .attachments
     attachments_json: Mapped[str] = mapped_column(Text, default="[]")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
-    @property
-    def attachments(self) -> list[str]:
-        try:
-            return json.loads(self.attachments_json or "[]")
-        except Exception:
-            return []
+    __table_args__ = (
+        Index("ix_messages_conv_created_id", "conversation_id", "created_at", "id"),
+    )
 
-    @attachments.setter
-    def attachments(self, val: list[str]):
-        self.attachments_json = json.dumps(val or [])
+    attachments = JsonText("attachments_json", list)
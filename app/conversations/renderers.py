@@ -0,0 +1,69 @@
+# app/conversations/renderers.py
+"""
+Chat presentation of tool results: tool name -> (args, out) -> SSE events.
+Execution itself lives in app.tools.executor; this only shapes what the
+conversation stream shows once a confirmed tool has run.
+"""
+from typing import Any, Callable
+
+Events = list[tuple[str, dict]]
+
+def _answer(text: str, **extra) -> tuple[str, dict]:
+    return "final_answer", {"text": text, **extra}
+
+def _artifact(kind: str, path: str | None) -> Events:
+    return [("artifact_ready", {"kind": kind, "path": path})] if path else []
+
+def _browser(args: dict, out: dict) -> Events:
+    return _artifact("screenshot", out.get("screenshot_path")) + [
+        _answer(f"Opened {args.get('url')} and captured a screenshot.", artifacts=[out.get("screenshot_path")]),
+    ]
+
+def _email(args: dict, out: dict) -> Events:
+    sent = out.get("status") == "sent"
+    return _artifact("email_draft", out.get("artifact_path")) + [
+        _answer(f"Email {'sent' if sent else 'drafted'} to {args.get('to')}.", artifact=out),
+    ]
+
+def _pdf(args: dict, out: dict) -> Events:
+    return _artifact("pdf", out.get("pdf_path")) + [_answer(f"Generated PDF {out.get('pdf_path')}.", artifact=out)]
+
+def _csv(args: dict, out: dict) -> Events:
+    rows = out.get("rows") or []
+    return _artifact("csv", out.get("normalized_csv_path")) + [_answer(
+        f"CSV preview: {len(rows)} rows. Headers: {', '.join(out.get('headers') or [])}",
+        data={"headers": out.get("headers"), "rows": rows[:5]},
+    )]
+
+def _download(args: dict, out: dict) -> Events:
+    return _artifact("file", out.get("artifact_path")) + [
+        _answer(f"Downloaded file ({out.get('size')} bytes).", artifact=out),
+    ]
+
+RENDERERS: dict[str, Callable[[dict, Any], Events]] = {
+    "browser.screenshot": _browser,
+    "email.draft_send": _email,
+    "pdf.generate": _pdf,
+    "csv.preview": _csv,
+    "places.search": lambda a, o: [_answer(f"Built search links for '{o.get('query')}'.", links=o.get("links", []))],
+    "search.web": lambda a, o: [_answer(f"Search results for '{a.get('q', '')}':", links=o.get("links", []))],
+    "download.fetch": _download,
+    "summarize.document": lambda a, o: [_answer(o.get("summary", ""), meta={"length": o.get("length")})],
+    "sentiment.analyze": lambda a, o: [_answer(f"Sentiment: {o.get('label')}", scores=o.get("scores"))],
+    "todos.create": lambda a, o: [_answer(f"Todo created: {o['title']}", item=o)],
+    "todos.list": lambda a, o: [_answer(f"{len(o)} todo(s).", items=o)],
+    "todos.update": lambda a, o: [_answer(f"Todo updated: {o['id']}", item=o)],
+    "todos.delete": lambda a, o: [_answer("Todo deleted." if o else "Todo not found.")],
+    "notes.create": lambda a, o: [_answer("Note saved.", item=o)],
+    "notes.summarize": lambda a, o: [_answer(o.get("summary", ""), count=o.get("count", 0))],
+    "reminders.create": lambda a, o: [_answer("Reminder set.", item=o)],
+    "calendar.create_event": lambda a, o: [_answer(f"Event created: {o['title']}", item=o)],
+    "calendar.update_event": lambda a, o: [_answer(f"Event updated: {o['id']}", item=o)],
+    "calendar.delete_event": lambda a, o: [_answer("Event deleted." if o else "Event not found.")],
+    "calendar.list_events": lambda a, o: [_answer(f"{len(o)} event(s).", items=o)],
+    "calendar.mark_date": lambda a, o: [_answer(f"Marked {o['date']} as {o['label']}.", marked=o)],
+}
+
+def render(name: str, args: dict, out: Any) -> Events:
+    fn = RENDERERS.get(name)
+    return fn(args, out) if fn else [_answer(f"{name} completed.", data=out)]
@@ -1,7 +1,7 @@
 # add this import
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from typing import Optional, List, Union
 
 class ConversationCreate(BaseModel):
     title: Optional[str] = Field(default="New chat", max_length=200)
@@ -10,6 +10,11 @@ class ConversationUpdate(BaseModel):
     title: Optional[str] = Field(default=None, max_length=200)
     archived: Optional[bool] = None
 
+class LastMessagePreview(BaseModel):
+    role: str
+    text: str
+    created_at: datetime
+
 class ConversationOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     id: str
@@ -18,6 +23,8 @@ class ConversationOut(BaseModel):
     # ↓ Use datetime, not str
     created_at: datetime
     updated_at: datetime | None = None
+    last_message: LastMessagePreview | None = Field(default=None, description="Listing with preview=true only")
+    cold_at: datetime | None = Field(default=None, description="Messages archived; reading them restores them")
 
 class ConversationList(BaseModel):
     items: List[ConversationOut]
@@ -30,16 +37,19 @@ class MessageCreate(BaseModel):
     context_mode: str = Field(default="inline", pattern="^(inline|ingest|none)$")
     context_scope: str = Field(default="message", pattern="^(message|conversation)$")
 
-class MessageOut(BaseModel):
+class MessageLite(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     id: str
     conversation_id: str
     role: str
     text: str
-    attachments: List[str]
     # ↓ Use datetime here too
     created_at: datetime
 
+class MessageOut(MessageLite):
+    attachments: List[str]
+
 class MessageList(BaseModel):
-    items: List[MessageOut]
-    next_cursor: str | None = None
+    items: List[Union[MessageOut, MessageLite]]  # MessageLite for fields=lite
+    prev_cursor: str | None = Field(default=None, description="Pass as `before` for older messages; null at the start")
+    next_cursor: str | None = Field(default=None, description="Pass as `after` for newer messages; null at the end")
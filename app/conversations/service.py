@@ -1,8 +1,11 @@
-from datetime import datetime
+import base64
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import select, desc
-from app.conversations.models import Conversation, Message
+from sqlalchemy import select, desc, tuple_
+from app.conversations.models import PREVIEW_CHARS, Conversation, Message
 from app.conversations.schemas import ConversationCreate, ConversationUpdate
+from app.shared import jsoncol
 
 def create_conversation(db: Session, user_id: str, payload: ConversationCreate) -> Conversation:
     conv = Conversation(user_id=user_id, title=payload.title or "New chat")
@@ -18,19 +21,84 @@ def get_conversation(db: Session, user_id: str, conv_id: str):
     return conv
 
 
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Opaque keyset position: (created_at, id), so rows sharing a timestamp still have a strict order."""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of encode_cursor; ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except Exception:
+        raise ValueError("invalid cursor")
+
 def list_conversations(db: Session, user_id: str, limit: int = 20, cursor: str | None = None):
+    """
+    Newest first, keyset on (created_at, id) over
+    ix_conversations_user_archived_created_id. Returns (rows, next_cursor);
+    next_cursor is None on the last page. Accepts the old ISO-8601
+    created_at cursors too (as "everything older than that instant").
+    Raises ValueError for a malformed cursor.
+    """
+    limit = min(limit, 100)
     stmt = select(Conversation).where(Conversation.user_id == user_id, Conversation.archived == False)
     if cursor:
         try:
-            # cursor is ISO datetime string of created_at; return older items
-            ts = datetime.fromisoformat(cursor)
-            stmt = stmt.where(Conversation.created_at < ts)
-        except Exception:
-            pass
-    stmt = stmt.order_by(desc(Conversation.created_at)).limit(min(limit, 100))
+            ts, row_id = decode_cursor(cursor)
+        except ValueError:
+            ts, row_id = datetime.fromisoformat(cursor), ""  # "" sorts before every id
+        stmt = stmt.where(tuple_(Conversation.created_at, Conversation.id) < tuple_(ts, row_id))
+    stmt = stmt.order_by(desc(Conversation.created_at), desc(Conversation.id)).limit(limit + 1)
     rows = db.scalars(stmt).all()
-    next_cursor = rows[-1].created_at.isoformat() if len(rows) == limit else None
-    return rows, next_cursor
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+_MESSAGE_LITE = (Message.id, Message.conversation_id, Message.role, Message.text, Message.created_at)
+
+def list_messages(db: Session, conversation_id: str, limit: int = 50, before: str | None = None,
+                  after: str | None = None, lite: bool = False):
+    """
+    One page of a conversation's messages, oldest first, by keyset on
+    (created_at, id) over ix_messages_conv_created_id: cost depends on the
+    page size, not on how deep into the history it is. No cursor is the
+    newest page; `before` / `after` page towards older / newer messages.
+    Returns (items, prev_cursor, next_cursor); a cursor is None when there
+    is nothing further that way. Rows are read as plain columns; `lite`
+    also leaves out attachments_json so nothing is JSON-decoded.
+    Raises ValueError for a malformed cursor.
+    """
+    cols = _MESSAGE_LITE if lite else (*_MESSAGE_LITE, Message.attachments_json)
+    key = tuple_(Message.created_at, Message.id)
+    stmt = select(*cols).where(Message.conversation_id == conversation_id)
+    if after:
+        stmt = stmt.where(key > tuple_(*decode_cursor(after))).order_by(Message.created_at, Message.id)
+    else:
+        if before:
+            stmt = stmt.where(key < tuple_(*decode_cursor(before)))
+        stmt = stmt.order_by(desc(Message.created_at), desc(Message.id))
+    rows = db.execute(stmt.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not after:
+        rows.reverse()
+
+    items = []
+    for r in rows:
+        item = {"id": r.id, "conversation_id": r.conversation_id, "role": r.role, "text": r.text, "created_at": r.created_at}
+        if not lite:
+            item["attachments"] = jsoncol.loads(r.attachments_json, list)
+        items.append(item)
+
+    first = encode_cursor(rows[0].created_at, rows[0].id) if rows else None
+    last = encode_cursor(rows[-1].created_at, rows[-1].id) if rows else None
+    if after:  # the cursor row itself is older than this page
+        return items, first or after, last if more else None
+    # before: the cursor row is newer than this page; no cursor: this is the newest page
+    return items, first if more else None, (last or before) if before else None
 
 def update_conversation(db: Session, user_id: str, conv_id: str, payload: ConversationUpdate) -> Conversation | None:
     conv = db.get(Conversation, conv_id)
@@ -52,13 +120,30 @@ def soft_delete_conversation(db: Session, user_id: str, conv_id: str) -> bool:
     db.commit()
     return True
 
+def _new_message(conv: Conversation, text: str, attachments: list[str]) -> Message:
+    msg = Message(conversation_id=conv.id, role="user", text=text, created_at=datetime.now(timezone.utc))
+    msg.attachments = attachments or []
+    conv.last_message_at = msg.created_at
+    conv.last_message_role = msg.role
+    conv.last_message_preview = text[:PREVIEW_CHARS]
+    return msg
+
 def create_message(db: Session, user_id: str, conversation_id: str, text: str, attachments: list[str]) -> Message | None:
     conv = db.get(Conversation, conversation_id)
     if not conv or conv.user_id != user_id or conv.archived:
         return None
-    msg = Message(conversation_id=conversation_id, role="user", text=text)
-    msg.attachments = attachments or []
+    msg = _new_message(conv, text, attachments)
     db.add(msg)
     db.commit()
     db.refresh(msg)
     return msg
+
+async def create_message_async(db: AsyncSession, user_id: str, conversation_id: str, text: str, attachments: list[str]) -> Message | None:
+    conv = await db.get(Conversation, conversation_id)
+    if not conv or conv.user_id != user_id or conv.archived:
+        return None
+    msg = _new_message(conv, text, attachments)
+    db.add(msg)
+    await db.commit()
+    await db.refresh(msg)
+    return msg
@@ -2,9 +2,10 @@ from sqlalchemy.orm import Session
 from app.files.models import File
 from app.files.storage import save_upload, sniff_mime
 from fastapi import UploadFile
+from app.shared.offload import run_cpu
 
 # Text Extraction Service
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, NamedTuple, Tuple
 from app.files.parse_inline import (
     extract_pdf_text, extract_docx_text, extract_csv_or_xlsx, extract_text_file, extract_image_meta
 )
@@ -43,7 +44,22 @@ def get_file_many(db: Session, user_id: str, ids: List[str]) -> List[File]:
             out.append(f)
     return out
 
+class FileRef(NamedTuple):
+    """Picklable stand-in for a File row, so parsing can run in a worker process."""
+    id: str
+    filename: str
+    mime: str | None
+    storage_path: str
+
 def inline_bundle_for_files(files: List[File]) -> dict:
+    return bundle_for_refs([FileRef(f.id, f.filename, f.mime, f.storage_path) for f in files])
+
+async def build_inline_bundle(files: List[File]) -> dict:
+    """inline_bundle_for_files on the CPU pool: pypdf/docx parsing never blocks the event loop."""
+    refs = [FileRef(f.id, f.filename, f.mime, f.storage_path) for f in files]
+    return await run_cpu(bundle_for_refs, refs)
+
+def bundle_for_refs(files: List[FileRef]) -> dict:
     sources: List[Dict[str, Any]] = []
     texts: List[str] = []
     for f in files:
@@ -57,7 +73,7 @@ def inline_bundle_for_files(files: List[File]) -> dict:
             src.setdefault("meta", {})["note"] = "pdf_may_be_scanned_no_text"
     return {"sources": sources, "text": "".join(texts)[:80_000]}
 
-def _extract_for(f: File) -> Tuple[str, dict]:
+def _extract_for(f: FileRef) -> Tuple[str, dict]:
     mime = (f.mime or "").lower()
     path = f.storage_path
     name = f.filename.lower()
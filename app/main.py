@@ -8,6 +8,12 @@ from app.shared.db import Base, engine
 from app.shared.db import run_sqlite_migrations
 from app.shared.config import settings
 from app.shared.auth import issue_dev_token
+from app.shared import sse
+from app.runs import scheduler
+from app.shared import offload
+from app.shared import usage
+from app.shared import idem
+from app.shared import retention
 
 # Guards wall import
 from app.shared.me_api import router as me_router
@@ -37,6 +43,8 @@ from app.tools.search.api import router as search_router
 from app.tools.download.api import router as download_router
 from app.tools.summarize.api import router as summarize_router
 from app.tools.sentiment.api import router as sentiment_router
+from app.tools.batch.api import router as batch_router
+from app.tools.limits import ToolBusy
 
 from app.runs.api import router as runs_router
 
@@ -60,7 +68,31 @@ if os.getenv("ENV", "dev") == "dev":
     @app.exception_handler(Exception)
     async def _dev_ex_handler(request: Request, exc: Exception):
         return JSONResponse(status_code=500, content={"detail": str(exc)})
-    
+
+# Tool routes without their own ToolBusy / deadline handling (todos, notes, calendar, ...)
+@app.exception_handler(ToolBusy)
+async def _tool_busy_handler(request: Request, exc: ToolBusy):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={"detail": {"ok": False, "error": {
+            "code": "tool_busy", "message": "Tool is busy, retry shortly", "details": str(exc)}}},
+    )
+
+# ToolBusy is a TimeoutError too; the more specific handler above wins for it
+@app.exception_handler(TimeoutError)
+async def _tool_timeout_handler(request: Request, exc: TimeoutError):
+    return JSONResponse(
+        status_code=504,
+        content={"detail": {"ok": False, "error": {
+            "code": "tool_timeout", "message": "Tool call timed out", "details": str(exc) or "timed out"}}},
+    )
+
+# Idempotency-Key replays: the stored response, as a normal 200
+@app.exception_handler(idem.IdemReplay)
+async def _idem_replay_handler(request: Request, exc: idem.IdemReplay):
+    return JSONResponse(status_code=200, headers={"Idempotent-Replay": "true"}, content=exc.response)
+
 @app.get("/__debug/loop")
 def _loop_info():
     import asyncio, sys, threading
@@ -86,6 +118,33 @@ def _init_db():
     Base.metadata.create_all(bind=engine)
     run_sqlite_migrations()
 
+@app.on_event("shutdown")
+async def _stop_sse():
+    await sse.shutdown()
+
+@app.on_event("startup")
+async def _start_scheduler():
+    # requeue runs whose lease expired with a crashed/restarted process, then start workers
+    await scheduler.start()
+
+@app.on_event("shutdown")
+async def _stop_scheduler():
+    await scheduler.shutdown()
+    offload.shutdown()
+
+@app.on_event("startup")
+async def _start_retention():
+    retention.start()
+
+@app.on_event("shutdown")
+async def _stop_retention():
+    await retention.shutdown()
+
+@app.on_event("shutdown")
+async def _flush_usage():
+    # after the scheduler: jobs stopping above may still have billed
+    await usage.shutdown()
+
 @app.get("/healthz", tags=["Health"])
 def healthz():
     return {"ok": True}
@@ -129,6 +188,31 @@ from sqlalchemy import inspect
 def _tables():
     return {"tables": inspect(engine).get_table_names()}
 
+@app.get("/__debug/db")
+def _db_stats():
+    from app.shared.db import async_engine, pragmas
+    return {"pragmas": pragmas(), "pool": engine.pool.status(), "async_pool": async_engine.pool.status()}
+
+@app.get("/__debug/sse")
+def _sse_stats():
+    return sse.stats()
+
+@app.get("/__debug/scheduler")
+def _scheduler_stats():
+    return {**scheduler.stats(), "offload": offload.stats()}
+
+@app.get("/__debug/usage")
+def _usage_stats():
+    return usage.stats()
+
+@app.get("/__debug/idem")
+def _idem_stats():
+    return idem.stats()
+
+@app.get("/__debug/retention")
+def _retention_stats():
+    return retention.stats()
+
 # Routers 
 app.include_router(auth_router)
 app.include_router(me_router)
@@ -149,6 +233,7 @@ app.include_router(search_router)
 app.include_router(download_router)
 app.include_router(summarize_router)
 app.include_router(sentiment_router)
+app.include_router(batch_router)
 
 app.include_router(runs_router)
 
@@ -1,9 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.shared.db import get_db
-from app.runs.service import confirm_run, cancel_run
+from app.shared.db import get_async_db, get_db
+from app.runs.service import (
+    cancel_run_async, confirmed_job, create_run_async, finish_run_async, mark_awaiting_confirmation_async,
+)
 from app.runs.models import Run
-from app.shared import sse
+from app.runs.scheduler import SchedulerFull, get_scheduler
+from app.runs.schemas import PlanCreate, RunSummary
+from app.runs import dag
+from app.shared import retention, sse
+from app.shared.config import settings
 
 
 from sqlalchemy import select, desc
@@ -15,28 +22,80 @@ def current_user_id() -> str:  # stub for now
     return "demo-user"
 
 @router.post("/{run_id}/confirm")
-async def api_confirm_run(run_id: str, db: Session = Depends(get_db)):
-    r = confirm_run(db, run_id)
+async def api_confirm_run(run_id: str, db: AsyncSession = Depends(get_async_db)):
+    r = await db.get(Run, run_id)
     if not r: raise HTTPException(404, "Run not found")
+    if r.status != "awaiting_confirmation":
+        return {"ok": True, "run_id": r.id, "status": r.status}
+    try:
+        # same durable queue as a chat "yes"; the pending_payload (or planned) job executes it
+        await get_scheduler().submit_async(db, r, *confirmed_job(r, current_user_id()), tier=settings.DEFAULT_TIER)
+    except SchedulerFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
     # let stream know we've been confirmed
     await sse.publish(r.conversation_id, "confirmation", {"run_id": r.id, "status": "confirmed"})
     return {"ok": True, "run_id": r.id, "status": r.status}
 
+@router.post("/plan", status_code=202)
+async def api_create_plan(payload: PlanCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue a graph plan: registry tool calls whose args may reference earlier
+    nodes' outputs as ${node.key}; independent nodes run concurrently.
+    """
+    from app.conversations.models import Conversation
+    if not await db.get(Conversation, payload.conversation_id):
+        raise HTTPException(404, "Conversation not found")
+    nodes = [n.model_dump() for n in payload.nodes]
+    try:
+        graph = dag.parse_plan(nodes)
+    except dag.PlanError as e:
+        raise HTTPException(400, f"Invalid plan: {e}")
+    cid, tier = payload.conversation_id, settings.DEFAULT_TIER
+    args = {"uid": current_user_id(), "max_parallel": payload.max_parallel}
+    scheduler = get_scheduler()
+    try:
+        await scheduler.admit_async(db, tier)
+    except SchedulerFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+    r = await create_run_async(db, cid, mode="dag", plan=nodes, needs_confirmation=dag.needs_confirmation(graph))
+    await sse.publish(cid, "reasoning_plan", {
+        "steps": list(graph), "run_id": r.id,
+        "graph": {nid: sorted(n.deps) for nid, n in graph.items()},
+    })
+    if r.needs_confirmation:
+        r.job = {"kind": "dag", "args": args}  # what confirm will queue
+        await mark_awaiting_confirmation_async(db, r.id)
+        await sse.publish(cid, "confirm_needed", {
+            "run_id": r.id,
+            "summary": f"Run a {len(graph)}-step plan ({', '.join(sorted({n.tool for n in graph.values()}))}).",
+            "how_to_confirm": {"rest": "POST /runs/{run_id}/confirm", "chat": "reply 'yes'"},
+        })
+        return {"ok": True, "run_id": r.id, "status": r.status}
+    try:
+        await scheduler.submit_async(db, r, "dag", args, tier=tier)
+    except SchedulerFull as e:
+        await finish_run_async(db, r.id, status="failed")
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+    return {"ok": True, "run_id": r.id, "status": r.status}
+
 @router.post("/{run_id}/cancel")
-async def api_cancel_run(run_id: str, db: Session = Depends(get_db)):
-    ok = cancel_run(db, run_id)
+async def api_cancel_run(run_id: str, db: AsyncSession = Depends(get_async_db)):
+    ok = await cancel_run_async(db, run_id)
     if not ok: raise HTTPException(404, "Run not found")
+    r = await db.get(Run, run_id)
+    if r.status != "cancelled":  # it had already finished
+        return {"ok": True, "run_id": run_id, "status": r.status, "stopped": False}
+    # stop the job if it is executing here (its tool calls, subprocesses and downloads with it)
+    stopped = await get_scheduler().cancel(run_id)
     # Inform stream
-    # (we don't have the conversation id without loading; load again quickly)
-    from app.runs.models import Run
-    r = db.get(Run, run_id)
-    if r:
-        await sse.publish(r.conversation_id, "confirmation", {"run_id": run_id, "status": "cancelled"})
-    return {"ok": True, "run_id": run_id, "status": "cancelled"}
+    await sse.publish(r.conversation_id, "confirmation", {"run_id": run_id, "status": "cancelled"})
+    return {"ok": True, "run_id": run_id, "status": "cancelled", "stopped": stopped}
 
 
-@router.get("/by-conversation/{conversation_id}")
+@router.get("/by-conversation/{conversation_id}", response_model=list[RunSummary])
 def runs_for_conversation(conversation_id: str, db: Session = Depends(get_db)):
+    if retention.has_archive(db, conversation_id, "runs"):  # archived by retention: bring them back first
+        retention.restore(conversation_id, kinds=("runs",))
     rows = db.scalars(
         select(Run).where(Run.conversation_id==conversation_id).order_by(desc(Run.started_at)).limit(20)
     ).all()
@@ -0,0 +1,220 @@
+# app/runs/dag.py
+"""
+Run plans as dependency graphs of registry tool calls.
+
+A plan is a list of nodes, e.g. fetch two URLs, then a PDF from both:
+
+    {"id": "a",   "tool": "download.fetch", "args": {"url": "https://..."}}
+    {"id": "b",   "tool": "download.fetch", "args": {"url": "https://..."}}
+    {"id": "pdf", "tool": "pdf.generate",
+     "args": {"markdown": "Files: ${a.artifact_path}, ${b.artifact_path}"}}
+
+A node depends on every node its args reference as `${node.key}` (a whole
+`${node}` is the full output) plus any listed in "after". Nodes whose
+dependencies are done run concurrently, at most `max_parallel` at a time,
+so a fan-out plan takes about as long as its slowest branch. The first
+failure cancels the nodes still in flight and nothing downstream starts.
+"""
+import asyncio, json, re
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.runs.models import Run
+from app.runs.scheduler import job
+from app.runs.timeline import Timeline
+from app.shared import sse
+from app.shared.config import settings
+from app.tools.executor import run_tool
+from app.tools.registry import get_tool
+from app.tools.schema_validator import validate_payload
+
+_REF = re.compile(r"\$\{([A-Za-z0-9_\-]+)((?:\.[A-Za-z0-9_\-]+)*)\}")
+
+class PlanError(ValueError):
+    pass
+
+class NodeFailed(Exception):
+    def __init__(self, node: str, error: BaseException):
+        super().__init__(f"{node}: {type(error).__name__}: {error}")
+        self.node = node
+        self.error = error
+
+class Node(NamedTuple):
+    id: str
+    tool: str
+    args: dict
+    deps: frozenset[str]
+
+def _refs(value: Any) -> set[str]:
+    if isinstance(value, str):
+        return {m.group(1) for m in _REF.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*map(_refs, value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*map(_refs, value)) if value else set()
+    return set()
+
+def parse_plan(raw: list[dict]) -> dict[str, Node]:
+    """Validate a plan (ids, tools, dependencies, no cycles); returns nodes by id in plan order."""
+    nodes: dict[str, Node] = {}
+    for i, item in enumerate(raw or []):
+        if not isinstance(item, dict):
+            raise PlanError(f"node {i}: expected an object")
+        nid, tool, args = item.get("id"), item.get("tool"), item.get("args") or {}
+        if not nid or not isinstance(nid, str):
+            raise PlanError(f"node {i}: missing id")
+        if nid in nodes:
+            raise PlanError(f"duplicate node id {nid!r}")
+        meta = get_tool(tool or "")
+        if not meta:
+            raise PlanError(f"{nid}: unknown tool {tool!r}")
+        deps = frozenset(_refs(args) | set(item.get("after") or []))
+        if not deps:
+            # args with references can only be checked once they are resolved
+            ok, err = validate_payload(meta.get("input_schema"), args)
+            if not ok:
+                raise PlanError(f"{nid}: invalid args for {tool}: {err}")
+        nodes[nid] = Node(nid, tool, args, deps)
+    if not nodes:
+        raise PlanError("plan has no nodes")
+    for n in nodes.values():
+        missing = n.deps - nodes.keys()
+        if missing:
+            raise PlanError(f"{n.id}: depends on unknown node(s) {sorted(missing)}")
+    _check_acyclic(nodes)
+    return nodes
+
+def _check_acyclic(nodes: dict[str, Node]):
+    indegree = {nid: len(n.deps) for nid, n in nodes.items()}
+    ready = [nid for nid, d in indegree.items() if d == 0]
+    seen = 0
+    while ready:
+        done = ready.pop()
+        seen += 1
+        for n in nodes.values():
+            if done in n.deps:
+                indegree[n.id] -= 1
+                if indegree[n.id] == 0:
+                    ready.append(n.id)
+    if seen != len(nodes):
+        raise PlanError(f"plan has a cycle through {sorted(nid for nid, d in indegree.items() if d)}")
+
+def needs_confirmation(nodes: dict[str, Node]) -> bool:
+    return any(get_tool(n.tool).get("needs_confirmation") for n in nodes.values())
+
+def _lookup(results: dict[str, Any], nid: str, path: str) -> Any:
+    value = results[nid]
+    for key in filter(None, path.split(".")):
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            raise PlanError(f"${{{nid}{path}}}: no {key!r} in the output of {nid}")
+    return value
+
+def resolve_args(value: Any, results: dict[str, Any]) -> Any:
+    """Substitute `${node.key}` references with finished nodes' outputs."""
+    if isinstance(value, str):
+        whole = _REF.fullmatch(value)
+        if whole:  # keep the referenced value's type (list, dict, number...)
+            return _lookup(results, whole.group(1), whole.group(2))
+        return _REF.sub(lambda m: str(_lookup(results, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {k: resolve_args(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_args(v, results) for v in value]
+    return value
+
+Call = Callable[[str, dict], Awaitable[Any]]
+Hook = Callable[..., Awaitable[None]]
+
+async def execute(
+    nodes: dict[str, Node],
+    call: Call,
+    max_parallel: int,
+    on_start: Hook | None = None,
+    on_done: Hook | None = None,
+) -> dict[str, Any]:
+    """
+    Run the graph: `call(tool, args)` per node as soon as its dependencies
+    have finished, never more than `max_parallel` at once. Awaits
+    on_start(node, args) / on_done(node, args, out) around each call.
+    Returns node id -> output; raises NodeFailed on the first failure.
+    """
+    waiting = {nid: set(n.deps) for nid, n in nodes.items() if n.deps}
+    ready = [nid for nid, n in nodes.items() if not n.deps]
+    running: dict[asyncio.Task, tuple[str, dict]] = {}
+    results: dict[str, Any] = {}
+    try:
+        while ready or running:
+            while ready and len(running) < max(1, max_parallel):
+                node = nodes[ready.pop(0)]
+                try:
+                    args = resolve_args(node.args, results)
+                except PlanError as e:
+                    raise NodeFailed(node.id, e) from e
+                if on_start:
+                    await on_start(node, args)
+                running[asyncio.create_task(call(node.tool, args))] = (node.id, args)
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                nid, args = running.pop(task)
+                if task.exception() is not None:
+                    raise NodeFailed(nid, task.exception()) from task.exception()
+                results[nid] = task.result()
+                if on_done:
+                    await on_done(nodes[nid], args, results[nid])
+                for other in [o for o, deps in waiting.items() if nid in deps]:
+                    waiting[other].discard(nid)
+                    if not waiting[other]:
+                        del waiting[other]
+                        ready.append(other)
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+    return results
+
+def _jsonable(out: Any) -> Any:
+    return json.loads(json.dumps(out, default=str))
+
+@job("dag")
+async def _execute_dag(run: Run, db: Session):
+    """
+    Executes run.plan as a graph. Every node calls its tool through the
+    shared executor, which opens a session on the offload pool for services
+    that need one (nodes overlap, so they cannot share the run's), and is
+    recorded as a "tool" Step when it starts and when it finishes.
+    """
+    conversation_id, args = run.conversation_id, run.job.get("args") or {}
+    uid = args.get("uid")
+    max_parallel = args.get("max_parallel") or settings.RUN_DAG_PARALLELISM
+    async with Timeline(db, run.id) as tl:
+        nodes = parse_plan(run.plan)
+        tl.step("plan", {"nodes": {nid: sorted(n.deps) for nid, n in nodes.items()}, "max_parallel": max_parallel})
+
+        async def _call(tool: str, tool_args: dict) -> Any:
+            return await run_tool(tool, tool_args, user_id=uid)
+
+        async def _started(node: Node, node_args: dict):
+            tl.step("tool", {"node": node.id, "name": node.tool, "args": node_args}, status="started")
+            await sse.publish(conversation_id, "step_started", {"run_id": run.id, "node": node.id, "tool": node.tool})
+
+        async def _done(node: Node, node_args: dict, out: Any):
+            tl.step("tool", {"node": node.id, "name": node.tool, "result": _jsonable(out)})
+            await sse.publish(conversation_id, "step_completed", {"run_id": run.id, "node": node.id, "tool": node.tool})
+
+        try:
+            results = await execute(nodes, _call, max_parallel, _started, _done)
+        except NodeFailed as e:
+            text = f"Plan step {e.node} failed: {type(e.error).__name__}: {e.error}"
+            await sse.publish(conversation_id, "final_answer", {"text": text})
+            tl.step("final", {"node": e.node, "error": f"{type(e.error).__name__}: {e.error}"}, status="failed")
+            await tl.finish_async("failed"); return
+
+        text = f"Plan finished: {len(results)} steps."
+        await sse.publish(conversation_id, "final_answer", {"text": text, "results": list(results)})
+        tl.step("final", {"text": text})
+        await tl.finish_async("completed")
@@ -1,8 +1,9 @@
 from datetime import datetime, timezone
-from sqlalchemy import String, DateTime, Integer, Text, ForeignKey, Boolean
+from sqlalchemy import String, DateTime, Integer, Text, ForeignKey, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from app.shared.db import Base
-import uuid, json
+from app.shared.jsoncol import JsonText
+import uuid
 
 def _id32() -> str:
     return uuid.uuid4().hex
@@ -11,8 +12,8 @@ class Run(Base):
     __tablename__ = "runs"
     id: Mapped[str] = mapped_column(String(32), primary_key=True, default=_id32)
     conversation_id: Mapped[str] = mapped_column(String(32), ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
-    status: Mapped[str] = mapped_column(String(16), default="running")  # queued|running|awaiting_confirmation|completed|failed|cancelled
-    mode: Mapped[str] = mapped_column(String(16), default="chat")       # chat|qa_rag|task
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending|queued|running|awaiting_confirmation|completed|failed|cancelled
+    mode: Mapped[str] = mapped_column(String(16), default="chat")       # chat|qa_rag|task|dag
     plan_json: Mapped[str] = mapped_column(Text, default="[]")
     # NEW: whether we need confirmation before executing tools
     needs_confirmation: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -22,21 +23,25 @@ class Run(Base):
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    @property
-    def plan(self) -> list[str]:
-        try: return json.loads(self.plan_json or "[]")
-        except Exception: return []
-
-    @plan.setter
-    def plan(self, val: list[str]): self.plan_json = json.dumps(val or [])
-
-    @property
-    def pending_payload(self) -> dict:
-        try: return json.loads(self.pending_payload_json or "{}")
-        except Exception: return {}
-
-    @pending_payload.setter
-    def pending_payload(self, val: dict): self.pending_payload_json = json.dumps(val or {})
+    # Durable queue (app/runs/queue.py): what to execute, and who holds it
+    tier: Mapped[str] = mapped_column(String(16), default="free")
+    job_json: Mapped[str] = mapped_column(Text, default="{}")           # {"kind": ..., "args": {...}}
+    queued_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    lease_owner: Mapped[str] = mapped_column(String(64), nullable=True)
+    lease_expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_runs_claim", "status", "tier", "queued_at"),
+        Index("ix_runs_lease", "status", "lease_expires_at"),
+        Index("ix_runs_conv_status_started", "conversation_id", "status", "started_at"),
+        Index("ix_runs_status_finished", "status", "finished_at"),
+    )
+
+    plan = JsonText("plan_json", list)  # step names, or graph nodes for mode="dag"
+    pending_payload = JsonText("pending_payload_json", dict)
+    job = JsonText("job_json", dict)
 
 class Step(Base):
     __tablename__ = "steps"
@@ -48,13 +53,4 @@ class Step(Base):
     status: Mapped[str] = mapped_column(String(16), default="completed")  # started|completed|failed
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
-    @property
-    def data(self) -> dict:
-        try:
-            return json.loads(self.data_json or "{}")
-        except Exception:
-            return {}
-
-    @data.setter
-    def data(self, val: dict):
-        self.data_json = json.dumps(val or {})
+    data = JsonText("data_json", dict)
@@ -0,0 +1,119 @@
+# app/runs/queue.py
+"""
+Durable run queue on the `runs` table.
+
+A run is created 'pending'; one to execute is a row with status='queued'
+plus job_json ({"kind", "args"}) and a tier. Workers claim one with a single
+UPDATE ... RETURNING over ix_runs_claim (status, tier, queued_at), hold a
+lease they extend with heartbeats while the job runs, and clear it in
+finish_run. Rows whose lease expired (the worker died) go back to
+'queued' until they have used up RUN_MAX_ATTEMPTS.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.runs.models import Run
+from app.shared.config import settings
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _queue(run: Run, kind: str, args: dict | None, tier: str) -> None:
+    run.status = "queued"
+    run.job = {"kind": kind, "args": args or {}}
+    run.tier = tier
+    run.queued_at = _now()
+    run.lease_owner = None
+    run.lease_expires_at = None
+
+def enqueue(db: Session, run: Run, kind: str, args: dict | None = None, tier: str = "free") -> Run:
+    _queue(run, kind, args, tier)
+    db.commit()
+    return run
+
+async def enqueue_async(db: AsyncSession, run: Run, kind: str, args: dict | None = None, tier: str = "free") -> Run:
+    _queue(run, kind, args, tier)
+    await db.commit()
+    return run
+
+def _depth(tier: str | None):
+    stmt = select(func.count()).select_from(Run).where(Run.status == "queued")
+    if tier is not None:
+        stmt = stmt.where(Run.tier == tier)
+    return stmt
+
+def depth(db: Session, tier: str | None = None) -> int:
+    return db.scalar(_depth(tier)) or 0
+
+async def depth_async(db: AsyncSession, tier: str | None = None) -> int:
+    return await db.scalar(_depth(tier)) or 0
+
+def backlog(db: Session) -> dict[str, tuple[int, datetime | None]]:
+    """tier -> (queued runs, oldest queued_at)"""
+    rows = db.execute(
+        select(Run.tier, func.count(), func.min(Run.queued_at)).where(Run.status == "queued").group_by(Run.tier)
+    )
+    return {tier: (n, oldest) for tier, n, oldest in rows}
+
+def claim(db: Session, owner: str, tier: str | None = None, lease_s: float | None = None) -> str | None:
+    """Atomically take the oldest queued run (of `tier`, if given); returns its id."""
+    now = _now()
+    oldest = select(Run.id).where(Run.status == "queued")
+    if tier is not None:
+        oldest = oldest.where(Run.tier == tier)
+    oldest = oldest.order_by(Run.queued_at).limit(1).scalar_subquery()
+    stmt = (
+        update(Run)
+        .where(Run.id == oldest, Run.status == "queued")
+        .values(
+            status="running",
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=lease_s or settings.RUN_LEASE_S),
+            heartbeat_at=now,
+            attempts=Run.attempts + 1,
+        )
+        .returning(Run.id)
+    )
+    run_id = db.execute(stmt, execution_options={"synchronize_session": False}).scalar()
+    db.commit()
+    return run_id
+
+def heartbeat(db: Session, run_id: str, owner: str, lease_s: float | None = None) -> bool:
+    """Extend the lease; False means another worker has taken the run over."""
+    now = _now()
+    res = db.execute(
+        update(Run)
+        .where(Run.id == run_id, Run.lease_owner == owner, Run.status == "running")
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_s or settings.RUN_LEASE_S)),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    return res.rowcount == 1
+
+def requeue_expired(db: Session, max_attempts: int | None = None) -> dict:
+    """
+    Put runs whose worker vanished back in the queue: 'running' rows with an
+    expired lease are requeued if they have a job and attempts left,
+    otherwise failed so they stop showing as running forever. Only a claim
+    makes a run 'running', so every such row has a lease; legacy rows
+    without one were recovered once by the unleased_runs migration.
+    """
+    max_attempts = max_attempts or settings.RUN_MAX_ATTEMPTS
+    now = _now()
+    stale = (Run.status == "running") & (Run.lease_expires_at < now)
+    has_job = Run.job_json.notin_(("{}", "")) & (Run.job_json != None)  # noqa: E711
+    requeued = db.execute(
+        update(Run).where(stale, has_job, Run.attempts < max_attempts)
+        .values(status="queued", lease_owner=None, lease_expires_at=None, queued_at=now),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    failed = db.execute(
+        update(Run).where(stale)
+        .values(status="failed", lease_owner=None, lease_expires_at=None, finished_at=now),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.commit()
+    return {"requeued": requeued, "failed": failed}
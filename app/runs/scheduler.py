@@ -0,0 +1,269 @@
+# app/runs/scheduler.py
+import asyncio, itertools, os, socket, uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.runs import queue
+from app.runs.models import Run
+from app.runs.service import finish_run
+from app.shared.config import settings
+from app.shared.db import SessionLocal
+from app.shared.offload import run_io
+
+Job = Callable[[Run, Session], Awaitable[Any]]
+
+# kind -> coroutine executing a claimed run; registered by the modules that own the work
+JOBS: Dict[str, Job] = {}
+
+def job(kind: str):
+    """Register `async def fn(run, db)` as the executor for runs queued with `kind`."""
+    def _wrap(fn: Job) -> Job:
+        JOBS[kind] = fn
+        return fn
+    return _wrap
+
+class SchedulerFull(Exception):
+    """Admission control: the tier's queue is at capacity."""
+    def __init__(self, tier: str, depth: int):
+        super().__init__(f"run queue full for tier '{tier}' ({depth} waiting)")
+        self.tier = tier
+        self.depth = depth
+
+def _parse_weights(raw: str) -> Dict[str, int]:
+    weights = {}
+    for part in raw.split(","):
+        tier, _, w = part.partition(":")
+        if tier.strip():
+            weights[tier.strip()] = max(1, int(w or 1))
+    return weights
+
+class RunScheduler:
+    """
+    Bounded pool of run workers over the durable queue in app.runs.queue.
+
+    submit() persists the run as queued (so it survives a restart) and
+    wakes a local worker; workers also poll, so any process sharing the
+    database picks up work. Each claimed run executes with its own
+    SessionLocal session and a heartbeat extending its lease. Tiers are
+    served by weighted round robin, and submit() refuses work once a tier
+    has `queue_max` runs waiting so a flood of messages is pushed back as
+    429s instead of becoming thousands of live tasks.
+
+    cancel() stops a run this process is executing: its job task is
+    cancelled, which reaches the tool call in flight (see
+    offload.run_cancellable). A run cancelled from another process stops
+    at its next heartbeat, when the lease can no longer be extended.
+    """
+
+    def __init__(self, workers: int, queue_max: int, weights: Dict[str, int],
+                 lease_s: float | None = None, poll_s: float | None = None):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.weights = weights
+        self.lease_s = lease_s or settings.RUN_LEASE_S
+        self.poll_s = poll_s or settings.RUN_POLL_MS / 1000.0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # e.g. paid:4,free:1 -> paid paid paid paid free, cycled by every worker
+        self._order = itertools.cycle([t for t, w in weights.items() for _ in range(w)])
+        self._fallback = min(weights, key=weights.get)
+        self._ready: asyncio.Semaphore | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._live: Dict[str, asyncio.Task] = {}  # run id -> job task executing here
+        self._cancelling: set[str] = set()
+        self.running = 0
+        self.counts = {"admitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0, "lease_lost": 0}
+        self.last_error: str | None = None
+
+    def tier(self, tier: str) -> str:
+        # unknown tiers share the lowest-weight queue
+        return tier if tier in self.weights else self._fallback
+
+    def admit(self, db: Session, tier: str):
+        """Raise SchedulerFull if a run for `tier` would be rejected right now."""
+        self._check(tier, queue.depth(db, self.tier(tier)))
+
+    async def admit_async(self, db: AsyncSession, tier: str):
+        self._check(tier, await queue.depth_async(db, self.tier(tier)))
+
+    def _check(self, tier: str, depth: int):
+        if depth >= self.queue_max:
+            self.counts["rejected"] += 1
+            raise SchedulerFull(tier, depth)
+
+    def submit(self, db: Session, run: Run, kind: str, args: dict | None = None, tier: str = "free") -> None:
+        self.admit(db, tier)
+        queue.enqueue(db, run, kind, args, self.tier(tier))
+        self._wake()
+
+    async def submit_async(self, db: AsyncSession, run: Run, kind: str, args: dict | None = None, tier: str = "free") -> None:
+        await self.admit_async(db, tier)
+        await queue.enqueue_async(db, run, kind, args, self.tier(tier))
+        self._wake()
+
+    def _wake(self):
+        self.counts["admitted"] += 1
+        self._ensure_started()
+        self._ready.release()
+
+    async def start(self):
+        """Startup: requeue runs orphaned by a previous process, then start workers."""
+        await run_io(self._recover)
+        self._ensure_started()
+
+    def _recover(self):
+        with SessionLocal() as db:
+            return queue.requeue_expired(db)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # first use, or a new loop (tests)
+            self._loop = loop
+            self._ready = asyncio.Semaphore(0)
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(loop.create_task(self._sweeper()))
+
+    def _claim(self, tier: str) -> str | None:
+        with SessionLocal() as db:
+            # preferred tier first; otherwise any queued run, so workers never idle on a backlog
+            return queue.claim(db, self.owner, tier, self.lease_s) or queue.claim(db, self.owner, None, self.lease_s)
+
+    def _beat(self, run_id: str) -> bool:
+        with SessionLocal() as db:
+            return queue.heartbeat(db, run_id, self.owner, self.lease_s)
+
+    async def _worker(self):
+        while True:
+            run_id = await run_io(self._claim, next(self._order))
+            if run_id is None:
+                try:
+                    await asyncio.wait_for(self._ready.acquire(), timeout=self.poll_s)
+                except asyncio.TimeoutError:
+                    pass
+                if asyncio.current_task().cancelling():
+                    raise asyncio.CancelledError  # wait_for returns, not raises, if the acquire won the race (3.11)
+                continue
+            await self._execute(run_id)
+
+    async def _execute(self, run_id: str):
+        self.running += 1
+        db = SessionLocal()
+        try:
+            # the job's session is only ever used by one thread at a time; its I/O stays off the loop
+            run = await run_io(db.get, Run, run_id)
+            kind = (run.job or {}).get("kind") if run else None
+            fn = JOBS.get(kind)
+            if fn is None:
+                raise LookupError(f"no job registered for kind {kind!r}")
+            task = self._live[run_id] = asyncio.create_task(fn(run, db))
+            beats = asyncio.create_task(self._heartbeat(run_id, task))
+            try:
+                await task
+            finally:
+                beats.cancel()
+                self._live.pop(run_id, None)
+            self.counts["completed"] += 1
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # shutdown; the lease expires and another worker retries the run
+            self.counts["cancelled" if run_id in self._cancelling else "lease_lost"] += 1
+        except Exception as e:
+            self.counts["failed"] += 1
+            self.last_error = f"{run_id}: {type(e).__name__}: {e}"
+            await run_io(finish_run, db, run_id, status="failed")
+        finally:
+            self._cancelling.discard(run_id)
+            db.close()
+            self.running -= 1
+
+    async def cancel(self, run_id: str, wait_s: float | None = None) -> bool:
+        """
+        Cancel the job task executing `run_id` in this process and wait up
+        to wait_s (default: the offload grace period plus a second) for it to
+        release its subprocesses and files. False if it isn't running here.
+        """
+        task = self._live.get(run_id)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return False
+        self._cancelling.add(run_id)
+        task.cancel()
+        await asyncio.wait([task], timeout=settings.OFFLOAD_CANCEL_GRACE_S + 1 if wait_s is None else wait_s)
+        return True
+
+    async def _heartbeat(self, run_id: str, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            if not await run_io(self._beat, run_id):
+                task.cancel()  # another worker requeued and took this run
+                return
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.lease_s)
+            res = await run_io(self._sweep)
+            for _ in range(min(res["requeued"], self.workers)):
+                self._ready.release()
+
+    def _sweep(self):
+        with SessionLocal() as db:
+            return queue.requeue_expired(db)
+
+    def stats(self) -> dict:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with SessionLocal() as db:
+            backlog = queue.backlog(db)
+        return {
+            "owner": self.owner,
+            "workers": self.workers,
+            "running": self.running,
+            "live": sorted(self._live),
+            "queue_max": self.queue_max,
+            "queued": {t: backlog.get(t, (0, None))[0] for t in self.weights},
+            "oldest_wait_ms": {
+                t: round((now - oldest.replace(tzinfo=None)).total_seconds() * 1000) if oldest else 0
+                for t, (_, oldest) in backlog.items()
+            },
+            **self.counts,
+            "last_error": self.last_error,
+        }
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._loop = None
+
+_SCHEDULER: RunScheduler | None = None
+
+def get_scheduler() -> RunScheduler:
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = RunScheduler(
+            workers=settings.RUN_WORKERS,
+            queue_max=settings.RUN_QUEUE_MAX,
+            weights=_parse_weights(settings.RUN_TIER_WEIGHTS),
+        )
+    return _SCHEDULER
+
+def set_scheduler(s: RunScheduler | None):
+    """Swap the scheduler (tests, benchmarks)."""
+    global _SCHEDULER
+    _SCHEDULER = s
+
+def stats() -> dict:
+    return get_scheduler().stats()
+
+async def start():
+    await get_scheduler().start()
+
+async def shutdown():
+    if _SCHEDULER is not None:
+        await _SCHEDULER.stop()
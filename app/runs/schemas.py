@@ -1,5 +1,6 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional, Union
 
 class RunOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -7,6 +8,26 @@ class RunOut(BaseModel):
     conversation_id: str
     status: str
     mode: str
-    plan: List[str]
+    plan: List[Union[str, Dict[str, Any]]]
     started_at: str
     finished_at: Optional[str] = None
+
+class RunSummary(BaseModel):
+    """GET /runs/by-conversation rows; a response model, so FastAPI serializes them without jsonable_encoder."""
+    id: str
+    status: str
+    mode: str
+    plan: List[Union[str, Dict[str, Any]]]
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+class PlanNode(BaseModel):
+    id: str = Field(min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_\-]+$")
+    tool: str = Field(description="Registry tool name, e.g. download.fetch")
+    args: Dict[str, Any] = Field(default_factory=dict, description="Tool args; ${node.key} references earlier outputs")
+    after: List[str] = Field(default_factory=list, description="Extra dependencies besides referenced nodes")
+
+class PlanCreate(BaseModel):
+    conversation_id: str
+    nodes: List[PlanNode] = Field(min_length=1, max_length=50)
+    max_parallel: Optional[int] = Field(default=None, ge=1, le=16)
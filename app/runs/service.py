@@ -1,4 +1,5 @@
 from typing import Tuple, Any, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import select, desc
 from datetime import datetime, timezone
@@ -48,13 +49,12 @@ def _normalize_pending_payload(pending_payload: dict | None) -> Tuple[str | None
         return name, legacy
     return None, {}
 
-def create_run(
-    db: Session,
+def _new_run(
     conversation_id: str,
-    mode: str = "chat",
-    plan: list[str] | None = None,
-    needs_confirmation: Optional[bool] = None,
-    pending_payload: dict | None = None
+    mode: str,
+    plan: list[str] | None,
+    needs_confirmation: Optional[bool],
+    pending_payload: dict | None,
 ) -> Run:
     tool_name, args = _normalize_pending_payload(pending_payload)
 
@@ -73,7 +73,7 @@ def create_run(
 
     r = Run(
         conversation_id=conversation_id,
-        status="running",
+        status="pending",  # 'running' only once a worker claims it, with a lease
         mode=mode,
         needs_confirmation=needs_confirmation
     )
@@ -81,24 +81,58 @@ def create_run(
     if canonical_payload:
         r.pending_payload = canonical_payload
 
+    return r
+
+def create_run(
+    db: Session,
+    conversation_id: str,
+    mode: str = "chat",
+    plan: list[str] | None = None,
+    needs_confirmation: Optional[bool] = None,
+    pending_payload: dict | None = None
+) -> Run:
+    r = _new_run(conversation_id, mode, plan, needs_confirmation, pending_payload)
     db.add(r)
     db.commit()
     db.refresh(r)
     return r
 
+async def create_run_async(
+    db: AsyncSession,
+    conversation_id: str,
+    mode: str = "chat",
+    plan: list[str] | None = None,
+    needs_confirmation: Optional[bool] = None,
+    pending_payload: dict | None = None
+) -> Run:
+    r = _new_run(conversation_id, mode, plan, needs_confirmation, pending_payload)
+    db.add(r)
+    await db.commit()
+    await db.refresh(r)
+    return r
+
 def add_step(db: Session, run_id: str, idx: int, kind: str, data: dict, status: str = "completed") -> Step:
     s = Step(run_id=run_id, idx=idx, kind=kind, status=status)
     s.data = data
     db.add(s); db.commit(); db.refresh(s)
     return s
 
-def finish_run(db: Session, run_id: str, status: str = "completed") -> None:
-    r = db.get(Run, run_id)
-    if not r:
-        return
+def _finish(r: Run | None, status: str) -> bool:
+    if not r or r.status == "cancelled":  # a cancel wins over whatever the job was finishing with
+        return False
     r.status = status
     r.finished_at = datetime.now(timezone.utc)
-    db.commit()
+    r.lease_owner = None
+    r.lease_expires_at = None
+    return True
+
+def finish_run(db: Session, run_id: str, status: str = "completed") -> None:
+    if _finish(db.get(Run, run_id), status):
+        db.commit()
+
+async def finish_run_async(db: AsyncSession, run_id: str, status: str = "completed") -> None:
+    if _finish(await db.get(Run, run_id), status):
+        await db.commit()
 
 def mark_awaiting_confirmation(db: Session, run_id: str):
     r = db.get(Run, run_id)
@@ -108,30 +142,76 @@ def mark_awaiting_confirmation(db: Session, run_id: str):
     db.commit(); db.refresh(r)
     return r
 
+async def mark_awaiting_confirmation_async(db: AsyncSession, run_id: str):
+    r = await db.get(Run, run_id)
+    if not r:
+        return None
+    r.status = "awaiting_confirmation"
+    await db.commit(); await db.refresh(r)
+    return r
+
 def confirm_run(db: Session, run_id: str) -> Run | None:
     r = db.get(Run, run_id)
     if not r:
         return None
     if r.status != "awaiting_confirmation":
         return r
-    r.status = "running"
+    r.status = "pending"  # the caller queues it next
     db.commit(); db.refresh(r)
     return r
 
+async def confirm_run_async(db: AsyncSession, run_id: str) -> Run | None:
+    r = await db.get(Run, run_id)
+    if not r:
+        return None
+    if r.status != "awaiting_confirmation":
+        return r
+    r.status = "pending"  # the caller queues it next
+    await db.commit(); await db.refresh(r)
+    return r
+
+_TERMINAL = ("completed", "failed", "cancelled")
+
+def _cancel(r: Run) -> None:
+    if r.status in _TERMINAL:
+        return  # a finished run keeps its outcome and finished_at
+    r.status = "cancelled"
+    r.finished_at = datetime.now(timezone.utc)
+    r.lease_owner = None
+    r.lease_expires_at = None
+
 def cancel_run(db: Session, run_id: str) -> bool:
+    """False if there is no such run; one that already finished is left as it is."""
     r = db.get(Run, run_id)
     if not r:
         return False
-    r.status = "cancelled"
-    r.finished_at = datetime.now(timezone.utc)
+    _cancel(r)
     db.commit()
     return True
 
-def get_latest_pending(db: Session, conversation_id: str) -> Run | None:
-    stmt = (
+async def cancel_run_async(db: AsyncSession, run_id: str) -> bool:
+    r = await db.get(Run, run_id)
+    if not r:
+        return False
+    _cancel(r)
+    await db.commit()
+    return True
+
+def confirmed_job(run: Run, uid: str | None) -> tuple[str, dict]:
+    """What to queue once `run` is confirmed: the job recorded when it was planned, else its pending payload."""
+    recorded = run.job
+    return recorded.get("kind") or "pending_payload", {**(recorded.get("args") or {}), "uid": uid}
+
+def _latest_pending(conversation_id: str):
+    return (
         select(Run)
         .where(Run.conversation_id == conversation_id, Run.status == "awaiting_confirmation")
         .order_by(desc(Run.started_at))
         .limit(1)
     )
-    return db.scalars(stmt).first()
+
+def get_latest_pending(db: Session, conversation_id: str) -> Run | None:
+    return db.scalars(_latest_pending(conversation_id)).first()
+
+async def get_latest_pending_async(db: AsyncSession, conversation_id: str) -> Run | None:
+    return (await db.scalars(_latest_pending(conversation_id))).first()
@@ -0,0 +1,165 @@
+# app/runs/timeline.py
+import asyncio, time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.runs.models import Run, Step
+from app.shared.config import settings
+from app.shared.db import SessionLocal
+from app.shared.offload import run_io
+
+_TERMINAL = ("completed", "failed", "cancelled")
+
+class Timeline:
+    """
+    Buffered writer for one run's steps and status transitions.
+
+    step() assigns the next Step.idx immediately (so ordering is fixed at
+    the call site) but only buffers the row; status()/finish() record the
+    latest run status. Everything pending is written in one transaction
+    once `max_steps` rows are buffered, `max_delay_s` has passed since the
+    oldest one, or on finish()/flush(), instead of one commit+refresh per
+    step the way add_step does.
+
+    On an event loop (jobs), batches are written on the offload I/O pool
+    with a session of their own, one after another, so neither a commit nor
+    the job's session is ever used on the loop from a timer. Jobs use it as
+    `async with Timeline(db, run_id) as tl:` and end with
+    `await tl.finish_async(...)`; leaving the block, normally or by an
+    exception, disarms the timer and writes what is still buffered before
+    the scheduler sees the outcome. Without a loop, writes go through `db`.
+    """
+
+    def __init__(self, db: Session, run_id: str, max_steps: int | None = None, max_delay_s: float | None = None):
+        self.db = db
+        self.run_id = run_id
+        self.max_steps = max_steps or settings.TIMELINE_FLUSH_STEPS
+        self.max_delay_s = settings.TIMELINE_FLUSH_MS / 1000.0 if max_delay_s is None else max_delay_s
+        self._next_idx: int | None = None
+        self._steps: list[Step] = []
+        self._run_values: dict = {}
+        self._first_at: float | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._writing: asyncio.Task | None = None  # latest off-loop batch; each waits for the one before
+        self.flushes = 0
+
+    def _load_idx(self):
+        last = self.db.scalar(select(func.max(Step.idx)).where(Step.run_id == self.run_id))
+        self._next_idx = -1 if last is None else last
+
+    def _idx(self) -> int:
+        if self._next_idx is None:
+            self._load_idx()
+        self._next_idx += 1
+        return self._next_idx
+
+    def step(self, kind: str, data: dict | None = None, status: str = "completed") -> int:
+        s = Step(run_id=self.run_id, idx=self._idx(), kind=kind, status=status)
+        s.data = data or {}
+        self._steps.append(s)
+        self._pending()
+        return s.idx
+
+    def status(self, status: str):
+        self._run_values["status"] = status
+        if status in _TERMINAL:
+            self._run_values.update(finished_at=datetime.now(timezone.utc), lease_owner=None, lease_expires_at=None)
+        self._pending()
+
+    def finish(self, status: str = "completed"):
+        """Terminal status (same columns finish_run sets) plus any buffered steps, in one commit."""
+        self.status(status)
+        self.flush()
+
+    async def finish_async(self, status: str = "completed"):
+        """finish() for jobs: the commit happens off the loop."""
+        self.status(status)
+        await self.flush_async()
+
+    def _pending(self):
+        now = time.monotonic()
+        if self._first_at is None:
+            self._first_at = now
+            self._arm_timer()
+        if len(self._steps) >= self.max_steps or now - self._first_at >= self.max_delay_s:
+            if self._loop() is None:
+                self.flush()
+            else:
+                self._schedule()
+
+    @staticmethod
+    def _loop() -> asyncio.AbstractEventLoop | None:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def _arm_timer(self):
+        # idle runs still flush within max_delay_s when there is an event loop to do it
+        loop = self._loop()
+        if loop is not None:
+            self._timer = loop.call_later(self.max_delay_s, self._schedule)
+
+    def _take(self) -> tuple[list[Step], dict]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._first_at = None
+        steps, values = self._steps, self._run_values
+        self._steps, self._run_values = [], {}
+        return steps, values
+
+    def _write(self, db: Session, steps: list[Step], values: dict):
+        db.add_all(steps)
+        if values:
+            db.execute(
+                # a run cancelled meanwhile stays cancelled (see finish_run)
+                update(Run).where(Run.id == self.run_id, Run.status != "cancelled").values(**values),
+                execution_options={"synchronize_session": False},
+            )
+        db.commit()
+        self.flushes += 1
+
+    def flush(self):
+        """Write what is buffered now, through `db` (no event loop)."""
+        steps, values = self._take()
+        if steps or values:
+            self._write(self.db, steps, values)
+
+    def _write_detached(self, steps: list[Step], values: dict):
+        with SessionLocal() as db:
+            self._write(db, steps, values)
+
+    async def _write_after(self, prev: asyncio.Task | None, steps: list[Step], values: dict):
+        if prev is not None:
+            await prev  # batches commit in order; a failed one fails the rest
+        await run_io(self._write_detached, steps, values)
+
+    def _schedule(self) -> asyncio.Task | None:
+        """Queue the buffer for an off-loop write behind earlier batches; returns the latest write."""
+        steps, values = self._take()
+        if steps or values:
+            self._writing = asyncio.get_running_loop().create_task(self._write_after(self._writing, steps, values))
+        return self._writing
+
+    async def flush_async(self):
+        """Write what is buffered now and wait until every batch so far is committed."""
+        task = self._schedule()
+        if task is not None:
+            await asyncio.shield(task)  # a cancelled caller does not abandon the write halfway
+
+    def __enter__(self) -> "Timeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    async def __aenter__(self) -> "Timeline":
+        if self._next_idx is None:  # the one read step() would otherwise do on the loop
+            await run_io(self._load_idx)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush_async()
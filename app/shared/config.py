@@ -21,4 +21,91 @@ class Settings(BaseModel):
     JWT_AUD: str | None = os.getenv("JWT_AUD")
     JWT_EXPIRE_MIN: int = int(os.getenv("JWT_EXPIRE_MIN", "60"))
 
+    # SSE fan-out: "memory" (single worker) or "sqlite" (N workers on one node)
+    SSE_BROKER: str = os.getenv("SSE_BROKER", "memory").lower()
+    SSE_BUS_PATH: str | None = os.getenv("SSE_BUS_PATH")  # default: storage/sse_bus.db
+    SSE_POLL_MS: int = int(os.getenv("SSE_POLL_MS", "50"))
+    # Last-Event-ID replay window (per conversation)
+    SSE_REPLAY_MAX_EVENTS: int = int(os.getenv("SSE_REPLAY_MAX_EVENTS", "1000"))
+    SSE_REPLAY_MAX_BYTES: int = int(os.getenv("SSE_REPLAY_MAX_BYTES", str(256 * 1024)))
+    SSE_REPLAY_TTL_S: int = int(os.getenv("SSE_REPLAY_TTL_S", "300"))
+    # Slow subscribers: queue depth and what to do when it fills up
+    SSE_QUEUE_SIZE: int = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+    SSE_OVERFLOW_POLICY: str = os.getenv("SSE_OVERFLOW_POLICY", "drop_oldest").lower()  # drop_oldest|disconnect|coalesce
+    SSE_HEARTBEAT_S: int = int(os.getenv("SSE_HEARTBEAT_S", "15"))
+    WS_MAX_ROOMS: int = int(os.getenv("WS_MAX_ROOMS", "200"))
+
+    # Run scheduler: concurrent runs per worker process, waiting runs per tier,
+    # and how often each tier is served relative to the others
+    RUN_WORKERS: int = int(os.getenv("RUN_WORKERS", "8"))
+    RUN_QUEUE_MAX: int = int(os.getenv("RUN_QUEUE_MAX", "200"))
+    RUN_TIER_WEIGHTS: str = os.getenv("RUN_TIER_WEIGHTS", "dev:4,paid:4,free:1")
+    # Durable queue: lease per claimed run (renewed by heartbeats), retry budget,
+    # and how often idle workers look for runs queued by other processes
+    RUN_LEASE_S: int = int(os.getenv("RUN_LEASE_S", "30"))
+    RUN_MAX_ATTEMPTS: int = int(os.getenv("RUN_MAX_ATTEMPTS", "3"))
+    RUN_POLL_MS: int = int(os.getenv("RUN_POLL_MS", "1000"))
+    # Run timelines: buffered steps are committed together at this size or age
+    TIMELINE_FLUSH_STEPS: int = int(os.getenv("TIMELINE_FLUSH_STEPS", "32"))
+    TIMELINE_FLUSH_MS: int = int(os.getenv("TIMELINE_FLUSH_MS", "200"))
+    # Graph plans (app/runs/dag.py): tool calls in flight per run unless the plan asks for fewer
+    RUN_DAG_PARALLELISM: int = int(os.getenv("RUN_DAG_PARALLELISM", "4"))
+
+    # SQLite storage profile (app/shared/db.py) and the connection pool in front of it
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT_S: float = float(os.getenv("DB_POOL_TIMEOUT_S", "30"))
+
+    # Tool calls per registry guard_feature ("feature:value,...", "*" = any other):
+    # concurrent calls, seconds to wait for a slot, and execution deadline
+    TOOL_FEATURE_CONCURRENCY: str = os.getenv("TOOL_FEATURE_CONCURRENCY", "browser:2,pdf:2,download:4,email:4,*:16")
+    TOOL_FEATURE_WAIT_S: str = os.getenv("TOOL_FEATURE_WAIT_S", "browser:10,pdf:10,*:5")
+    TOOL_FEATURE_TIMEOUT_S: str = os.getenv("TOOL_FEATURE_TIMEOUT_S", "browser:90,pdf:60,download:60,*:30")
+
+    # POST /tools/batch: calls per request, and how many of them run at once
+    TOOL_BATCH_MAX: int = int(os.getenv("TOOL_BATCH_MAX", "100"))
+    TOOL_BATCH_CONCURRENCY: int = int(os.getenv("TOOL_BATCH_CONCURRENCY", "8"))
+
+    # Tool result cache (registry entries opt in with cache_ttl_s): in-process LRU
+    # entries, and whether to also share results through the tool_cache table
+    TOOL_CACHE_SIZE: int = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+    TOOL_CACHE_SQLITE: bool = os.getenv("TOOL_CACHE_SQLITE", "0").lower() in ("1", "true", "yes")
+
+    # Usage accounting (app/shared/usage.py): debits are flushed to user_usage this often,
+    # or as soon as this many tasks are unflushed (together: the most a crash can lose);
+    # persisted totals are re-read after this long so other processes' usage shows up
+    USAGE_FLUSH_MS: int = int(os.getenv("USAGE_FLUSH_MS", "1000"))
+    USAGE_MAX_PENDING_TASKS: int = int(os.getenv("USAGE_MAX_PENDING_TASKS", "100"))
+    USAGE_CACHE_S: float = float(os.getenv("USAGE_CACHE_S", "30"))
+
+    # Idempotency-Key responses (app/shared/idem.py): how long a key replays, in-process
+    # LRU entries, and rows per transaction when expired keys are deleted
+    IDEM_TTL_S: float = float(os.getenv("IDEM_TTL_S", "86400"))
+    IDEM_CACHE_SIZE: int = int(os.getenv("IDEM_CACHE_SIZE", "1024"))
+    IDEM_PURGE_BATCH: int = int(os.getenv("IDEM_PURGE_BATCH", "500"))
+
+    # Retention (app/shared/retention.py): days before rows move to the cold archive,
+    # per table ("runs:30,messages:90"; 0 = keep), how often to sweep (0 = never),
+    # rows per transaction and the pause between them, pages per incremental_vacuum step
+    RETENTION_DAYS: str = os.getenv("RETENTION_DAYS", "runs:30,messages:90")
+    RETENTION_INTERVAL_S: float = float(os.getenv("RETENTION_INTERVAL_S", "3600"))
+    RETENTION_BATCH: int = int(os.getenv("RETENTION_BATCH", "500"))
+    RETENTION_PAUSE_MS: int = int(os.getenv("RETENTION_PAUSE_MS", "50"))
+    RETENTION_VACUUM_PAGES: int = int(os.getenv("RETENTION_VACUUM_PAGES", "500"))
+
+    # Blocking work offload: threads for I/O, processes for CPU (0 = use threads)
+    OFFLOAD_IO_THREADS: int = int(os.getenv("OFFLOAD_IO_THREADS", "16"))
+    OFFLOAD_CPU_PROCS: int = int(os.getenv("OFFLOAD_CPU_PROCS", str(min(4, os.cpu_count() or 1))))
+    # Cancelled tool calls get this long to kill subprocesses / drop partial files
+    OFFLOAD_CANCEL_GRACE_S: float = float(os.getenv("OFFLOAD_CANCEL_GRACE_S", "5"))
+
+    # Browser tool: "auto" (Playwright, CLI fallback), "playwright" or "cli"
+    BROWSER_ENGINE: str = os.getenv("BROWSER_ENGINE", "auto")
+    CHROME_PATH: str | None = os.getenv("CHROME_PATH")
+
 settings = Settings()
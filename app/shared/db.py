@@ -1,18 +1,76 @@
+import os
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
+from app.shared.config import settings
+
 # Local SQLite DB under ./storage/ (created if missing)
 from pathlib import Path
 ROOT = Path(__file__).resolve().parents[2]   # project root
 STORAGE_DIR = ROOT / "storage"
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
-DB_URL = f"sqlite:///{(STORAGE_DIR / 'agenthub.db').as_posix()}"
+DB_URL = os.getenv("DATABASE_URL") or f"sqlite:///{(STORAGE_DIR / 'agenthub.db').as_posix()}"
+
+
+def _engine_kwargs(url: str) -> dict:
+    kw: dict = {"connect_args": {"check_same_thread": False}}
+    if url.startswith("sqlite") and ":memory:" not in url and url != "sqlite://":
+        # file databases get a real pool; in-memory ones must stay on a single connection
+        kw.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_S,
+        )
+        kw["connect_args"]["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000.0
+    return kw
 
+def _async_url(url: str) -> str:
+    # same database through aiosqlite (sqlite:///x.db -> sqlite+aiosqlite:///x.db)
+    scheme, sep, rest = url.partition("://")
+    return f"{scheme.split('+')[0]}+aiosqlite{sep}{rest}" if scheme.startswith("sqlite") else url
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+engine = create_engine(DB_URL, **_engine_kwargs(DB_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Async path for `async def` routes: the same database through aiosqlite, so
+# queries and commits wait on the driver's thread instead of the event loop.
+# expire_on_commit=False because attribute refreshes cannot lazy-load here.
+async_engine = create_async_engine(_async_url(DB_URL), **_engine_kwargs(DB_URL))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    """
+    Storage profile for every new SQLite connection: WAL so readers never
+    wait for a writer, synchronous=NORMAL (fsync at checkpoints, not on
+    every commit: durable in WAL mode except across power loss), a busy
+    timeout instead of immediate "database is locked", and a bigger page
+    cache plus mmap for the read paths. New databases are created with
+    auto_vacuum=INCREMENTAL so retention sweeps can release freed pages.
+    """
+    if not DB_URL.startswith("sqlite"):
+        return
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes on a new, empty database
+        cur.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cur.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")  # negative = KiB
+        cur.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+
+def pragmas() -> dict:
+    """Effective settings on a pooled connection (debug endpoint, tests)."""
+    names = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "auto_vacuum")
+    with engine.connect() as conn:
+        return {n: conn.exec_driver_sql(f"PRAGMA {n}").scalar() for n in names}
+
 class Base(DeclarativeBase):
     pass
 
@@ -24,23 +82,11 @@ def get_db():
     finally:
         db.close()
 
-from sqlalchemy import text
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
 def run_sqlite_migrations():
-    with engine.begin() as conn:
-        conn.exec_driver_sql("""
-        CREATE TABLE IF NOT EXISTS user_usage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            day TEXT NOT NULL,                 -- YYYYMMDD
-            tasks INTEGER NOT NULL DEFAULT 0,
-            tokens INTEGER NOT NULL DEFAULT 0
-        );
-        """)
-        # add the runs columns if not present (from earlier step)
-        cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(runs)").fetchall()]
-        if "needs_confirmation" not in cols:
-            conn.exec_driver_sql("ALTER TABLE runs ADD COLUMN needs_confirmation BOOLEAN DEFAULT 0")
-        if "pending_payload_json" not in cols:
-            conn.exec_driver_sql("ALTER TABLE runs ADD COLUMN pending_payload_json TEXT DEFAULT '{}'")
-
+    """Bring the schema up to date (app/shared/migrations.py); one PRAGMA read when already current."""
+    from app.shared.migrations import migrate
+    return migrate(engine)
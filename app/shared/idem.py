@@ -1,10 +1,38 @@
-import json, hashlib, datetime as dt
-from fastapi import Header, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from app.shared.db import get_db
+# app/shared/idem.py
+"""
+Idempotency-Key handling for POST routes that run expensive tools.
+
+A route opts in with `idem=Depends(require_idem)` and, once it has a
+successful response, `await save_idem(adb, idem, resp)`. The key is bound
+to a signature of the route path and the JSON body (or a hash of the raw
+bytes when the body is not JSON); the same key with a different request
+is rejected (422).
+
+Lookups go to an in-process LRU of recent responses first, then to the
+idempotency_keys table. While a request holds a key, later requests with
+the same key and body wait for it instead of running the tool again
+(single flight, per process): they get the saved response, or take over
+the key if the first request fails without saving one. Replays are plain
+200 responses with an `Idempotent-Replay: true` header (IdemReplay, turned
+into a response by the handler in app.main).
+
+Keys expire after IDEM_TTL_S. Expired rows are ignored by lookups and
+deleted IDEM_PURGE_BATCH rows per transaction, every _PURGE_EVERY saves,
+so the writer lock is never held for a whole sweep.
+"""
+import asyncio, json, hashlib, time, datetime as dt
+from collections import OrderedDict
+from typing import Dict
+
+from fastapi import Depends, Header, Request
+from sqlalchemy import Column, DateTime, Index, String, Text, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.shared.config import settings
+from app.shared.db import engine, get_async_db
+from app.shared.http import err
 from app.shared.models import Base
-from sqlalchemy import Column, String, Text, DateTime
+from app.shared.offload import run_io
 
 class IdemRecord(Base):
     __tablename__ = "idempotency_keys"
@@ -13,26 +41,180 @@ class IdemRecord(Base):
     response_json = Column(Text, nullable=False)
     created_at = Column(DateTime, default=dt.datetime.utcnow)
 
+    __table_args__ = (Index("ix_idempotency_keys_created", "created_at"),)
+
 def _sig(payload: dict) -> str:
     return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
 
+class IdemReplay(Exception):
+    """A stored response for this key; app.main answers it as a 200."""
+    def __init__(self, response):
+        self.response = response
+
+class _Flight:
+    def __init__(self, sig: str):
+        self.sig = sig
+        self.done = asyncio.Event()
+        self.raw: str | None = None  # saved response JSON; None if the holder failed
+
+class IdemStore:
+    _PURGE_EVERY = 256  # saves between sweeps of expired rows
+
+    def __init__(self, size: int, ttl_s: float, purge_batch: int):
+        self.size = size
+        self.ttl_s = ttl_s
+        self.purge_batch = purge_batch
+        self._lru: OrderedDict[str, tuple[str, str, float]] = OrderedDict()  # key -> (sig, json, expires_at)
+        self._flights: Dict[str, _Flight] = {}
+        self._saves = 0
+        self.counts = {"hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "conflicts": 0,
+                       "saves": 0, "purged": 0}
+
+    # ---- memory front ----
+    def _lru_get(self, key: str, now: float) -> tuple[str, str] | None:
+        item = self._lru.get(key)
+        if item is None:
+            return None
+        if item[2] <= now:
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return item[0], item[1]
+
+    def _lru_put(self, key: str, sig: str, raw: str, expires_at: float):
+        self._lru[key] = (sig, raw, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    def _replay(self, sig: str, stored_sig: str, raw: str):
+        if stored_sig != sig:
+            self.counts["conflicts"] += 1
+            err("Idempotency-Key was already used for a different request",
+                code="idempotency_key_reused", status=422)
+        raise IdemReplay(json.loads(raw))
+
+    # ---- request side ----
+    async def begin(self, db: AsyncSession, key: str, sig: str) -> _Flight:
+        """Return once this request holds the key; raises IdemReplay when it was already answered."""
+        while True:
+            now = time.time()
+            hit = self._lru_get(key, now)
+            if hit is not None:
+                self.counts["hits"] += 1
+                self._replay(sig, *hit)
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            if flight.sig != sig:
+                self.counts["conflicts"] += 1
+                err("Idempotency-Key is in use by a different request",
+                    code="idempotency_key_in_use", status=409)
+            self.counts["coalesced"] += 1
+            await flight.done.wait()
+            if flight.raw is not None:
+                raise IdemReplay(json.loads(flight.raw))
+            # the holder failed without a response: look again, maybe take the key
+
+        # no await between the checks above and taking the key
+        flight = self._flights[key] = _Flight(sig)
+        try:
+            rec = await db.get(IdemRecord, key)
+        except BaseException:
+            self.release(key, flight)
+            raise
+        cutoff = dt.datetime.utcnow() - dt.timedelta(seconds=self.ttl_s)
+        if rec is None or (rec.created_at or cutoff) <= cutoff:
+            self.counts["misses"] += 1
+            return flight
+        self.counts["db_hits"] += 1
+        expires_at = now + self.ttl_s - (dt.datetime.utcnow() - rec.created_at).total_seconds()
+        self._lru_put(key, rec.request_sig, rec.response_json, expires_at)
+        self.release(key, flight, rec.response_json if rec.request_sig == sig else None)
+        self._replay(sig, rec.request_sig, rec.response_json)
+
+    async def save(self, db: AsyncSession, key: str, flight: _Flight, response) -> None:
+        sig = flight.sig
+        raw = json.dumps(response, default=str)
+        try:
+            await db.merge(IdemRecord(key=key, request_sig=sig, response_json=raw,
+                                      created_at=dt.datetime.utcnow()))  # replaces an expired row
+            await db.commit()
+        except BaseException:
+            self.release(key, flight)
+            raise
+        self._lru_put(key, sig, raw, time.time() + self.ttl_s)
+        self.release(key, flight, raw)
+        self.counts["saves"] += 1
+        self._saves += 1
+        if self._saves % self._PURGE_EVERY == 0:
+            await run_io(self.purge)
+
+    def release(self, key: str, flight: _Flight, raw: str | None = None):
+        """Give the key up; waiters get `raw`, or retry when it is None."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.done.is_set():
+            flight.raw = raw
+            flight.done.set()
+
+    # ---- retention ----
+    def purge(self) -> int:
+        """Delete expired rows in batches, one short transaction each; returns rows deleted."""
+        cutoff = dt.datetime.utcnow() - dt.timedelta(seconds=self.ttl_s)
+        expired = select(IdemRecord.key).where(IdemRecord.created_at < cutoff).limit(self.purge_batch)
+        total = 0
+        while True:
+            with engine.begin() as conn:
+                n = conn.execute(delete(IdemRecord).where(IdemRecord.key.in_(expired))).rowcount
+            total += n
+            if n < self.purge_batch:
+                break
+        self.counts["purged"] += total
+        return total
+
+    def stats(self) -> dict:
+        return {"lru_size": len(self._lru), "lru_max": self.size, "in_flight": len(self._flights),
+                "ttl_s": self.ttl_s, **self.counts}
+
+_STORE: IdemStore | None = None
+
+def get_store() -> IdemStore:
+    global _STORE
+    if _STORE is None:
+        _STORE = IdemStore(settings.IDEM_CACHE_SIZE, settings.IDEM_TTL_S, settings.IDEM_PURGE_BATCH)
+    return _STORE
+
+def reset():
+    """Drop the in-process tier and counters (tests)."""
+    global _STORE
+    _STORE = None
+
+def stats() -> dict:
+    return get_store().stats()
+
 async def require_idem(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     idem_key: str | None = Header(default=None, alias="Idempotency-Key"),
-    payload: dict | None = None,  # you will pass this explicitly from the route
 ):
+    """Dependency: None without the header, else the key this request now holds."""
     if not idem_key:
-        return {"idem": None}  # not provided -> not enforced
-    sig = _sig(payload or {})
-    rec = db.get(IdemRecord, idem_key)
-    if rec and rec.request_sig == sig:
-        # short-circuit with cached response
-        from fastapi import HTTPException
-        raise HTTPException(status_code=200, detail=json.loads(rec.response_json))
-    return {"idem": {"key": idem_key, "sig": sig}}
-
-def save_idem(db: Session, idem_ctx: dict | None, response_obj: dict):
-    if not idem_ctx or not idem_ctx.get("key"): 
+        yield None  # not provided -> not enforced
+        return
+    raw = await request.body()
+    try:
+        body = json.loads(raw) if raw else None
+    except ValueError:  # not JSON (form, text, bytes): bind the key to the exact bytes
+        body = {"raw_sha256": hashlib.sha256(raw).hexdigest()}
+    store = get_store()
+    flight = await store.begin(db, idem_key, _sig({"path": request.url.path, "body": body}))
+    try:
+        yield {"key": idem_key, "sig": flight.sig, "flight": flight}
+    finally:
+        store.release(idem_key, flight)  # no-op after save_idem; otherwise lets a waiter run it
+
+async def save_idem(db: AsyncSession, idem_ctx: dict | None, response_obj):
+    if not idem_ctx or not idem_ctx.get("key"):
         return
-    rec = IdemRecord(key=idem_ctx["key"], request_sig=idem_ctx["sig"], response_json=json.dumps(response_obj))
-    db.add(rec); db.commit()
+    await get_store().save(db, idem_ctx["key"], idem_ctx["flight"], response_obj)
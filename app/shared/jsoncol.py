@@ -0,0 +1,48 @@
+# app/shared/jsoncol.py
+"""
+Decoded views of JSON text columns (Run.plan_json, Step.data_json, ...).
+
+The columns stay TEXT: the queue filters on job_json, list queries select
+attachments_json as-is, and bulk inserts write the text directly. The view
+decodes a column value once and keeps the result on the instance next to
+the text it came from, so repeated reads (list endpoints, timelines,
+response models) cost a pointer comparison. Assigning through the view
+re-encodes the column and drops the decoded copy; a new column value
+(refresh, expire, direct assignment) is noticed because it is a different
+string object. The decoded value is shared between reads: treat it as
+read-only and assign a new one to change the column.
+"""
+import json
+from typing import Callable
+
+
+def loads(raw: str | None, empty: Callable[[], list | dict]):
+    """Decode column text; `empty()` for NULL, "" and undecodable text."""
+    try:
+        return json.loads(raw) if raw else empty()
+    except Exception:
+        return empty()
+
+
+class JsonText:
+    def __init__(self, column: str, empty: Callable[[], list | dict]):
+        self.column = column
+        self.empty = empty  # value for NULL, "" and undecodable text
+
+    def __set_name__(self, owner, name: str):
+        self.slot = f"_{name}_decoded"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        raw = getattr(obj, self.column)
+        cached = obj.__dict__.get(self.slot)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        value = loads(raw, self.empty)
+        obj.__dict__[self.slot] = (raw, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.column, json.dumps(value or self.empty()))
+        obj.__dict__.pop(self.slot, None)
@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.shared.db import get_db
-from app.shared.guard import _read_usage          # reuse the guard’s usage reader
+from app.shared.usage import get_meter            # same view of usage as the guard
 from app.shared.config import settings
 from app.shared.auth import get_user              # <— use real auth (demo/JWT toggle lives here)
 
@@ -14,7 +14,7 @@ def my_limits(user = Depends(get_user), db: Session = Depends(get_db)):
     uid  = user["sub"]
     tier = user.get("tier", settings.DEFAULT_TIER)
 
-    usage = _read_usage(db, uid)
+    usage = get_meter().get(db, uid)
 
     if tier == "paid":
         max_tasks, max_tokens = settings.PAID_TASK_LIMIT, settings.PAID_TOKEN_BUDGET
@@ -0,0 +1,201 @@
+# app/shared/migrations.py
+"""
+Versioned schema migrations for the SQLite database.
+
+Each entry in MIGRATIONS is (version, name, fn(conn)); the applied version
+is the database's PRAGMA user_version, so a database that is already
+current costs one lookup at startup. Pending migrations run in order, each
+in its own transaction together with the user_version bump. Tables that
+have a model are created by Base.metadata.create_all before this runs;
+migrations cover what create_all cannot do to an existing database
+(new columns, indexes on old tables, data fixes) and the raw-SQL tables.
+Steps stay idempotent (IF NOT EXISTS, column checks) because databases
+from before versioning report version 0 but already have part of it.
+"""
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy.engine import Connection, Engine
+
+Migration = tuple[int, str, Callable[[Connection], None]]
+
+
+def _columns(conn: Connection, table: str) -> list[str]:
+    return [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _baseline(conn: Connection):
+    # everything run_sqlite_migrations used to re-check on every start
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS user_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,                 -- YYYYMMDD
+        tasks INTEGER NOT NULL DEFAULT 0,
+        tokens INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    # shared tier of the tool result cache (app/tools/cache.py)
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS tool_cache (
+        key TEXT PRIMARY KEY,              -- sha256 of tool + canonical args (+ user)
+        tool TEXT NOT NULL,
+        value_json TEXT NOT NULL,
+        expires_at REAL NOT NULL           -- unix time
+    );
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_tool_cache_expires ON tool_cache (expires_at)")
+    cols = _columns(conn, "runs")
+    if "needs_confirmation" not in cols:
+        conn.exec_driver_sql("ALTER TABLE runs ADD COLUMN needs_confirmation BOOLEAN DEFAULT 0")
+    if "pending_payload_json" not in cols:
+        conn.exec_driver_sql("ALTER TABLE runs ADD COLUMN pending_payload_json TEXT DEFAULT '{}'")
+    # durable run queue (app/runs/queue.py)
+    for name, ddl in (
+        ("tier", "VARCHAR(16) DEFAULT 'free'"),
+        ("job_json", "TEXT DEFAULT '{}'"),
+        ("queued_at", "DATETIME"),
+        ("lease_owner", "VARCHAR(64)"),
+        ("lease_expires_at", "DATETIME"),
+        ("heartbeat_at", "DATETIME"),
+        ("attempts", "INTEGER DEFAULT 0"),
+    ):
+        if name not in cols:
+            conn.exec_driver_sql(f"ALTER TABLE runs ADD COLUMN {name} {ddl}")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_runs_claim ON runs (status, tier, queued_at)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_runs_lease ON runs (status, lease_expires_at)")
+
+
+def _hot_path_indexes(conn: Connection):
+    # guard reads/bumps look up (user_id, day) on every guarded call. The old
+    # read-then-insert could race into duplicate rows: fold them into the
+    # oldest one before the unique index goes on.
+    conn.exec_driver_sql("""
+    UPDATE user_usage SET
+        tasks = (SELECT SUM(u.tasks) FROM user_usage u WHERE u.user_id = user_usage.user_id AND u.day = user_usage.day),
+        tokens = (SELECT SUM(u.tokens) FROM user_usage u WHERE u.user_id = user_usage.user_id AND u.day = user_usage.day)
+    WHERE id IN (SELECT MIN(id) FROM user_usage GROUP BY user_id, day HAVING COUNT(*) > 1)
+    """)
+    conn.exec_driver_sql("DELETE FROM user_usage WHERE id NOT IN (SELECT MIN(id) FROM user_usage GROUP BY user_id, day)")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ux_user_usage_user_day ON user_usage (user_id, day)")
+    # get_latest_pending: WHERE conversation_id=? AND status=? ORDER BY started_at DESC
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_runs_conv_status_started ON runs (conversation_id, status, started_at)"
+    )
+    # a conversation's messages in order
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_messages_conv_created ON messages (conversation_id, created_at)"
+    )
+
+
+def _messages_keyset(conn: Connection):
+    # history pages order by (created_at, id): with id in the index the
+    # keyset seek and the ORDER BY need no sort; the old index is its prefix
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_messages_conv_created_id ON messages (conversation_id, created_at, id)"
+    )
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_messages_conv_created")
+
+
+def _conversation_listing(conn: Connection):
+    # inbox listing: WHERE user_id=? AND archived=0, keyset on (created_at, id)
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user_archived_created_id "
+        "ON conversations (user_id, archived, created_at, id)"
+    )
+    cols = _columns(conn, "conversations")
+    for name, ddl in (
+        ("last_message_at", "DATETIME"),
+        ("last_message_role", "VARCHAR(16)"),
+        ("last_message_preview", "VARCHAR(200)"),
+    ):
+        if name not in cols:
+            conn.exec_driver_sql(f"ALTER TABLE conversations ADD COLUMN {name} {ddl}")
+    # backfill from each conversation's newest message (one seek on ix_messages_conv_created_id each)
+    newest = ("SELECT {col} FROM messages m WHERE m.conversation_id = conversations.id "
+              "ORDER BY m.created_at DESC, m.id DESC LIMIT 1")
+    conn.exec_driver_sql(f"""
+    UPDATE conversations SET
+        last_message_at = ({newest.format(col="m.created_at")}),
+        last_message_role = ({newest.format(col="m.role")}),
+        last_message_preview = ({newest.format(col="substr(m.text, 1, 200)")})
+    WHERE last_message_at IS NULL
+    """)
+
+
+def _idempotency_keys(conn: Connection):
+    # IdemRecord lives on app.shared.models.Base, which create_all never sees;
+    # created_at is indexed for the TTL purge
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key VARCHAR(128) PRIMARY KEY,
+        request_sig VARCHAR(64) NOT NULL,
+        response_json TEXT NOT NULL,
+        created_at DATETIME
+    );
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created ON idempotency_keys (created_at)")
+
+
+def _retention(conn: Connection):
+    # cold archive (app/shared/retention.py): rows moved out of runs/steps/messages,
+    # zlib-compressed JSON per conversation and batch
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS archive_chunks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT NOT NULL,
+        kind TEXT NOT NULL,                -- messages|runs (runs carry their steps)
+        row_count INTEGER NOT NULL,
+        payload BLOB NOT NULL,
+        archived_at DATETIME NOT NULL
+    );
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_archive_chunks_conv_kind ON archive_chunks (conversation_id, kind)")
+    if "cold_at" not in _columns(conn, "conversations"):
+        conn.exec_driver_sql("ALTER TABLE conversations ADD COLUMN cold_at DATETIME")
+    # the runs policy: finished runs by age
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_runs_status_finished ON runs (status, finished_at)")
+
+
+def _unleased_runs(conn: Connection):
+    # runs used to be created 'running' with no lease and recovered on every start,
+    # which also took over other processes' runs; now only a claim makes a run
+    # 'running'. Rows left from before: requeue the ones with a job, fail the rest.
+    now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(" ")
+    stale = "status = 'running' AND lease_expires_at IS NULL"
+    conn.exec_driver_sql(f"UPDATE runs SET status = 'queued', queued_at = ? "
+                         f"WHERE {stale} AND job_json IS NOT NULL AND job_json NOT IN ('{{}}', '')", (now,))
+    conn.exec_driver_sql(f"UPDATE runs SET status = 'failed', finished_at = ? WHERE {stale}", (now,))
+
+
+MIGRATIONS: list[Migration] = [
+    (1, "baseline", _baseline),
+    (2, "hot_path_indexes", _hot_path_indexes),
+    (3, "messages_keyset", _messages_keyset),
+    (4, "conversation_listing", _conversation_listing),
+    (5, "idempotency_keys", _idempotency_keys),
+    (6, "retention", _retention),
+    (7, "unleased_runs", _unleased_runs),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def migrate(engine: Engine) -> list[str]:
+    """Apply pending migrations; returns the names applied (empty when current)."""
+    with engine.connect() as conn:
+        if current_version(conn) >= LATEST:
+            return []
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            if current_version(conn) >= version:  # another process got here first
+                continue
+            fn(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version={version}")
+        applied.append(name)
+    return applied
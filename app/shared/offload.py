@@ -0,0 +1,83 @@
+# app/shared/offload.py
+import asyncio, functools, os, threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.shared.config import settings
+
+# Blocking work never runs on the event loop:
+#   run_io  -> thread pool  (subprocesses, sockets, file/SQLite I/O, sleeps)
+#   run_cpu -> process pool (PDF rendering, pypdf/docx parsing: GIL-bound work)
+# Both are sized by config and created on first use.
+# A thread cannot be interrupted, so work that should stop when its caller is
+# cancelled (subprocesses, downloads) goes through run_cancellable instead.
+
+_IO: ThreadPoolExecutor | None = None
+_CPU: Executor | None = None
+_INFLIGHT = {"io": 0, "cpu": 0}
+
+def _io_pool() -> ThreadPoolExecutor:
+    global _IO
+    if _IO is None:
+        _IO = ThreadPoolExecutor(max_workers=settings.OFFLOAD_IO_THREADS, thread_name_prefix="offload-io")
+    return _IO
+
+def _cpu_pool() -> Executor:
+    global _CPU
+    if _CPU is None:
+        if settings.OFFLOAD_CPU_PROCS > 0:
+            _CPU = ProcessPoolExecutor(max_workers=settings.OFFLOAD_CPU_PROCS)
+        else:  # 0 = no worker processes (tests, constrained hosts): use threads
+            _CPU = ThreadPoolExecutor(max_workers=max(1, os.cpu_count() or 1), thread_name_prefix="offload-cpu")
+    return _CPU
+
+async def _run(kind: str, pool: Executor, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    call = functools.partial(fn, *args, **kwargs)
+    _INFLIGHT[kind] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, call)
+    finally:
+        _INFLIGHT[kind] -= 1
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking I/O call on the I/O thread pool."""
+    return await _run("io", _io_pool(), fn, args, kwargs)
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a CPU-bound call in the process pool; fn and its arguments must be picklable."""
+    return await _run("cpu", _cpu_pool(), fn, args, kwargs)
+
+class Cancelled(Exception):
+    """Raised inside offloaded work that noticed its `cancel` event."""
+
+async def run_cancellable(fn: Callable[..., Any], *args, grace_s: float | None = None, **kwargs) -> Any:
+    """
+    run_io for blocking work that takes a `cancel` threading.Event and
+    checks it between chunks of work. Cancelling (or timing out) the
+    awaiting task sets the event, then waits up to grace_s for fn to kill
+    its subprocess / remove partial files before the cancellation goes on.
+    """
+    cancel = threading.Event()
+    fut = asyncio.ensure_future(run_io(fn, *args, cancel=cancel, **kwargs))
+    try:
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        cancel.set()
+        await asyncio.wait([fut], timeout=settings.OFFLOAD_CANCEL_GRACE_S if grace_s is None else grace_s)
+        if fut.done() and not fut.cancelled():
+            fut.exception()  # retrieved: Cancelled is the expected outcome here
+        raise
+
+def stats() -> dict:
+    return {
+        "io_threads": settings.OFFLOAD_IO_THREADS,
+        "cpu_procs": settings.OFFLOAD_CPU_PROCS,
+        "inflight": dict(_INFLIGHT),
+    }
+
+def shutdown():
+    global _IO, _CPU
+    for pool in (_IO, _CPU):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _IO = _CPU = None
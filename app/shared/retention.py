@@ -0,0 +1,304 @@
+# app/shared/retention.py
+"""
+Retention and cold archive for the tables that only ever grow.
+
+Per-table policies, RETENTION_DAYS ("table:days,..."; 0 or absent = keep):
+
+- runs: finished runs, with their steps, that finished that long ago in
+  conversations idle for that long;
+- messages: all messages of conversations idle for that long;
+- idempotency_keys: deleted once older than IDEM_TTL_S (app.shared.idem);
+  nothing is archived.
+
+"Idle" is the conversation's updated_at, which every new message and every
+restore bumps. Archived rows move into archive_chunks as zlib-compressed
+JSON of their raw column values, one chunk per conversation per batch.
+Each batch is one short write transaction of at most RETENTION_BATCH rows.
+It starts with a write (the conversation's cold_at update, or DELETE ...
+RETURNING), so the idle check and the move are atomic against new
+messages and restores. Batches are RETENTION_PAUSE_MS apart so request
+writers get the lock in between.
+
+Conversation rows stay: listings keep working from their last_message_*
+columns, and cold_at marks the ones whose messages are archived. restore()
+moves a conversation's chunks back. GET .../messages (messages) and
+GET /runs/by-conversation/... (runs, found through has_archive) do that on
+demand, and POST .../restore does it explicitly.
+
+After a sweep, PRAGMA incremental_vacuum hands the freed pages back,
+RETENTION_VACUUM_PAGES at a time. Databases created before app.shared.db
+set auto_vacuum=INCREMENTAL need one full VACUUM to switch: vacuum(full=True).
+"""
+import asyncio, json, threading, time, zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+from app.shared.config import settings
+from app.shared import idem
+from app.shared.db import engine
+from app.shared.offload import run_io
+
+FINISHED = ("completed", "failed", "cancelled")
+KINDS = ("messages", "runs")
+_IDLE_PICK = 50  # conversations looked up per round of the messages policy
+
+_IDLE = "COALESCE(c.updated_at, c.created_at) < :cut"
+
+_TAKE_RUNS = text(f"""
+DELETE FROM runs WHERE id IN (
+    SELECT r.id FROM runs r JOIN conversations c ON c.id = r.conversation_id
+    WHERE r.status IN ({", ".join(f"'{s}'" for s in FINISHED)})
+      AND COALESCE(r.finished_at, r.started_at) < :cut AND {_IDLE}
+    LIMIT :n
+) RETURNING *
+""")
+_TAKE_STEPS = text("DELETE FROM steps WHERE run_id IN :ids RETURNING *").bindparams(bindparam("ids", expanding=True))
+_MARK_COLD = text(f"""
+UPDATE conversations AS c SET cold_at = COALESCE(c.cold_at, :now) WHERE c.id = :cid AND {_IDLE}
+""")
+_TAKE_MESSAGES = text("""
+DELETE FROM messages WHERE id IN (
+    SELECT id FROM messages WHERE conversation_id = :cid ORDER BY created_at, id LIMIT :n
+) RETURNING *
+""")
+_IDLE_WITH_MESSAGES = text(f"""
+SELECT c.id FROM conversations c
+WHERE {_IDLE} AND EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id)
+LIMIT :n
+""")
+_PUT_CHUNK = text("""
+INSERT INTO archive_chunks (conversation_id, kind, row_count, payload, archived_at)
+VALUES (:cid, :kind, :rows, :payload, :now)
+""")
+
+def _ts(d: datetime) -> str:
+    # how SQLAlchemy's DateTime stores a value on SQLite, so raw comparisons line up
+    return d.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def parse_policies(raw: str) -> Dict[str, float]:
+    out = {}
+    for part in raw.split(","):
+        table, _, days = part.partition(":")
+        if table.strip() and days.strip() and float(days) > 0:
+            out[table.strip()] = float(days)
+    return out
+
+def _pack(tables: dict) -> bytes:
+    return zlib.compress(json.dumps(tables, separators=(",", ":")).encode(), 6)
+
+def _unpack(payload: bytes) -> dict:
+    return json.loads(zlib.decompress(payload))
+
+def _take(conn: Connection, stmt, params: dict) -> tuple[list[str], list[list]]:
+    res = conn.execute(stmt, params)
+    return list(res.keys()), [list(r) for r in res.fetchall()]
+
+def _insert(conn: Connection, table: str, cols: list[str], rows: list[list]) -> int:
+    if not rows:
+        return 0
+    names = ", ".join(cols)
+    marks = ", ".join("?" * len(cols))
+    conn.exec_driver_sql(f"INSERT OR IGNORE INTO {table} ({names}) VALUES ({marks})", [tuple(r) for r in rows])
+    return len(rows)
+
+def archive_runs(conn: Connection, cut: str, limit: int, now: str) -> int:
+    """One batch of the runs policy; returns runs archived."""
+    cols, runs = _take(conn, _TAKE_RUNS, {"cut": cut, "n": limit})
+    if not runs:
+        return 0
+    rid, rcid = cols.index("id"), cols.index("conversation_id")
+    scols, steps = _take(conn, _TAKE_STEPS, {"ids": [r[rid] for r in runs]})
+    srun = scols.index("run_id") if scols else 0
+    by_conv: Dict[str, list] = {}
+    for r in runs:
+        by_conv.setdefault(r[rcid], []).append(r)
+    for cid, rows in by_conv.items():
+        ids = {r[rid] for r in rows}
+        payload = {"runs": {"columns": cols, "rows": rows},
+                   "steps": {"columns": scols, "rows": [s for s in steps if s[srun] in ids]}}
+        conn.execute(_PUT_CHUNK, {"cid": cid, "kind": "runs", "rows": len(rows), "payload": _pack(payload), "now": now})
+    return len(runs)
+
+def archive_messages(conn: Connection, cid: str, cut: str, limit: int, now: str) -> int:
+    """One batch of one conversation's messages; 0 once it is empty or no longer idle."""
+    if not conn.execute(_MARK_COLD, {"cid": cid, "cut": cut, "now": now}).rowcount:
+        return 0  # a message or a restore warmed it up since it was picked
+    cols, rows = _take(conn, _TAKE_MESSAGES, {"cid": cid, "n": limit})
+    if rows:
+        payload = {"messages": {"columns": cols, "rows": rows}}
+        conn.execute(_PUT_CHUNK, {"cid": cid, "kind": "messages", "rows": len(rows), "payload": _pack(payload), "now": now})
+    return len(rows)
+
+_HAS_ARCHIVE = text("SELECT 1 FROM archive_chunks WHERE conversation_id = :cid AND kind = :kind LIMIT 1")
+
+def has_archive(db, conversation_id: str, kind: str) -> bool:
+    """Whether `kind` rows of the conversation are in the archive (one ix_archive_chunks_conv_kind probe)."""
+    return db.execute(_HAS_ARCHIVE, {"cid": conversation_id, "kind": kind}).first() is not None
+
+def restore(conversation_id: str, kinds: Iterable[str] = KINDS) -> Dict[str, int]:
+    """Move a conversation's archived rows back; returns rows restored per table."""
+    kinds = tuple(kinds)
+    counts = {"messages": 0, "runs": 0, "steps": 0}
+    now = _ts(datetime.now(timezone.utc))
+    with engine.begin() as conn:  # warm first: sweeps re-check idleness in every batch
+        conn.execute(text("UPDATE conversations SET updated_at = :now WHERE id = :cid"), {"now": now, "cid": conversation_id})
+    pick = text("SELECT id, payload FROM archive_chunks WHERE conversation_id = :cid AND kind IN :kinds ORDER BY id LIMIT 1")
+    pick = pick.bindparams(bindparam("kinds", expanding=True))
+    while True:
+        with engine.begin() as conn:  # one chunk per transaction; replaying a chunk is harmless (OR IGNORE)
+            chunk = conn.execute(pick, {"cid": conversation_id, "kinds": list(kinds)}).first()
+            if chunk is None:
+                break
+            for table, part in _unpack(chunk.payload).items():
+                counts[table] += _insert(conn, table, part["columns"], part["rows"])
+            conn.execute(text("DELETE FROM archive_chunks WHERE id = :id"), {"id": chunk.id})
+    if "messages" in kinds:
+        with engine.begin() as conn:
+            conn.execute(text("""
+            UPDATE conversations SET cold_at = NULL WHERE id = :cid
+            AND NOT EXISTS (SELECT 1 FROM archive_chunks WHERE conversation_id = :cid AND kind = 'messages')
+            """), {"cid": conversation_id})
+    return counts
+
+class Retention:
+    def __init__(self, policies: Dict[str, float], batch: int, pause_s: float, vacuum_pages: int, interval_s: float):
+        self.policies = policies
+        self.batch = batch
+        self.pause_s = pause_s
+        self.vacuum_pages = vacuum_pages
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._task: asyncio.Task | None = None
+        self.counts = {"sweeps": 0, "runs": 0, "messages": 0, "idempotency_keys": 0, "vacuumed_pages": 0, "errors": 0}
+        self.last_sweep: dict | None = None
+        self.last_error: str | None = None
+
+    def _pause(self) -> bool:
+        """Let other writers in; False once stop() was called."""
+        return not self._stop.wait(self.pause_s)
+
+    def _batches(self, step) -> int:
+        total = 0
+        while True:
+            with engine.begin() as conn:
+                n = step(conn)
+            total += n
+            if n < self.batch or not self._pause():
+                return total
+
+    def sweep(self) -> dict:
+        """Apply every policy, then vacuum; blocking (run it off the loop)."""
+        t0, now = time.perf_counter(), datetime.now(timezone.utc)
+        stamp = _ts(now)
+        moved = {"runs": 0, "messages": 0, "idempotency_keys": 0}
+        days = self.policies.get("runs")
+        if days:
+            cut = _ts(now - timedelta(days=days))
+            moved["runs"] = self._batches(lambda conn: archive_runs(conn, cut, self.batch, stamp))
+        days = self.policies.get("messages")
+        if days:
+            cut = _ts(now - timedelta(days=days))
+            while not self._stop.is_set():
+                with engine.connect() as conn:
+                    cids = conn.execute(_IDLE_WITH_MESSAGES, {"cut": cut, "n": _IDLE_PICK}).scalars().all()
+                for cid in cids:
+                    moved["messages"] += self._batches(lambda conn: archive_messages(conn, cid, cut, self.batch, stamp))
+                if len(cids) < _IDLE_PICK:
+                    break
+        if not self._stop.is_set():
+            moved["idempotency_keys"] = idem.get_store().purge()
+        vacuumed = self.vacuum() if not self._stop.is_set() else 0
+        self.last_sweep = {**moved, "vacuumed_pages": vacuumed, "ms": round((time.perf_counter() - t0) * 1000), "at": stamp}
+        for k, v in moved.items():
+            self.counts[k] += v
+        self.counts["vacuumed_pages"] += vacuumed
+        self.counts["sweeps"] += 1
+        return self.last_sweep
+
+    def vacuum(self, full: bool = False) -> int:
+        """Return free pages to the OS in steps; returns pages released (0 if auto_vacuum is not incremental)."""
+        if full:  # one-off switch of an older database to auto_vacuum=INCREMENTAL; rewrites the file
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+            return before
+        released = 0
+        while True:
+            with engine.connect() as conn:
+                if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                    return released
+                free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                if not free:
+                    return released
+                # as a script: a plain execute() steps the pragma once, which frees a single page
+                conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+            released += min(free, self.vacuum_pages)
+            if free <= self.vacuum_pages or not self._pause():
+                return released
+
+    # ---- background sweeps ----
+    def start(self):
+        if self.interval_s <= 0 or not self.policies:
+            return
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._stop.clear()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while not self._stop.is_set():
+            await asyncio.sleep(self.interval_s)
+            try:
+                await run_io(self.sweep)
+            except Exception as e:
+                self.counts["errors"] += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    async def stop(self):
+        """Stop sweeping; a sweep in progress ends after its current batch."""
+        self._stop.set()
+        task, self._task = self._task, None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        with engine.connect() as conn:
+            archived = {kind: {"chunks": n, "rows": rows or 0, "bytes": size or 0} for kind, n, rows, size in conn.execute(text(
+                "SELECT kind, COUNT(*), SUM(row_count), SUM(length(payload)) FROM archive_chunks GROUP BY kind"
+            )).all()}
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        return {"policies_days": self.policies, "interval_s": self.interval_s, "batch": self.batch,
+                **self.counts, "last_sweep": self.last_sweep, "last_error": self.last_error,
+                "archived": archived, "freelist_pages": free}
+
+_RETENTION: Retention | None = None
+
+def get_retention() -> Retention:
+    global _RETENTION
+    if _RETENTION is None:
+        _RETENTION = Retention(
+            parse_policies(settings.RETENTION_DAYS),
+            batch=settings.RETENTION_BATCH,
+            pause_s=settings.RETENTION_PAUSE_MS / 1000.0,
+            vacuum_pages=settings.RETENTION_VACUUM_PAGES,
+            interval_s=settings.RETENTION_INTERVAL_S,
+        )
+    return _RETENTION
+
+def stats() -> dict:
+    return get_retention().stats()
+
+def start():
+    get_retention().start()
+
+async def shutdown():
+    if _RETENTION is not None:
+        await _RETENTION.stop()
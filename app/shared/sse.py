@@ -1,40 +1,576 @@
-import asyncio, json
-from typing import AsyncIterator, Dict, Set
+import asyncio, itertools, json, sqlite3, threading, time, uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Set, Tuple
 
-# conversation_id -> set of subscriber queues
-_SUBS: Dict[str, Set[asyncio.Queue]] = {}
+from app.shared.config import settings
+from app.shared.db import STORAGE_DIR
 
-def _get_room(cid: str) -> Set[asyncio.Queue]:
+class Event:
+    """
+    One published event. The JSON body and the SSE/WebSocket wire frames are
+    encoded lazily and at most once; the same object is handed to every
+    subscriber queue (and the replay ring), so fan-out never re-serializes.
+    """
+    __slots__ = ("id", "event", "cid", "_data", "_data_json", "_frame", "_ws_text")
+
+    def __init__(
+        self,
+        eid: int | None,
+        event: str,
+        data: dict | None = None,
+        data_json: str | None = None,
+        cid: str | None = None,
+    ):
+        self.id = eid
+        self.event = event
+        self.cid = cid
+        self._data = data
+        self._data_json = data_json
+        self._frame: bytes | None = None
+        self._ws_text: str | None = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = json.loads(self._data_json or "{}")
+        return self._data
+
+    @property
+    def data_json(self) -> str:
+        if self._data_json is None:
+            self._data_json = json.dumps(self._data or {}, ensure_ascii=False)
+        return self._data_json
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            head = f"id: {self.id}\n" if self.id is not None else ""
+            self._frame = (head + f"event: {self.event}\ndata: {self.data_json}\n\n").encode("utf-8")
+        return self._frame
+
+    @property
+    def ws_text(self) -> str:
+        """Same event as a WebSocket text message, tagged with its conversation."""
+        if self._ws_text is None:
+            self._ws_text = (
+                f'{{"conversation_id": {json.dumps(self.cid)}, "id": {json.dumps(self.id)}, '
+                f'"event": {json.dumps(self.event)}, "data": {self.data_json}}}'
+            )
+        return self._ws_text
+
+OVERFLOW_POLICIES = ("drop_oldest", "disconnect", "coalesce")
+
+# markers a subscriber can find in its own queue (never published)
+_PING = Event(None, "")
+_CLOSE = Event(None, "")
+
+class Subscriber(asyncio.Queue):
+    """
+    A subscriber's bounded queue plus what happens when it fills up:
+      drop_oldest -> discard the oldest queued event (client resumes via replay)
+      disconnect  -> close the stream; the client reconnects with Last-Event-ID
+      coalesce    -> merge a new token into the newest queued token, else drop_oldest
+    `dropped`/`merged` count how far the subscriber has fallen behind.
+    """
+
+    def __init__(self, policy: str | None = None, maxsize: int | None = None):
+        super().__init__(maxsize=maxsize or settings.SSE_QUEUE_SIZE)
+        self.policy = policy if policy in OVERFLOW_POLICIES else settings.SSE_OVERFLOW_POLICY
+        self.dropped = 0
+        self.merged = 0
+        self.closed = False
+        self.last_put = time.monotonic()
+
+    def offer(self, ev: Event):
+        if self.closed:
+            return
+        self.last_put = time.monotonic()
+        if not self.full():
+            self.put_nowait(ev)
+            return
+        if self.policy == "disconnect":
+            self.closed = True
+            self.dropped += self.qsize()
+            self._queue.clear()  # nothing else will be read; free it now
+            self.put_nowait(_CLOSE)
+            return
+        if self.policy == "coalesce" and ev.event == "token":
+            last = self._queue[-1]
+            if last.event == "token":
+                self._queue[-1] = Event(ev.id, "token", {
+                    "text_chunk": last.data.get("text_chunk", "") + ev.data.get("text_chunk", ""),
+                    "tokens": last.data.get("tokens", 1) + ev.data.get("tokens", 1),
+                }, cid=ev.cid)
+                self.merged += 1
+                return
+        self.get_nowait()
+        self.dropped += 1
+        self.put_nowait(ev)
+
+    def ping(self):
+        if not self.closed and not self.full():
+            self.put_nowait(_PING)
+
+# conversation_id -> set of subscribers (local to this process)
+_SUBS: Dict[str, Set[Subscriber]] = {}
+
+def _get_room(cid: str) -> Set[Subscriber]:
     return _SUBS.setdefault(cid, set())
 
+def _deliver(cid: str, ev: Event):
+    """Fan an event out to the subscribers living in this process."""
+    room = _SUBS.get(cid)
+    if not room:
+        return
+    for sub in list(room):
+        sub.offer(ev)
+
+def stats() -> dict:
+    """Per-room subscriber lag, for the debug endpoint."""
+    return {
+        "rooms": len(_SUBS),
+        "subscribers": sum(len(r) for r in _SUBS.values()),
+        "lagging": [
+            {"conversation_id": cid, "policy": sub.policy, "queued": sub.qsize(),
+             "dropped": sub.dropped, "merged": sub.merged}
+            for cid, room in _SUBS.items() for sub in room
+            if sub.dropped or sub.merged or sub.full()
+        ],
+    }
+
+# ---------------- Replay ring ----------------
+
+class _Ring:
+    """
+    Bounded replay buffer for one conversation: keeps the newest events,
+    evicting by count, encoded size and age.
+    """
+    __slots__ = ("items", "nbytes", "evicted_id")
+
+    def __init__(self):
+        self.items: Deque[Tuple[float, Event]] = deque()  # (ts, event)
+        self.nbytes = 0
+        self.evicted_id = 0  # newest id that fell out of the window
+
+    def append(self, ev: Event, now: float):
+        self.items.append((now, ev))
+        self.nbytes += len(ev.frame)
+        self.evict(now)
+
+    def evict(self, now: float):
+        items = self.items
+        cutoff = now - settings.SSE_REPLAY_TTL_S
+        while items and (
+            len(items) > settings.SSE_REPLAY_MAX_EVENTS
+            or self.nbytes > settings.SSE_REPLAY_MAX_BYTES
+            or items[0][0] < cutoff
+        ):
+            _ts, ev = items.popleft()
+            self.nbytes -= len(ev.frame)
+            self.evicted_id = ev.id
+
+    def since(self, last_id: int) -> Tuple[list, bool]:
+        """Events newer than `last_id`, and whether some of them were already evicted."""
+        out = [ev for _ts, ev in self.items if ev.id > last_id]
+        return out, self.evicted_id > last_id
+
+# ---------------- Brokers ----------------
+
+class InProcessBroker:
+    """
+    Single-worker fan-out: publish goes straight to the local queues and
+    into the per-conversation replay ring.
+    """
+
+    def __init__(self):
+        # seeded from the clock so ids keep increasing across restarts
+        self._ids = itertools.count(time.time_ns() // 1000)
+        self._rings: Dict[str, _Ring] = {}
+        self._last_sweep = 0.0
+
+    async def publish(self, cid: str, event: str, data: dict):
+        ev = Event(next(self._ids), event, data, cid=cid)
+        now = time.time()
+        self._rings.setdefault(cid, _Ring()).append(ev, now)
+        self._sweep(now)
+        _deliver(cid, ev)
+
+    def _sweep(self, now: float):
+        # drop rings of idle conversations once everything in them expired
+        if now - self._last_sweep < 30:
+            return
+        self._last_sweep = now
+        for cid in list(self._rings):
+            ring = self._rings[cid]
+            ring.evict(now)
+            if not ring.items:
+                del self._rings[cid]
+
+    async def replay(self, cid: str, last_id: int) -> Tuple[list, bool]:
+        ring = self._rings.get(cid)
+        if not ring:
+            return [], False
+        ring.evict(time.time())
+        return ring.since(last_id)
+
+    def ensure_started(self):
+        pass
+
+    async def stop(self):
+        pass
+
+class SQLiteBroker:
+    """
+    Cross-process fan-out through a shared SQLite file (one per node).
+    Every publish is appended to `sse_bus` (the row id is the event id) and
+    delivered locally; each worker tails the table and delivers rows written
+    by *other* workers to its own subscribers. The table doubles as the
+    replay log and is pruned after `retention_s`; sse_pruned keeps, per
+    conversation, the newest id pruned so far, so replay can tell a gap.
+    While nobody here is subscribed the tail only moves its cursor, so the
+    first subscriber is not handed a backlog of old events as live ones.
+    """
+
+    _READ_BATCH = 500  # rows per tail query
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention_s: float | None = None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_s = retention_s if retention_s is not None else settings.SSE_REPLAY_TTL_S
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._last_id = 0
+        self._task: asyncio.Task | None = None
+        self._last_prune = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sse_bus (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    origin TEXT NOT NULL,
+                    cid TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sse_bus_cid_id ON sse_bus(cid, id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sse_pruned (cid TEXT PRIMARY KEY, max_id INTEGER NOT NULL)")
+            self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sse_bus").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _insert(self, cid: str, event: str, data_json: str) -> int:
+        with self._lock:
+            cur = self._db().execute(
+                "INSERT INTO sse_bus(origin, cid, event, data, created_at) VALUES (?,?,?,?,?)",
+                (self.origin, cid, event, data_json, time.time()),
+            )
+            return cur.lastrowid
+
+    def _read_new(self, deliver: bool = True) -> list[tuple]:
+        """The next batch of rows after the cursor; with deliver=False, skip to the end instead."""
+        with self._lock:
+            db = self._db()
+            if deliver:
+                rows = db.execute(
+                    "SELECT id, origin, cid, event, data FROM sse_bus WHERE id > ? ORDER BY id LIMIT ?",
+                    (self._last_id, self._READ_BATCH),
+                ).fetchall()
+                if rows:
+                    self._last_id = rows[-1][0]
+            else:
+                rows = []
+                self._last_id = db.execute("SELECT COALESCE(MAX(id), ?) FROM sse_bus", (self._last_id,)).fetchone()[0]
+            now = time.time()
+            if now - self._last_prune > self.retention_s / 10:
+                self._prune(db, now - self.retention_s)
+                self._last_prune = now
+            return rows
+
+    def _prune(self, db: sqlite3.Connection, cutoff: float):
+        db.execute("BEGIN")
+        try:
+            db.execute("""
+                INSERT INTO sse_pruned(cid, max_id)
+                SELECT cid, MAX(id) FROM sse_bus WHERE created_at < ? GROUP BY cid
+                ON CONFLICT(cid) DO UPDATE SET max_id = MAX(max_id, excluded.max_id)
+            """, (cutoff,))
+            db.execute("DELETE FROM sse_bus WHERE created_at < ?", (cutoff,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _read_since(self, cid: str, last_id: int) -> Tuple[list, bool]:
+        """Like the in-process ring: the newest SSE_REPLAY_MAX_EVENTS after last_id, flagged when some are missing."""
+        limit = settings.SSE_REPLAY_MAX_EVENTS
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                "SELECT id, event, data FROM sse_bus WHERE cid = ? AND id > ? AND created_at >= ? "
+                "ORDER BY id DESC LIMIT ?",
+                (cid, last_id, time.time() - self.retention_s, limit + 1),
+            ).fetchall()
+            pruned = db.execute("SELECT max_id FROM sse_pruned WHERE cid = ?", (cid,)).fetchone()
+        truncated = len(rows) > limit or (pruned is not None and pruned[0] > last_id)
+        rows = rows[:limit]
+        rows.reverse()
+        return [Event(eid, event, data_json=data, cid=cid) for eid, event, data in rows], truncated
+
+    async def publish(self, cid: str, event: str, data: dict):
+        data_json = json.dumps(data, ensure_ascii=False)
+        eid = await asyncio.to_thread(self._insert, cid, event, data_json)
+        _deliver(cid, Event(eid, event, data, data_json, cid=cid))
+
+    async def replay(self, cid: str, last_id: int) -> Tuple[list, bool]:
+        return await asyncio.to_thread(self._read_since, cid, last_id)
+
+    def ensure_started(self):
+        """Start the tail loop on the running event loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._task and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._tail())
+
+    async def _tail(self):
+        await asyncio.to_thread(self._db)
+        while True:
+            if not any(_SUBS.values()):
+                await asyncio.to_thread(self._read_new, False)
+            else:
+                while True:
+                    rows = await asyncio.to_thread(self._read_new)
+                    for eid, origin, cid, event, data in rows:
+                        if origin != self.origin:
+                            _deliver(cid, Event(eid, event, data_json=data, cid=cid))
+                    if len(rows) < self._READ_BATCH:
+                        break
+            await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+_BROKER: InProcessBroker | SQLiteBroker | None = None
+
+def get_broker() -> InProcessBroker | SQLiteBroker:
+    global _BROKER
+    if _BROKER is None:
+        if settings.SSE_BROKER == "sqlite":
+            path = settings.SSE_BUS_PATH or str(STORAGE_DIR / "sse_bus.db")
+            _BROKER = SQLiteBroker(path, poll_interval=settings.SSE_POLL_MS / 1000.0)
+        else:
+            _BROKER = InProcessBroker()
+    return _BROKER
+
+def set_broker(broker: InProcessBroker | SQLiteBroker | None):
+    global _BROKER
+    _BROKER = broker
+
+# ---------------- Public API ----------------
+
 async def publish(cid: str, event: str, data: dict):
-    msg = (event, data)
-    for q in list(_get_room(cid)):
+    await get_broker().publish(cid, event, data)
+
+_HEARTBEAT_TASK: asyncio.Task | None = None
+
+async def _heartbeat():
+    """
+    One loop for all local subscribers: queue a ping for every stream that
+    has been idle for SSE_HEARTBEAT_S. Writing the ping to a dead socket is
+    what tears the stream down, so no per-message disconnect polling.
+    """
+    while True:
+        await asyncio.sleep(settings.SSE_HEARTBEAT_S)
+        cutoff = time.monotonic() - settings.SSE_HEARTBEAT_S
+        for cid in list(_SUBS):
+            room = _SUBS.get(cid)
+            if not room:
+                _SUBS.pop(cid, None)
+                continue
+            for sub in list(room):
+                if sub.last_put <= cutoff:
+                    sub.ping()
+                    sub.last_put = time.monotonic()
+
+def _ensure_heartbeat():
+    global _HEARTBEAT_TASK
+    loop = asyncio.get_running_loop()
+    if _HEARTBEAT_TASK and not _HEARTBEAT_TASK.done() and _HEARTBEAT_TASK.get_loop() is loop:
+        return
+    _HEARTBEAT_TASK = loop.create_task(_heartbeat())
+
+def join(cid: str, sub: Subscriber):
+    """Add an existing subscriber to another room (one queue, many rooms)."""
+    get_broker().ensure_started()
+    _ensure_heartbeat()
+    _get_room(cid).add(sub)
+
+async def subscribe(cid: str, policy: str | None = None) -> Subscriber:
+    sub = Subscriber(policy)
+    join(cid, sub)
+    return sub
+
+def unsubscribe(cid: str, sub: Subscriber):
+    room = _SUBS.get(cid)
+    if room is None:
+        return
+    room.discard(sub)
+    if not room:
+        del _SUBS[cid]
+
+async def shutdown():
+    global _HEARTBEAT_TASK
+    if _HEARTBEAT_TASK:
+        _HEARTBEAT_TASK.cancel()
+        _HEARTBEAT_TASK = None
+    await get_broker().stop()
+
+def _parse_event_id(raw: str | None) -> int | None:
+    try:
+        return int(raw) if raw not in (None, "") else None
+    except ValueError:
+        return None
+
+def _merged(run: list) -> Event:
+    if len(run) == 1:
+        return run[0]
+    text = "".join(ev.data.get("text_chunk", "") for ev in run)
+    tokens = sum(ev.data.get("tokens", 1) for ev in run)  # inputs may already be merged frames
+    return Event(run[-1].id, "token", {"text_chunk": text, "tokens": tokens}, cid=run[-1].cid)
+
+def _merge_tokens(items: list, max_bytes: int) -> list:
+    """
+    Collapse runs of consecutive `token` events into one frame each, up to
+    `max_bytes` of text per frame. The merged frame carries the id of the
+    last token it contains so Last-Event-ID resume stays exact.
+    """
+    out: list = []
+    run: list[Event] = []
+    run_bytes = 0
+    for ev in items:
+        if ev.event == "token":
+            size = len(ev.data.get("text_chunk", ""))
+            if run and run_bytes + size > max_bytes:
+                out.append(_merged(run))
+                run, run_bytes = [], 0
+            run.append(ev)
+            run_bytes += size
+            continue
+        if run:
+            out.append(_merged(run))
+            run, run_bytes = [], 0
+        out.append(ev)
+    if run:
+        out.append(_merged(run))
+    return out
+
+# timer marker a coalescing subscriber drops into its own queue at the window end
+_WINDOW_END = Event(None, "")
+
+async def _gather_tokens(q: Subscriber, first: Event, window_s: float, max_bytes: int) -> tuple[list, bool]:
+    """
+    Starting from a token event, keep pulling queued events for up to
+    `window_s` or until `max_bytes` of text are buffered. Stops early at the
+    first non-token event so ordering is preserved. Returns the batch and
+    whether a heartbeat ping ended it (the caller sends it after the batch).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + window_s
+
+    def _wake():
         try:
-            q.put_nowait(msg)
+            q.put_nowait(_WINDOW_END)
         except asyncio.QueueFull:
-            pass
-
-async def subscribe(cid: str) -> asyncio.Queue:
-    q: asyncio.Queue = asyncio.Queue(maxsize=100)
-    _get_room(cid).add(q)
-    return q
+            pass  # queue is full, so the next get returns right away anyway
 
-def unsubscribe(cid: str, q: asyncio.Queue):
-    _get_room(cid).discard(q)
+    timer = loop.call_at(deadline, _wake)
+    batch = [first]
+    size = len(first.data.get("text_chunk", ""))
+    pinged = False
+    try:
+        while size < max_bytes and loop.time() < deadline:
+            ev = await q.get()
+            if ev is _PING:
+                pinged = True
+                break
+            if ev is _WINDOW_END:
+                break
+            if ev is _CLOSE:
+                q.put_nowait(_CLOSE)  # let the stream loop see it after flushing
+                break
+            batch.append(ev)
+            if ev.event != "token":
+                break
+            size += len(ev.data.get("text_chunk", ""))
+    finally:
+        timer.cancel()
+    return batch, pinged
 
-async def sse_stream(cid: str) -> AsyncIterator[bytes]:
+async def sse_stream(
+    cid: str,
+    last_event_id: str | None = None,
+    coalesce_ms: int | None = None,
+    coalesce_bytes: int = 1024,
+    overflow: str | None = None,
+) -> AsyncIterator[bytes]:
     """
     Yields Server-Sent Events for the given conversation.
+    With `last_event_id` (the Last-Event-ID header of a reconnecting client)
+    the events missed since that id are replayed before switching to live.
+    With `coalesce_ms`, consecutive `token` events are batched into one frame
+    per window (or per `coalesce_bytes` of text); other events pass through.
+    Frames are encoded once per publish and shared by all subscribers.
+    `overflow` picks the slow-subscriber policy (see Subscriber); idle
+    streams get a `: ping` comment every SSE_HEARTBEAT_S.
     """
-    q = await subscribe(cid)
+    q = await subscribe(cid, overflow)
     try:
         # initial ping (optional)
         yield b": connected\n\n"
+        seen = _parse_event_id(last_event_id)
+        if seen is not None:
+            missed, truncated = await get_broker().replay(cid, seen)
+            if truncated:
+                yield Event(None, "replay_truncated", {"last_event_id": seen}).frame
+            if coalesce_ms:
+                missed = _merge_tokens(missed, coalesce_bytes)
+            for ev in missed:
+                yield ev.frame
+                seen = ev.id
         while True:
-            event, data = await q.get()
-            payload = f"event: {event}\n" + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-            yield payload.encode("utf-8")
+            ev = await q.get()
+            if ev is _PING:
+                yield b": ping\n\n"
+                continue
+            if ev is _CLOSE:
+                yield Event(None, "overflow", {"reason": "slow_consumer", "dropped": q.dropped}).frame
+                return
+            if ev is _WINDOW_END:
+                continue  # stale marker from a window that closed early
+            if seen is not None and ev.id <= seen:
+                continue  # already sent during replay
+            if not (coalesce_ms and ev.event == "token"):
+                yield ev.frame
+                continue
+            batch, pinged = await _gather_tokens(q, ev, coalesce_ms / 1000.0, coalesce_bytes)
+            if seen is not None:
+                batch = [b for b in batch if b.id > seen]
+            for out in _merge_tokens(batch, coalesce_bytes):
+                yield out.frame
+            if pinged:
+                yield b": ping\n\n"
     except asyncio.CancelledError:
         # client disconnected
         pass
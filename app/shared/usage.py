@@ -0,0 +1,312 @@
+# app/shared/usage.py
+"""
+Write-behind usage accounting for the guard wall.
+
+Tool calls debit tasks/tokens in memory (under a lock, so concurrent
+debits from the loop and the offload threads are never lost) and a
+background task flushes the aggregated deltas to user_usage with one
+UPSERT per (user, day) on ux_user_usage_user_day. Quota checks read the
+last persisted totals (loaded once per user/day, refreshed after every
+flush and at most USAGE_CACHE_S old otherwise, which is how usage from
+other processes shows up) plus the deltas not yet written. A read that
+overlaps a flush of the same user/day is not used as the base: it may or
+may not include the deltas being written, so the base the flush leaves
+(or the previous one, which predates them) is used instead.
+
+The guard reserves a request's cost up front: reserve() checks the total
+(including other requests' holds) against the limits and holds the cost
+under the same lock, so concurrent requests cannot all pass the check and
+overshoot it. settle() turns the hold into the debit the request actually
+used; settling without amounts is the refund.
+
+A crash loses at most the deltas since the last flush: bounded by
+USAGE_FLUSH_MS in time and USAGE_MAX_PENDING_TASKS in volume, since
+reaching that many unflushed tasks triggers a flush right away.
+"""
+import asyncio, threading, time
+from datetime import datetime
+from typing import Dict, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.shared.config import settings
+from app.shared.db import AsyncSessionLocal
+
+Key = Tuple[str, str]  # (user_id, day)
+
+class Hold:
+    """Quota reserved for one request by reserve(), until settle()."""
+    __slots__ = ("key", "tasks", "tokens", "open")
+
+    def __init__(self, key: Key, tasks: int, tokens: int):
+        self.key, self.tasks, self.tokens, self.open = key, tasks, tokens, True
+
+_READ = text("SELECT tasks, tokens FROM user_usage WHERE user_id=:u AND day=:d")
+_UPSERT = text("""
+INSERT INTO user_usage (user_id, day, tasks, tokens) VALUES (:u, :d, :t, :k)
+ON CONFLICT (user_id, day) DO UPDATE SET tasks = tasks + excluded.tasks, tokens = tokens + excluded.tokens
+RETURNING tasks, tokens
+""")
+
+def today() -> str:
+    return datetime.utcnow().strftime("%Y%m%d")
+
+def _row(row) -> tuple[int, int]:
+    return (row[0], row[1]) if row else (0, 0)
+
+def read(db: Session, user_id: str, day: str | None = None) -> dict:
+    """Persisted totals only (what a crash would leave)."""
+    tasks, tokens = _row(db.execute(_READ, {"u": user_id, "d": day or today()}).first())
+    return {"tasks": tasks, "tokens": tokens}
+
+async def read_async(db: AsyncSession, user_id: str, day: str | None = None) -> dict:
+    tasks, tokens = _row((await db.execute(_READ, {"u": user_id, "d": day or today()})).first())
+    return {"tasks": tasks, "tokens": tokens}
+
+class UsageMeter:
+    def __init__(self, flush_s: float, max_pending_tasks: int, cache_s: float):
+        self.flush_s = flush_s
+        self.max_pending_tasks = max_pending_tasks
+        self.cache_s = cache_s
+        self._lock = threading.Lock()
+        self._base: Dict[Key, tuple[int, int, float]] = {}  # persisted (tasks, tokens, read at)
+        self._pending: Dict[Key, list[int]] = {}             # debited, not yet flushed
+        self._inflight: Dict[Key, list[int]] = {}            # being written by the current flush
+        self._flushed: Dict[Key, int] = {}                   # flushes that have set the key's base
+        self._held: Dict[Key, list[int]] = {}                # reserved by requests in progress
+        self._pending_tasks = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.counts = {"debits": 0, "flushes": 0, "rows": 0, "loads": 0, "stale_loads": 0, "holds": 0,
+                       "rejected": 0, "errors": 0}
+        self.last_error: str | None = None
+
+    # ---- reads ----
+    _LOAD_WAIT_S = 0.005  # poll while a flush is writing a key that has no base yet
+    _LOAD_TRIES = 200
+
+    def _needs_load(self, key: Key) -> tuple[int, bool] | None:
+        """None when the base can be used as is, else (flushes of key, key in flight) to pass to _load."""
+        with self._lock:
+            base = self._base.get(key)
+            if base is not None and (time.monotonic() - base[2] < self.cache_s or key in self._inflight):
+                return None  # fresh, or predates the deltas in flight, which _total adds
+            return self._flushed.get(key, 0), key in self._inflight
+
+    def _load(self, key: Key, persisted: dict, seen: tuple[int, bool]) -> bool:
+        """Make a persisted read the base, unless a flush of `key` overlapped it."""
+        with self._lock:
+            if seen[1] or (self._flushed.get(key, 0), key in self._inflight) != seen:
+                self.counts["stale_loads"] += 1
+                return False
+            self._base[key] = (persisted["tasks"], persisted["tokens"], time.monotonic())
+            self.counts["loads"] += 1
+            return True
+
+    def _total(self, key: Key) -> dict:
+        with self._lock:
+            return self._total_locked(key)
+
+    def _total_locked(self, key: Key) -> dict:
+        tasks, tokens, _ = self._base.get(key, (0, 0, 0.0))
+        for part in (self._inflight.get(key), self._pending.get(key), self._held.get(key)):
+            if part:
+                tasks += part[0]; tokens += part[1]
+        return {"tasks": tasks, "tokens": tokens}
+
+    def get(self, db: Session, user_id: str) -> dict:
+        """Today's usage: persisted totals plus unflushed debits and open holds."""
+        key = (user_id, today())
+        for _ in range(self._LOAD_TRIES):
+            seen = self._needs_load(key)
+            if seen is None:
+                break
+            if seen[1]:
+                time.sleep(self._LOAD_WAIT_S)
+            elif self._load(key, read(db, user_id, key[1]), seen):
+                break
+        return self._total(key)
+
+    async def get_async(self, db: AsyncSession, user_id: str) -> dict:
+        key = (user_id, today())
+        for _ in range(self._LOAD_TRIES):
+            seen = self._needs_load(key)
+            if seen is None:
+                break
+            if seen[1]:
+                await asyncio.sleep(self._LOAD_WAIT_S)
+            elif self._load(key, await read_async(db, user_id, key[1]), seen):
+                break
+        return self._total(key)
+
+    # ---- writes ----
+    def reserve(self, user_id: str, tasks: int, tokens: int, max_tasks: int, max_tokens: int) -> tuple[Hold | None, dict]:
+        """
+        Hold tasks/tokens for a request if they fit in today's limits:
+        (the hold, or None when they don't, and the usage before it). Call
+        get/get_async first so the persisted totals are loaded.
+        """
+        key = (user_id, today())
+        with self._lock:
+            used = self._total_locked(key)
+            if used["tasks"] + tasks > max_tasks or used["tokens"] + tokens > max_tokens:
+                self.counts["rejected"] += 1
+                return None, used
+            h = self._held.setdefault(key, [0, 0])
+            h[0] += tasks; h[1] += tokens
+            self.counts["holds"] += 1
+        return Hold(key, tasks, tokens), used
+
+    def settle(self, hold: Hold, tasks: int = 0, tokens: int = 0):
+        """Release a hold and debit what the request used in its place (nothing: a refund). Once per hold."""
+        with self._lock:
+            if not hold.open:
+                return
+            hold.open = False
+            h = self._held.get(hold.key)
+            if h is not None:  # None: a day old, dropped by flush()
+                h[0] -= hold.tasks; h[1] -= hold.tokens
+                if not h[0] and not h[1]:
+                    del self._held[hold.key]
+            if not tasks and not tokens:
+                return
+            full = self._add(hold.key, tasks, tokens)
+        self._after_debit(full)
+
+    def debit(self, user_id: str, tasks: int = 1, tokens: int = 0):
+        """Charge usage now; it reaches user_usage with the next flush. Safe from any thread."""
+        with self._lock:
+            full = self._add((user_id, today()), tasks, tokens)
+        self._after_debit(full)
+
+    def _add(self, key: Key, tasks: int, tokens: int) -> bool:
+        p = self._pending.setdefault(key, [0, 0])
+        p[0] += tasks; p[1] += tokens
+        self._pending_tasks += tasks
+        self.counts["debits"] += 1
+        return self._pending_tasks >= self.max_pending_tasks
+
+    def _after_debit(self, full: bool):
+        self._ensure_started()
+        if full:
+            self._signal()
+
+    async def flush(self) -> int:
+        """Write the pending deltas (one UPSERT per user/day); returns rows written."""
+        with self._lock:
+            if not self._pending or self._inflight:  # nothing to do, or a flush is already writing
+                return 0
+            batch, self._pending, self._pending_tasks = self._pending, {}, 0
+            self._inflight = batch
+        try:
+            totals = {}
+            async with AsyncSessionLocal() as db:
+                for (uid, day), (tasks, tokens) in batch.items():
+                    row = (await db.execute(_UPSERT, {"u": uid, "d": day, "t": tasks, "k": tokens})).one()
+                    totals[(uid, day)] = _row(row)
+                await db.commit()
+        except BaseException as e:
+            with self._lock:  # keep the deltas for the next flush
+                for key, (tasks, tokens) in batch.items():
+                    p = self._pending.setdefault(key, [0, 0])
+                    p[0] += tasks; p[1] += tokens
+                    self._pending_tasks += tasks
+                self._inflight = {}
+                self.counts["errors"] += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+            raise
+        now, day = time.monotonic(), today()
+        with self._lock:
+            for key, (tasks, tokens) in totals.items():
+                self._base[key] = (tasks, tokens, now)  # includes other processes' writes
+                self._flushed[key] = self._flushed.get(key, 0) + 1
+            for key in [k for k in self._base if k[1] != day]:
+                del self._base[key]
+                self._flushed.pop(key, None)
+            for key in [k for k in self._held if k[1] != day]:
+                del self._held[key]  # holds never settled (e.g. a stream that was never read)
+            self._inflight = {}
+            self.counts["flushes"] += 1
+            self.counts["rows"] += len(totals)
+        return len(totals)
+
+    # ---- background flusher ----
+    def _ensure_started(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # debited from an offload thread: the loop's flusher picks it up
+        if self._loop is not loop:  # first use, or a new loop (tests)
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def _signal(self):
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wake.set()
+        else:
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self):
+        wake = self._wake
+        while self._wake is wake:  # replaced by stop() or a new loop
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=self.flush_s)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # counted in counts["errors"]; retried on the next tick
+
+    async def stop(self):
+        """Stop the flusher and write whatever is pending."""
+        task, wake = self._task, self._wake
+        self._task = self._loop = self._wake = None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            wake.set()
+            await task  # not cancelled: a flush in progress gets to finish its write
+        await self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending_tasks": self._pending_tasks,
+                "pending_users": len(self._pending),
+                "held_users": len(self._held),
+                "cached_users": len(self._base),
+                "flush_ms": round(self.flush_s * 1000),
+                "max_pending_tasks": self.max_pending_tasks,
+                **self.counts,
+                "last_error": self.last_error,
+            }
+
+_METER: UsageMeter | None = None
+
+def get_meter() -> UsageMeter:
+    global _METER
+    if _METER is None:
+        _METER = UsageMeter(
+            flush_s=settings.USAGE_FLUSH_MS / 1000.0,
+            max_pending_tasks=settings.USAGE_MAX_PENDING_TASKS,
+            cache_s=settings.USAGE_CACHE_S,
+        )
+    return _METER
+
+def stats() -> dict:
+    return get_meter().stats()
+
+async def shutdown():
+    if _METER is not None:
+        await _METER.stop()
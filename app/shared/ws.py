@@ -0,0 +1,111 @@
+# app/shared/ws.py
+import asyncio, json
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.shared import sse
+from app.shared.config import settings
+
+async def ws_multiplex(ws: WebSocket):
+    """
+    One WebSocket, many conversation rooms, backed by the same hub as
+    sse_stream. Client -> server (JSON text):
+        {"op": "subscribe", "conversation_id": "...", "last_event_id": 123?}
+        {"op": "unsubscribe", "conversation_id": "..."}
+    Server -> client: {"conversation_id", "id", "event", "data"} for every
+    event (same ids/payloads as the SSE stream), plus "subscribed",
+    "unsubscribed", "error", "ping" and "overflow" control events.
+    """
+    await ws.accept()
+    # one queue shared by all rooms of this connection
+    sub = sse.Subscriber(maxsize=settings.SSE_QUEUE_SIZE * 4)
+    rooms: dict[str, int | None] = {}  # cid -> last id sent during replay
+    replaying: dict[str, list] = {}  # cid -> live events held back until its replay is sent
+    lock = asyncio.Lock()
+
+    async def _send(text: str):
+        async with lock:
+            await ws.send_text(text)
+
+    def _control(event: str, cid: str | None = None, **data) -> str:
+        return sse.Event(None, event, data, cid=cid).ws_text
+
+    async def _reader():
+        while True:
+            try:
+                msg = json.loads(await ws.receive_text())
+            except ValueError:
+                await _send(_control("error", detail="invalid json"))
+                continue
+            op, cid = msg.get("op"), msg.get("conversation_id")
+            if not cid or op not in ("subscribe", "unsubscribe"):
+                await _send(_control("error", detail="expected {op: subscribe|unsubscribe, conversation_id}"))
+                continue
+            if op == "unsubscribe":
+                rooms.pop(cid, None)
+                replaying.pop(cid, None)
+                sse.unsubscribe(cid, sub)
+                await _send(_control("unsubscribed", cid))
+                continue
+            if cid in rooms:
+                continue
+            if len(rooms) >= settings.WS_MAX_ROOMS:
+                await _send(_control("error", cid, detail=f"room limit {settings.WS_MAX_ROOMS} reached"))
+                continue
+            seen = sse._parse_event_id(str(msg.get("last_event_id") or ""))
+            rooms[cid] = seen
+            sse.join(cid, sub)
+            await _send(_control("subscribed", cid))
+            if seen is None:
+                continue
+            # live events for this room queue up behind the replay instead of overtaking it
+            held = replaying[cid] = []
+            try:
+                missed, truncated = await sse.get_broker().replay(cid, seen)
+                if truncated:
+                    await _send(_control("replay_truncated", cid, last_event_id=seen))
+                for ev in missed:
+                    await _send(ev.ws_text)
+                    rooms[cid] = ev.id
+                while held and cid in rooms:  # the writer may add more while we send
+                    ev = held.pop(0)
+                    if ev.id > rooms[cid]:
+                        await _send(ev.ws_text)
+                        rooms[cid] = ev.id
+            finally:
+                replaying.pop(cid, None)
+
+    async def _writer():
+        while True:
+            ev = await sub.get()
+            if ev is sse._PING:
+                await _send(_control("ping"))
+                continue
+            if ev is sse._CLOSE:
+                await _send(_control("overflow", reason="slow_consumer", dropped=sub.dropped))
+                await ws.close(code=1013)
+                return
+            if ev.cid not in rooms:
+                continue  # unsubscribed while queued
+            if ev.cid in replaying:
+                replaying[ev.cid].append(ev)  # the reader sends it after the replay
+                continue
+            seen = rooms[ev.cid]
+            if seen is not None and ev.id <= seen:
+                continue  # already sent during replay
+            await _send(ev.ws_text)
+
+    reader = asyncio.create_task(_reader())
+    writer = asyncio.create_task(_writer())
+    try:
+        await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in (reader, writer):
+            t.cancel()
+        for t in (reader, writer):
+            try:
+                await t
+            except (asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+                pass
+        for cid in list(rooms):
+            sse.unsubscribe(cid, sub)
@@ -0,0 +1,124 @@
+# app/tools/batch/api.py
+import asyncio, json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.shared.config import settings
+from app.shared import usage
+from app.shared.guard import guard_gate
+from app.shared.http import ok, err
+from app.tools.executor import execute
+from app.tools.limits import ToolBusy
+from app.tools.registry import get_tool
+from app.tools.schema_validator import validate_payload
+
+router = APIRouter(prefix="/tools/batch", tags=["Tools: Batch"])
+
+class BatchCall(BaseModel):
+    name: str
+    args: Dict[str, Any] = Field(default_factory=dict)
+    id: Optional[str] = Field(default=None, description="Echoed back to match results to calls")
+
+class BatchReq(BaseModel):
+    calls: List[BatchCall] = Field(min_length=1)
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=32)
+    stream: bool = Field(default=False, description="NDJSON, one line per call as it completes, then a summary line")
+
+def _error(code: str, exc: BaseException | str) -> dict:
+    return {"ok": False, "error": {"code": code, "message": str(exc) or type(exc).__name__}}
+
+async def _one(i: int, call: BatchCall, uid: str, sem: asyncio.Semaphore) -> tuple[dict, int]:
+    """(result item, token_cost to bill) for one call; failures become the item's error."""
+    item = {"index": i, "id": call.id, "name": call.name}
+    async with sem:
+        try:
+            # no session here: services that need one get their own on the offload pool
+            out, cost = await execute(call.name, call.args, user_id=uid)
+        except ToolBusy as e:
+            return {**item, **_error("tool_busy", e)}, 0
+        except TimeoutError as e:
+            return {**item, **_error("tool_timeout", e)}, 0
+        except (ValueError, KeyError) as e:
+            return {**item, **_error("invalid_input", e)}, 0
+        except Exception as e:
+            return {**item, **_error("tool_failed", e)}, 0
+    return {**item, "ok": True, "data": out}, cost
+
+def _validate(calls: List[BatchCall]) -> Dict[int, dict]:
+    """index -> error item for calls that must not run."""
+    invalid = {}
+    for i, call in enumerate(calls):
+        meta = get_tool(call.name)
+        if not meta or not meta.get("handler"):
+            invalid[i] = {"index": i, "id": call.id, "name": call.name, **_error("unknown_tool", call.name)}
+            continue
+        valid, msg = validate_payload(meta.get("input_schema"), call.args)
+        if not valid:
+            invalid[i] = {"index": i, "id": call.id, "name": call.name, **_error("invalid_input", msg)}
+    return invalid
+
+async def _results(req: BatchReq, uid: str, invalid: Dict[int, dict], hold: usage.Hold) -> AsyncIterator[dict]:
+    """Result items in completion order, then the summary (billing happens once, before it, by settling `hold`)."""
+    sem = asyncio.Semaphore(req.max_concurrency or settings.TOOL_BATCH_CONCURRENCY)
+    for item in invalid.values():
+        yield item
+    pending = [
+        asyncio.create_task(_one(i, call, uid, sem))
+        for i, call in enumerate(req.calls) if i not in invalid
+    ]
+    billed_tasks = billed_tokens = succeeded = 0
+    try:
+        for fut in asyncio.as_completed(pending):
+            item, cost = await fut
+            succeeded += item["ok"]
+            if cost:
+                billed_tasks += 1
+                billed_tokens += cost
+            yield item
+    finally:
+        for t in pending:
+            t.cancel()  # client went away mid-stream
+        usage.get_meter().settle(hold, tasks=billed_tasks, tokens=billed_tokens)
+    yield {
+        "done": True,
+        "count": len(req.calls),
+        "succeeded": succeeded,
+        "failed": len(req.calls) - succeeded,
+        "billed": {"tasks": billed_tasks, "tokens": billed_tokens},
+    }
+
+@router.post("", summary="Run many registry tool calls in one request")
+async def api_batch(req: BatchReq, ctx=Depends(guard_gate("batch", token_cost=0))):
+    """
+    One JWT decode, one quota hold and one usage write for the whole batch.
+    Calls are validated against the registry up front (invalid ones are
+    reported, not run), executed with bounded concurrency through the
+    shared executor (feature limits and the result cache apply; cache hits
+    are not billed) and charged once in aggregate at the end.
+    """
+    if len(req.calls) > settings.TOOL_BATCH_MAX:
+        return err("batch_too_large", status=413, details=f"at most {settings.TOOL_BATCH_MAX} calls")
+    invalid = _validate(req.calls)
+    # hold the whole batch in place of the gate's single call; refuse up front if it cannot fit
+    est_tasks = len(req.calls) - len(invalid)
+    est_tokens = sum(get_tool(c.name).get("token_cost", 5000) for i, c in enumerate(req.calls) if i not in invalid)
+    uid, cap, meter = ctx["user"]["sub"], ctx["max"], usage.get_meter()
+    meter.settle(ctx["hold"])
+    hold, used = meter.reserve(uid, est_tasks, est_tokens, cap["tasks"], cap["tokens"])
+    if hold is None:
+        return err("quota_exceeded", code="quota_exceeded", status=402, details={
+            "needed": {"tasks": est_tasks, "tokens": est_tokens}, "usage": used, "max": cap,
+        })
+
+    if req.stream:
+        async def _ndjson():
+            async for item in _results(req, uid, invalid, hold):
+                yield json.dumps(item, default=str) + "\n"
+        return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+    items = [item async for item in _results(req, uid, invalid, hold)]
+    summary = items.pop()
+    return ok({"results": sorted(items, key=lambda r: r["index"]), **{k: v for k, v in summary.items() if k != "done"}})
@@ -2,15 +2,14 @@
 from typing import List, Optional, Literal
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel, AnyUrl
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-# If you want idempotency/caching, uncomment these:
-# from sqlalchemy.orm import Session
-# from app.shared.db import get_db
-# from app.shared.idempotency import require_idem, save_idem
-
-from .service import browse  # async def browse(url: str, actions: list[dict] | None) -> dict
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
+from app.shared.db import get_async_db
+from app.shared.idem import require_idem, save_idem
 
 router = APIRouter(prefix="/tools/browser", tags=["Tools: Browser"])
 
@@ -32,12 +31,12 @@ class BrowseReq(BaseModel):
 async def api_browse(
     body: BrowseReq,
     ctx = Depends(guard_gate("browser")),
-    # If you enable idempotency, also add:
-    # db: Session = Depends(get_db),
-    # idem = Depends(lambda db=db, body=body: require_idem(db=db, payload=body.model_dump())),
+    adb: AsyncSession = Depends(get_async_db),
+    idem = Depends(require_idem),
 ):
     try:
-        out = await browse(str(body.url), [a.model_dump() for a in (body.actions or [])])
+        args = {"url": str(body.url), "actions": [a.model_dump() for a in (body.actions or [])]}
+        out = await run_gated("browser.screenshot", args, ctx)
 
         # Expect your service to return {"ok": True, "screenshot_path": "...", ...}
         if not out.get("ok"):
@@ -47,15 +46,14 @@ async def api_browse(
                 details=out.get("error") or "Unknown browser error"
             )
 
-        bump_after_tool(ctx, token_cost=8000)
-
-        # If you enable idempotency:
-        # resp = ok(out)
-        # save_idem(db, idem.get("idem"), resp)
-        # return resp
-
-        return ok(out)
+        resp = ok(out)
+        await save_idem(adb, idem, resp)
+        return resp
 
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         # e.g., bad selector, invalid action
         return err("invalid_input", status=400, details=str(e))
@@ -1,13 +1,14 @@
 from typing import List, Dict, Any, Optional
 from pathlib import Path
-import os, sys, json, subprocess, shlex, tempfile, time
+import asyncio, os, sys, json, signal, subprocess, shlex, tempfile, threading, time
 
 from app.shared.artifacts import save_bytes
 from app.shared.config import settings
+from app.shared.offload import Cancelled, run_cancellable
 
 # --- CLI fallback helpers you already added (find browser + _cli_screenshot) ---
 
-def _cli_run(url: str, actions: List[Dict[str, Any]] | None) -> Dict[str, Any]:
+def _cli_run(url: str, actions: List[Dict[str, Any]] | None, cancel: threading.Event | None = None) -> Dict[str, Any]:
     """CLI doesn't support DOM interactions; we approximate:
        - always goto(url)
        - obey simple waits (wait ms)
@@ -16,14 +17,16 @@ def _cli_run(url: str, actions: List[Dict[str, Any]] | None) -> Dict[str, Any]:
     """
     acts = actions or []
     step_errors = []
+    cancel = cancel or threading.Event()
     # honor waits (ms) to let pages load dynamic content
     for step in acts:
         if step.get("type") == "wait" and step.get("ms"):
-            time.sleep(max(0, int(step["ms"])) / 1000.0)
+            if cancel.wait(max(0, int(step["ms"])) / 1000.0):
+                raise Cancelled(url)
         elif step.get("type") in ("click", "type", "wait_for"):
             step_errors.append({"step": step, "error": "unsupported_in_cli"})
     # one-shot screenshot
-    shot = _cli_screenshot(url)
+    shot = _cli_screenshot(url, cancel=cancel)
     if shot.get("ok"):
         shot["step_errors"] = step_errors
     return shot
@@ -37,7 +40,6 @@ except Exception:
     pass
 
 def _ensure_selector_policy():
-    import asyncio
     if sys.platform.startswith("win"):
         try: asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         except Exception: pass
@@ -93,10 +95,26 @@ def _find_browser_binary() -> Optional[str]:
     # 3) Nothing found
     return None
 
-def _cli_screenshot(url: str, width: int = 1366, height: int = 900) -> Dict[str, Any]:
+_CLI_TIMEOUT_S = 45
+_CLI_POLL_S = 0.2
+
+def _kill_tree(proc: subprocess.Popen):
+    """Kill the browser and the renderer/GPU helpers it spawned, then reap it."""
+    if proc.poll() is None:
+        try:
+            if sys.platform.startswith("win"):
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True, timeout=10)
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)  # own session, see start_new_session below
+        except (ProcessLookupError, OSError, subprocess.TimeoutExpired):
+            proc.kill()
+    proc.wait()
+
+def _cli_screenshot(url: str, width: int = 1366, height: int = 900, cancel: threading.Event | None = None) -> Dict[str, Any]:
     """
     Use Chrome/Edge CLI to take a full-page screenshot. No scrolling/actions —
     just load and capture, which is sufficient for Phase 2 demo + quotas.
+    Setting `cancel` kills the browser process tree within _CLI_POLL_S.
     """
     bin_path = _find_browser_binary()
     if not bin_path:
@@ -119,64 +137,94 @@ def _cli_screenshot(url: str, width: int = 1366, height: int = 900) -> Dict[str,
         f"--screenshot={tmp_path}",
         url,
     ]
+    proc = None
     try:
-        # IMPORTANT: use subprocess.run (not asyncio). Works on all OSes.
-        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=45)
+        # IMPORTANT: blocking Popen (not asyncio subprocesses), polled so it can be killed. Works on all OSes.
+        proc = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            start_new_session=not sys.platform.startswith("win"),
+        )
+        deadline = time.monotonic() + _CLI_TIMEOUT_S
+        while True:
+            try:
+                _, stderr = proc.communicate(timeout=_CLI_POLL_S)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled(url)
+                if time.monotonic() > deadline:
+                    raise
         if proc.returncode != 0:
             return {"ok": False, "error": "browser_cli_failed",
-                    "detail": proc.stderr.decode(errors="ignore")[:2000]}
+                    "detail": stderr.decode(errors="ignore")[:2000]}
         # read screenshot bytes and persist to artifacts dir
         data = Path(tmp_path).read_bytes()
         art_path = save_bytes("screenshot", "png", data)
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
         return {"ok": True, "screenshot_path": art_path, "engine": "chrome-cli"}
     except subprocess.TimeoutExpired:
-        return {"ok": False, "error": "browser_cli_timeout", "detail": "Timed out creating screenshot (45s)."}
+        return {"ok": False, "error": "browser_cli_timeout", "detail": f"Timed out creating screenshot ({_CLI_TIMEOUT_S}s)."}
+    except Cancelled:
+        raise
     except Exception as e:
         return {"ok": False, "error": "browser_cli_exception", "detail": repr(e)}
+    finally:
+        if proc is not None:
+            _kill_tree(proc)
+        if os.path.exists(tmp_path):
+            try: os.remove(tmp_path)
+            except Exception: pass
 
 # ---------- Playwright primary (when it works) ----------
 
+_PW_CLOSE_TIMEOUT_S = 5
+
+async def _pw_capture(browser, url: str, actions: List[Dict[str, Any]] | None) -> Dict[str, Any]:
+    context = await browser.new_context(viewport={"width":1366,"height":900}, ignore_https_errors=True)
+    page = await context.new_page()
+
+    step_errors = []
+    # Always start with goto(url) even if actions provided
+    await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+
+    for step in (actions or []):
+        try:
+            t = step.get("type")
+            if t == "goto" and step.get("url"):
+                await page.goto(step["url"], wait_until="domcontentloaded", timeout=30000)
+            elif t == "click" and step.get("selector"):
+                await page.click(step["selector"], timeout=15000)
+            elif t == "type" and step.get("selector") is not None:
+                await page.fill(step["selector"], step.get("text",""), timeout=15000)
+            elif t == "scroll":
+                await page.mouse.wheel(0, int(step.get("y", 800)))
+            elif t == "wait_for" and step.get("selector"):
+                await page.wait_for_selector(step["selector"], timeout=15000)
+            elif t == "wait" and step.get("ms"):
+                await page.wait_for_timeout(int(step["ms"]))
+            else:
+                step_errors.append({"step": step, "error": "unknown_or_incomplete"})
+        except PWTimeoutError as e:
+            step_errors.append({"step": step, "error": "timeout", "detail": str(e)})
+        except Exception as e:
+            step_errors.append({"step": step, "error": "exception", "detail": repr(e)})
+
+    png = await page.screenshot(full_page=True)
+    art_path = save_bytes("screenshot","png", png)
+    return {"ok": True, "screenshot_path": art_path, "engine": "playwright", "step_errors": step_errors}
+
 async def _pw_browse(url: str, actions: List[Dict[str, Any]] | None) -> Dict[str, Any]:
     _ensure_selector_policy()
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True, args=["--disable-gpu","--no-sandbox","--disable-dev-shm-usage"])
-        context = await browser.new_context(viewport={"width":1366,"height":900}, ignore_https_errors=True)
-        page = await context.new_page()
-
-        step_errors = []
-        # Always start with goto(url) even if actions provided
-        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-
-        for step in (actions or []):
+        try:
+            return await _pw_capture(browser, url, actions)
+        finally:
+            # also on cancellation/errors mid-page; closing the browser closes its contexts.
+            # Bounded, so a hung driver can't pin a cancelled run.
             try:
-                t = step.get("type")
-                if t == "goto" and step.get("url"):
-                    await page.goto(step["url"], wait_until="domcontentloaded", timeout=30000)
-                elif t == "click" and step.get("selector"):
-                    await page.click(step["selector"], timeout=15000)
-                elif t == "type" and step.get("selector") is not None:
-                    await page.fill(step["selector"], step.get("text",""), timeout=15000)
-                elif t == "scroll":
-                    await page.mouse.wheel(0, int(step.get("y", 800)))
-                elif t == "wait_for" and step.get("selector"):
-                    await page.wait_for_selector(step["selector"], timeout=15000)
-                elif t == "wait" and step.get("ms"):
-                    await page.wait_for_timeout(int(step["ms"]))
-                else:
-                    step_errors.append({"step": step, "error": "unknown_or_incomplete"})
-            except PWTimeoutError as e:
-                step_errors.append({"step": step, "error": "timeout", "detail": str(e)})
-            except Exception as e:
-                step_errors.append({"step": step, "error": "exception", "detail": repr(e)})
-
-        png = await page.screenshot(full_page=True)
-        art_path = save_bytes("screenshot","png", png)
-        await browser.close()
-    return {"ok": True, "screenshot_path": art_path, "engine": "playwright", "step_errors": step_errors}
+                await asyncio.wait_for(browser.close(), timeout=_PW_CLOSE_TIMEOUT_S)
+            except Exception:
+                pass
 
 # ---------- Public API used by the router ----------
 
@@ -184,14 +232,14 @@ async def browse(url: str, actions: List[Dict[str, Any]] | None = None) -> Dict[
     engine = settings.BROWSER_ENGINE.lower()
     # Force CLI on Windows unless explicitly overridden to 'playwright'
     if engine == "cli" or (sys.platform.startswith("win") and engine != "playwright"):
-        return _cli_run(url, actions)
+        return await run_cancellable(_cli_run, url, actions)
 
     if _HAS_PW and engine in ("auto","playwright"):
         try:
             return await _pw_browse(url, actions)
         except Exception as e:
-            out = _cli_run(url, actions)
+            out = await run_cancellable(_cli_run, url, actions)
             if out.get("ok"): out["note"] = f"Playwright failed: {repr(e)[:120]}"
             return out
 
-    return _cli_run(url, actions)
\ No newline at end of file
+    return await run_cancellable(_cli_run, url, actions)
\ No newline at end of file
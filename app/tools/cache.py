@@ -0,0 +1,133 @@
+# app/tools/cache.py
+"""
+Result cache for deterministic, read-only tools.
+
+A registry entry opts in with `cache_ttl_s` (and `cache_scope: "user"`
+when the output depends on the caller, e.g. their files). The key is the
+tool name plus the canonical JSON of the args the service is actually
+called with (app.shared.idem._sig), so argument order, dropped unknown
+keys and None defaults don't split entries.
+
+Lookups go to an in-process LRU first, then, with TOOL_CACHE_SQLITE, to
+the tool_cache table shared by every worker process. Values are stored as
+JSON text so a hit always returns a fresh copy. Hits are not executed and
+not billed; outputs reporting an error are never stored.
+"""
+import json, time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from sqlalchemy import text
+
+from app.shared.config import settings
+from app.shared.db import engine
+from app.shared.idem import _sig
+from app.shared.offload import run_io
+
+MISS = object()
+
+def key(tool: str, args: dict, user_id: str | None = None) -> str:
+    return _sig({"tool": tool, "args": args, "user": user_id})
+
+def cacheable(out: Any) -> bool:
+    if isinstance(out, dict):
+        return out.get("ok") is not False and "error" not in out
+    return out is not None
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (expires_at, json)
+
+    def get(self, k: str, now: float) -> str | None:
+        item = self._items.get(k)
+        if item is None:
+            return None
+        if item[0] <= now:
+            del self._items[k]
+            return None
+        self._items.move_to_end(k)
+        return item[1]
+
+    def put(self, k: str, expires_at: float, value: str):
+        self._items[k] = (expires_at, value)
+        self._items.move_to_end(k)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+def _sql_get(k: str, now: float) -> tuple[str, float] | None:
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT value_json, expires_at FROM tool_cache WHERE key = :k AND expires_at > :now"),
+            {"k": k, "now": now},
+        ).first()
+
+def _sql_put(k: str, tool: str, expires_at: float, value: str, purge: bool):
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR REPLACE INTO tool_cache (key, tool, value_json, expires_at) VALUES (:k, :tool, :v, :exp)"),
+            {"k": k, "tool": tool, "v": value, "exp": expires_at},
+        )
+        if purge:
+            conn.execute(text("DELETE FROM tool_cache WHERE expires_at <= :now"), {"now": time.time()})
+
+class ToolCache:
+    _PURGE_EVERY = 256  # SQLite puts between sweeps of expired rows
+
+    def __init__(self, size: int, sqlite: bool):
+        self.lru = _LRU(size)
+        self.sqlite = sqlite
+        self._puts = 0
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, tool: str, what: str):
+        c = self.counts.setdefault(tool, {"hits": 0, "sqlite_hits": 0, "misses": 0, "stores": 0})
+        c[what] += 1
+
+    async def get(self, tool: str, k: str) -> Any:
+        """Cached output, or MISS."""
+        now = time.time()
+        raw = self.lru.get(k, now)
+        if raw is None and self.sqlite:
+            row = await run_io(_sql_get, k, now)
+            if row is not None:
+                raw, expires_at = row
+                self.lru.put(k, expires_at, raw)  # another process stored it; keep it local too
+                self._count(tool, "sqlite_hits")
+        elif raw is not None:
+            self._count(tool, "hits")
+        if raw is None:
+            self._count(tool, "misses")
+            return MISS
+        return json.loads(raw)
+
+    async def put(self, tool: str, k: str, out: Any, ttl_s: float):
+        raw = json.dumps(out, default=str)
+        expires_at = time.time() + ttl_s
+        self.lru.put(k, expires_at, raw)
+        if self.sqlite:
+            self._puts += 1
+            await run_io(_sql_put, k, tool, expires_at, raw, self._puts % self._PURGE_EVERY == 0)
+        self._count(tool, "stores")
+
+    def stats(self) -> dict:
+        return {"lru_size": len(self.lru), "lru_max": self.lru.size, "sqlite": self.sqlite, "tools": self.counts}
+
+_CACHE: ToolCache | None = None
+
+def get_cache() -> ToolCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ToolCache(settings.TOOL_CACHE_SIZE, settings.TOOL_CACHE_SQLITE)
+    return _CACHE
+
+def reset():
+    """Drop the in-process tier and counters (tests)."""
+    global _CACHE
+    _CACHE = None
+
+def stats() -> dict:
+    return get_cache().stats()
@@ -4,13 +4,15 @@ import uuid
 
 _MEM: dict[str, list[dict]] = {}
 
-def create_event(user_id: str, title: str, start: str, end: str, location: str | None = None):
+def create_event(user_id: str, title: str, start: str, end: str | None = None, location: str | None = None,
+                 attendees: list[str] | None = None):
     e = {
         "id": uuid.uuid4().hex,
         "title": title,
         "start": start,
         "end": end,
         "location": location,
+        "attendees": attendees or [],
         "created_at": datetime.utcnow().isoformat() + "Z",
     }
     _MEM.setdefault(user_id, []).append(e)
@@ -1,35 +1,32 @@
 # app/tools/csv/api.py
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
 
-from app.shared.db import get_db
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import preview_csv
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
 
 router = APIRouter(prefix="/tools/csv", tags=["Tools: CSV"])
 
-def current_user_id() -> str:
-    # TODO: replace with real auth/JWT extraction
-    return "demo-user"
-
 class CSVPreviewIn(BaseModel):
     file_id: str = Field(..., examples=["f_123"])
     limit: int | None = Field(50, ge=1, le=5000)
 
 @router.post("/preview", summary="Preview a CSV (headers + first N rows) and store a normalized copy")
-def api_csv_preview(
+async def api_csv_preview(
     inb: CSVPreviewIn,
     ctx = Depends(guard_gate("csv")),
-    db: Session = Depends(get_db),
 ):
     try:
-        out = preview_csv(db, current_user_id(), inb.file_id, limit=inb.limit or 50)
+        out = await run_gated("csv.preview", inb.model_dump(), ctx)
         if not out.get("ok"):
             return err("csv_failed", status=500, details=out.get("error") or "Unknown error")
-        bump_after_tool(ctx, token_cost=1500)
         return ok(out)
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except FileNotFoundError as e:
         return err("file_not_found", status=404, details=str(e))
     except ValueError as e:
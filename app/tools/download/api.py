@@ -1,13 +1,14 @@
 # app/tools/download/api.py
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel, HttpUrl
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from app.shared.db import get_db
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
+from app.shared.db import get_async_db
 from app.shared.idem import require_idem, save_idem
-from .service import fetch
 
 router = APIRouter(prefix="/tools/download", tags=["Tools: Download"])
 
@@ -15,18 +16,21 @@ class DownloadIn(BaseModel):
     url: HttpUrl
 
 @router.post("/fetch")
-def api_download(
+async def api_download(
     inb: DownloadIn,
     ctx=Depends(guard_gate("download")),
-    db: Session = Depends(get_db),
-    idem=Depends(lambda db=Depends(get_db), inb=Depends(DownloadIn): require_idem(db=db, payload=inb.model_dump())),
+    adb: AsyncSession = Depends(get_async_db),
+    idem=Depends(require_idem),
 ):
     try:
-        out = fetch(str(inb.url))
+        out = await run_gated("download.fetch", {"url": str(inb.url)}, ctx)
         resp = ok(out)
-        save_idem(db, idem.get("idem"), resp)
-        bump_after_tool(ctx, token_cost=2000)
+        await save_idem(adb, idem, resp)
         return resp
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         return err("invalid_download", code="invalid_download", status=400, details=str(e))
     except Exception as e:
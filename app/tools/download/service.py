@@ -1,11 +1,16 @@
 # app/tools/download/service.py
 from pathlib import Path
-import uuid, urllib.request
+import threading, uuid, urllib.request
+
+from app.shared.offload import Cancelled
 
 ARTIFACTS = Path("storage/artifacts")
 ARTIFACTS.mkdir(parents=True, exist_ok=True)
 
-def fetch(url: str):
+_CHUNK = 64 * 1024
+_READ_TIMEOUT_S = 10  # a stalled read also bounds how long a cancel can take
+
+def fetch(url: str, cancel: threading.Event | None = None):
     if not url:
         raise ValueError("url required")
     out = ARTIFACTS / f"download_{uuid.uuid4().hex}"
@@ -13,6 +18,16 @@ def fetch(url: str):
     if "." in url.rsplit("/", 1)[-1]:
         out = out.with_suffix("." + url.rsplit(".", 1)[-1])
 
-    urllib.request.urlretrieve(url, out)
-    size = out.stat().st_size
+    # streamed in chunks so a cancelled run stops reading and leaves no partial file
+    size = 0
+    try:
+        with urllib.request.urlopen(url, timeout=_READ_TIMEOUT_S) as resp, open(out, "wb") as f:
+            while chunk := resp.read(_CHUNK):
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled(url)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        out.unlink(missing_ok=True)
+        raise
     return {"ok": True, "artifact_path": str(out), "size": size}
@@ -2,8 +2,9 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel, EmailStr
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import draft_email
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
 
 router = APIRouter(prefix="/tools/email", tags=["Tools: Email"])
 
@@ -14,11 +15,14 @@ class EmailIn(BaseModel):
     dry_run: bool = True
 
 @router.post("/draft_send")
-def api_email(inb: EmailIn, ctx=Depends(guard_gate("email"))):
+async def api_email(inb: EmailIn, ctx=Depends(guard_gate("email"))):
     try:
-        out = draft_email(inb.to, inb.subject, inb.body, dry_run=inb.dry_run)
-        bump_after_tool(ctx, token_cost=3000)
+        out = await run_gated("email.draft_send", inb.model_dump(), ctx)
         return ok(out)
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         return err("invalid_email", status=400, details=str(e))
     except Exception as e:
@@ -6,7 +6,9 @@ class EmailDraft(BaseModel):
     subject: str
     body: str
 
-def draft_email(to: str, subject: str, body: str) -> dict:
+def draft_email(to: str, subject: str, body: str, dry_run: bool = True) -> dict:
+    if not dry_run:
+        raise ValueError("sending is not configured; only dry_run drafts are supported")
     draft = EmailDraft(to=to, subject=subject, body=body).model_dump()
     path = save_json("email-draft", draft)
     return {"status": "dry-run", "artifact_path": path, **draft}
@@ -0,0 +1,126 @@
+# app/tools/executor.py
+import asyncio, importlib, inspect
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+from app.shared.db import SessionLocal
+from app.shared import usage
+from app.shared.guard import bump_for_user
+from app.shared.offload import run_cancellable, run_cpu, run_io
+from . import cache, limits
+from .registry import ToolMeta, get_tool
+
+class UnknownTool(LookupError):
+    """No registry entry (or no handler) by that name; not a KeyError, which services use for "not found"."""
+
+class InvalidArgs(ValueError):
+    """Arguments the tool does not declare; routes answer ValueError as invalid_input."""
+
+class _Handler:
+    """A registry entry with its service function imported and introspected once."""
+    __slots__ = ("meta", "fn", "is_async", "params", "var_kw", "accepts", "cancellable", "sem")
+
+    def __init__(self, meta: ToolMeta):
+        mod, _, attr = meta["handler"].partition(":")
+        fn = getattr(importlib.import_module(mod), attr)
+        sig = inspect.signature(fn)
+        self.meta = meta
+        self.fn: Callable[..., Any] = fn
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.params = frozenset(sig.parameters)
+        self.var_kw = any(p.kind is p.VAR_KEYWORD for p in sig.parameters.values())
+        # argument names callers may pass: the input_schema's properties, else the signature's
+        props = (meta.get("input_schema") or {}).get("properties")
+        self.accepts = frozenset(props) if props is not None else self.params - {"db", "user_id", "cancel"}
+        # sync services taking `cancel` (a threading.Event) stop when the call is cancelled
+        self.cancellable = not self.is_async and "cancel" in self.params
+        self.sem = asyncio.Semaphore(meta.get("max_concurrency") or 8)
+
+    def kwargs(self, args: dict, db: Session | None, user_id: str | None) -> dict:
+        # None means "use the service default", so an undeclared key set to None is not an error
+        kw = {k: v for k, v in args.items() if v is not None}
+        unknown = kw.keys() - self.accepts
+        if unknown:
+            raise InvalidArgs(f"{self.meta['name']}: unknown argument(s) {', '.join(sorted(unknown))}")
+        if "db" in self.params and (db is not None or self.is_async):
+            kw["db"] = db  # otherwise the sync service opens its own, on the pool (_with_session)
+        if "user_id" in self.params:
+            kw["user_id"] = user_id
+        return kw
+
+_HANDLERS: dict[str, _Handler] = {}
+
+def resolve(name: str) -> _Handler:
+    h = _HANDLERS.get(name)
+    if h is None:
+        meta = get_tool(name)
+        if not meta or not meta.get("handler"):
+            raise UnknownTool(name)
+        h = _HANDLERS[name] = _Handler(meta)
+    return h
+
+async def run_tool(
+    name: str,
+    args: dict | None,
+    *,
+    db: Session | None = None,
+    user_id: str | None = None,
+    bill: bool = True,
+) -> Any:
+    """
+    Execute a registered tool: one dict lookup, the service called with
+    its declared arguments (sync services run on the offload pools), bounded
+    by its guard_feature's slots and deadline (app.tools.limits; raises
+    ToolBusy when no slot frees up in time) and the entry's
+    timeout_s / max_concurrency, then billed token_cost against the guard
+    wall on success. Cancelling the caller (or hitting timeout_s) cancels
+    the service too: async ones directly, sync ones that accept `cancel`
+    through offload.run_cancellable. Entries with cache_ttl_s are answered
+    from app.tools.cache when possible; a hit skips all of the above.
+    """
+    out, cost = await execute(name, args, db=db, user_id=user_id)
+    if bill and cost and user_id:
+        bump_for_user(user_id, token_cost=cost, tasks_inc=1)
+    return out
+
+async def execute(name: str, args: dict | None, *, db: Session | None = None, user_id: str | None = None) -> tuple[Any, int]:
+    """run_tool without the billing: (output, token_cost to bill for it, 0 for a cache hit)."""
+    h = resolve(name)
+    kw = h.kwargs(args or {}, db, user_id)
+    ttl = h.meta.get("cache_ttl_s")
+    if ttl:
+        scope_user = user_id if h.meta.get("cache_scope") == "user" else None
+        ck = cache.key(name, {k: v for k, v in kw.items() if k not in ("db", "user_id")}, scope_user)
+        out = await cache.get_cache().get(name, ck)
+        if out is not cache.MISS:
+            return out, 0
+    feature = limits.feature(h.meta.get("guard_feature"))
+    fn, fn_args = h.fn, ()
+    if "db" in h.params and "db" not in kw and not h.is_async:
+        fn, fn_args = _with_session, (h.fn,)
+    async with feature.slot(), h.sem:
+        if h.is_async:
+            call = h.fn(**kw)
+        elif h.cancellable:
+            call = run_cancellable(fn, *fn_args, **kw)
+        else:
+            call = (run_cpu if h.meta.get("offload") == "cpu" else run_io)(fn, *fn_args, **kw)
+        out = await asyncio.wait_for(call, timeout=feature.deadline(h.meta.get("timeout_s")))
+    if ttl and cache.cacheable(out):
+        await cache.get_cache().put(name, ck, out, ttl)
+    return out, h.meta.get("token_cost", 5000)
+
+def _with_session(fn: Callable[..., Any], **kw) -> Any:
+    """Call a sync service with a session of its own, opened and closed on the pool thread."""
+    with SessionLocal() as db:
+        return fn(db=db, **kw)
+
+async def run_gated(name: str, args: dict | None, ctx: dict) -> Any:
+    """
+    run_tool for REST routes: the user comes from the guard_gate context and
+    the call is billed by settling the quota it holds (a cache hit: refunded);
+    services needing a sync session get their own.
+    """
+    out, cost = await execute(name, args, user_id=ctx["user"]["sub"])
+    usage.get_meter().settle(ctx["hold"], tasks=1 if cost else 0, tokens=cost)
+    return out
@@ -0,0 +1,150 @@
+# app/tools/limits.py
+"""
+Per-feature admission for tool calls, keyed by the registry's guard_feature.
+
+Every call through app.tools.executor (REST routes and chat-confirmed runs
+alike) takes a slot from its feature before the tool's own
+max_concurrency: at most TOOL_FEATURE_CONCURRENCY calls per feature run at
+once, a caller waits at most TOOL_FEATURE_WAIT_S for a slot (then ToolBusy)
+and the call itself is cut off at TOOL_FEATURE_TIMEOUT_S (or the tool's
+timeout_s, if lower). A burst of browser.screenshot calls therefore queues
+behind the browser limit instead of starving todos.* calls.
+
+Config values are "feature:value" lists; "*" is the default for features
+not listed.
+"""
+import asyncio, time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict
+
+from app.shared.config import settings
+
+class ToolBusy(TimeoutError):
+    """No slot for the feature within its queue-wait timeout."""
+    def __init__(self, feature: str, waited_s: float):
+        super().__init__(f"'{feature}' tools are busy (waited {waited_s:g}s for a slot)")
+        self.feature = feature
+        self.waited_s = waited_s
+
+def _parse(raw: str, cast: Callable[[str], float]) -> Dict[str, float]:
+    out = {}
+    for part in raw.split(","):
+        feature, _, value = part.partition(":")
+        if feature.strip() and value.strip():
+            out[feature.strip()] = cast(value)
+    return out
+
+def _setting(raw: str, feature: str, cast: Callable[[str], float]):
+    values = _parse(raw, cast)
+    return values.get(feature, values.get("*"))
+
+class _Window:
+    """Running count/total/max plus the most recent samples for percentiles."""
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self, size: int = 512):
+        self.count, self.total, self.max = 0, 0.0, 0.0
+        self.recent: deque[float] = deque(maxlen=size)
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.recent.append(ms)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+
+        def pick(q: float) -> float:
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))], 1) if recent else 0.0
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "max_ms": round(self.max, 1),
+        }
+
+class Feature:
+    def __init__(self, name: str, limit: int, wait_s: float | None, timeout_s: float | None):
+        self.name = name
+        self.limit = max(1, limit)
+        self.wait_s = wait_s
+        self.timeout_s = timeout_s
+        self.sem = asyncio.Semaphore(self.limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.counts = {"ok": 0, "failed": 0, "timeout": 0, "busy": 0, "cancelled": 0}
+        self.wait_ms = _Window()
+        self.exec_ms = _Window()
+
+    def deadline(self, tool_timeout_s: float | None) -> float | None:
+        """Execution budget for one call: the stricter of the feature's and the tool's."""
+        limits = [t for t in (self.timeout_s, tool_timeout_s) if t]
+        return min(limits) if limits else None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator["Feature"]:
+        t0 = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.sem.acquire(), timeout=self.wait_s)
+        except asyncio.TimeoutError:
+            self.counts["busy"] += 1
+            raise ToolBusy(self.name, self.wait_s) from None
+        finally:
+            self.waiting -= 1
+        t1 = time.perf_counter()
+        self.wait_ms.add((t1 - t0) * 1000)
+        self.in_flight += 1
+        try:
+            yield self
+            self.counts["ok"] += 1
+        except TimeoutError:
+            self.counts["timeout"] += 1
+            raise
+        except asyncio.CancelledError:
+            self.counts["cancelled"] += 1
+            raise
+        except Exception:
+            self.counts["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.sem.release()
+            self.exec_ms.add((time.perf_counter() - t1) * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "wait_s": self.wait_s,
+            "timeout_s": self.timeout_s,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.counts,
+            "wait_ms": self.wait_ms.snapshot(),
+            "exec_ms": self.exec_ms.snapshot(),
+        }
+
+_FEATURES: Dict[str, Feature] = {}
+
+def feature(name: str | None) -> Feature:
+    name = name or "*"
+    f = _FEATURES.get(name)
+    if f is None:
+        f = _FEATURES[name] = Feature(
+            name,
+            limit=int(_setting(settings.TOOL_FEATURE_CONCURRENCY, name, int) or 16),
+            wait_s=_setting(settings.TOOL_FEATURE_WAIT_S, name, float),
+            timeout_s=_setting(settings.TOOL_FEATURE_TIMEOUT_S, name, float),
+        )
+    return f
+
+def stats() -> dict:
+    return {name: f.stats() for name, f in sorted(_FEATURES.items())}
+
+def reset():
+    """Forget features so the next call re-reads config (tests)."""
+    _FEATURES.clear()
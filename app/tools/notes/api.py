@@ -2,13 +2,11 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import create_note, summarize_notes
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
 
 router = APIRouter(prefix="/tools/notes", tags=["Tools: Notes"])
 
-def current_user_id() -> str: return "demo-user"
-
 class NoteCreateIn(BaseModel):
     text: str
     tags: list[str] | None = None
@@ -18,13 +16,17 @@ class NotesSummarizeIn(BaseModel):
     since: str | None = None
 
 @router.post("/create")
-def api_notes_create(inb: NoteCreateIn, ctx=Depends(guard_gate("notes"))):
-    item = create_note(current_user_id(), inb.text, inb.tags or [])
-    bump_after_tool(ctx, token_cost=700)
-    return ok(item)
+async def api_notes_create(inb: NoteCreateIn, ctx=Depends(guard_gate("notes"))):
+    try:
+        item = await run_gated("notes.create", inb.model_dump(), ctx)
+        return ok(item)
+    except ValueError as e:
+        return err("invalid_input", status=400, details=str(e))
 
 @router.post("/summarize")
-def api_notes_summarize(inb: NotesSummarizeIn, ctx=Depends(guard_gate("notes"))):
-    out = summarize_notes(current_user_id(), tag=inb.tag, since=inb.since)
-    bump_after_tool(ctx, token_cost=2500)
-    return ok(out)
+async def api_notes_summarize(inb: NotesSummarizeIn, ctx=Depends(guard_gate("notes"))):
+    try:
+        out = await run_gated("notes.summarize", inb.model_dump(), ctx)
+        return ok(out)
+    except ValueError as e:
+        return err("invalid_input", status=400, details=str(e))
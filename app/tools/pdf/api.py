@@ -2,8 +2,9 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import generate_pdf
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
 
 router = APIRouter(prefix="/tools/pdf", tags=["Tools: PDF"])
 
@@ -13,11 +14,14 @@ class PDFIn(BaseModel):
     filename: str | None = None
 
 @router.post("/generate")
-def api_pdf(inb: PDFIn, ctx=Depends(guard_gate("pdf"))):
+async def api_pdf(inb: PDFIn, ctx=Depends(guard_gate("pdf"))):
     try:
-        out = generate_pdf(html=inb.html, markdown=inb.markdown, filename=inb.filename)
-        bump_after_tool(ctx, token_cost=2000)
+        out = await run_gated("pdf.generate", inb.model_dump(), ctx)
         return ok(out)
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         return err("invalid_pdf_input", code="invalid_input", status=400, details=str(e))
     except Exception as e:
@@ -2,8 +2,9 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import search_places
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
 
 router = APIRouter(prefix="/tools/places", tags=["Tools: Places"])
 
@@ -12,11 +13,14 @@ class PlacesIn(BaseModel):
     near: str | None = None
 
 @router.post("/search")
-def api_places(inb: PlacesIn, ctx=Depends(guard_gate("places"))):
+async def api_places(inb: PlacesIn, ctx=Depends(guard_gate("places"))):
     try:
-        out = search_places(q=inb.q, near=inb.near)
-        bump_after_tool(ctx, token_cost=2000)
+        out = await run_gated("places.search", inb.model_dump(), ctx)
         return ok(out)
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         return err("invalid_query", code="invalid_query", status=400, details=str(e))
     except Exception as e:
@@ -6,6 +6,13 @@ class ToolMeta(TypedDict, total=False):
     doc_url: str          # points to Swagger op
     needs_confirmation: bool
     guard_feature: str    # used by guard_gate("<feature>")
+    handler: str          # "module:function" resolved once by app.tools.executor
+    token_cost: int       # guard-wall tokens billed per successful call
+    timeout_s: float      # wall-clock budget per call
+    max_concurrency: int  # in-flight calls allowed per worker
+    offload: str          # sync handlers: "io" thread pool (default) or "cpu" process pool
+    cache_ttl_s: int      # deterministic read-only tools: reuse results this long (app.tools.cache)
+    cache_scope: str      # "global" (default) or "user" when the output depends on the caller
     input_schema: dict    # JSON Schema for request body
     returns: str          # short doc-string of the response shape
 
@@ -17,6 +24,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Browser/api_browse_tools_browser_post",
         "needs_confirmation": False,  # read-only by default
         "guard_feature": "browser",
+        "handler": "app.tools.browser.service:browse",
+        "token_cost": 8000,
+        "timeout_s": 60,
+        "max_concurrency": 2,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -35,6 +46,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Email/api_tools_email_post",
         "needs_confirmation": True,  # sending content to external party
         "guard_feature": "email",
+        "handler": "app.tools.email.service:draft_email",
+        "token_cost": 3000,
+        "timeout_s": 15,
+        "max_concurrency": 8,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -55,6 +70,11 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20PDF/api_pdf_tools_pdf_generate_post",
         "needs_confirmation": False,
         "guard_feature": "pdf",
+        "handler": "app.tools.pdf.service:generate_pdf",
+        "token_cost": 2000,
+        "timeout_s": 60,
+        "max_concurrency": 2,
+        "offload": "cpu",  # WeasyPrint layout is CPU-bound
         "input_schema": {
             "type": "object",
             "properties": {
@@ -74,6 +94,12 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20CSV/api_csv_preview_tools_csv_preview_post",
         "needs_confirmation": False,
         "guard_feature": "csv",
+        "handler": "app.tools.csv.service:preview_csv",
+        "token_cost": 1500,
+        "timeout_s": 30,
+        "max_concurrency": 4,
+        "cache_ttl_s": 3600,
+        "cache_scope": "user",  # the caller's file
         "input_schema": {
             "type": "object",
             "properties": {
@@ -92,6 +118,11 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Places/api_places_search_tools_places_search_post",
         "needs_confirmation": False,
         "guard_feature": "places",
+        "handler": "app.tools.places.service:search_places",
+        "token_cost": 2000,
+        "timeout_s": 15,
+        "max_concurrency": 16,
+        "cache_ttl_s": 600,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -110,6 +141,11 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Search/search_web_tools_search_web_post",
         "needs_confirmation": False,
         "guard_feature": "search",
+        "handler": "app.tools.search.service:web_search",
+        "token_cost": 2500,
+        "timeout_s": 15,
+        "max_concurrency": 16,
+        "cache_ttl_s": 600,
         "input_schema": {
             "type": "object",
             "properties": { "q": {"type": "string"} },
@@ -125,6 +161,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Download/download_file_tools_download_post",
         "needs_confirmation": False,
         "guard_feature": "download",
+        "handler": "app.tools.download.service:fetch",
+        "token_cost": 2000,
+        "timeout_s": 60,
+        "max_concurrency": 4,
         "input_schema": {
             "type": "object",
             "properties": { "url": {"type": "string", "format": "uri"} },
@@ -140,6 +180,12 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Summarize/summarize_tools_summarize_post",
         "needs_confirmation": False,
         "guard_feature": "summarize",
+        "handler": "app.tools.summarize.service:summarize_document",
+        "token_cost": 3500,
+        "timeout_s": 30,
+        "max_concurrency": 4,
+        "cache_ttl_s": 3600,
+        "cache_scope": "user",  # the caller's file
         "input_schema": {
             "type": "object",
             "properties": {
@@ -158,6 +204,11 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Sentiment/analyze_sentiment_tools_sentiment_post",
         "needs_confirmation": False,
         "guard_feature": "sentiment",
+        "handler": "app.tools.sentiment.service:analyze_sentiment",
+        "token_cost": 1200,
+        "timeout_s": 10,
+        "max_concurrency": 16,
+        "cache_ttl_s": 86400,  # pure function of the text
         "input_schema": {
             "type": "object",
             "properties": { "text": {"type": "string"} },
@@ -173,6 +224,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Todos/create_todo_tools_todos_post",
         "needs_confirmation": False,
         "guard_feature": "todos",
+        "handler": "app.tools.todos.service:create_todo",
+        "token_cost": 800,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -190,6 +245,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Todos/list_todos_tools_todos_get",
         "needs_confirmation": False,
         "guard_feature": "todos",
+        "handler": "app.tools.todos.service:list_todos",
+        "token_cost": 600,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": { "type": "object", "properties": { "status": {"type": "string"} } },
         "returns": "{ ok:boolean, items:TodoItem[] }"
     },
@@ -199,11 +258,16 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Todos/update_todo_tools_todos__todo_id__patch",
         "needs_confirmation": False,
         "guard_feature": "todos",
+        "handler": "app.tools.todos.service:update_todo",
+        "token_cost": 700,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
                 "todo_id": {"type": "string"},
-                "status": {"type": "string", "enum": ["pending","completed"]}
+                "status": {"type": "string", "enum": ["pending","completed"]},
+                "title": {"type": "string"}
             },
             "required": ["todo_id"]
         },
@@ -215,6 +279,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Todos/delete_todo_tools_todos__todo_id__delete",
         "needs_confirmation": False,
         "guard_feature": "todos",
+        "handler": "app.tools.todos.service:delete_todo",
+        "token_cost": 500,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": { "todo_id": {"type": "string"} },
@@ -230,6 +298,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Notes/create_note_tools_notes_post",
         "needs_confirmation": False,
         "guard_feature": "notes",
+        "handler": "app.tools.notes.service:create_note",
+        "token_cost": 700,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -246,6 +318,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Notes/summarize_notes_tools_notes_summarize_post",
         "needs_confirmation": False,
         "guard_feature": "notes",
+        "handler": "app.tools.notes.service:summarize_notes",
+        "token_cost": 2500,
+        "timeout_s": 10,
+        "max_concurrency": 16,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -263,6 +339,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Reminders/create_reminder_tools_reminders_post",
         "needs_confirmation": False,
         "guard_feature": "reminders",
+        "handler": "app.tools.reminders.service:create_reminder",
+        "token_cost": 1000,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -281,6 +361,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Calendar/create_event_tools_calendar_events_post",
         "needs_confirmation": False,
         "guard_feature": "calendar",
+        "handler": "app.tools.calendar.service:create_event",
+        "token_cost": 1500,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -300,10 +384,15 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Calendar/reschedule_event_tools_calendar_events__event_id__patch",
         "needs_confirmation": False,
         "guard_feature": "calendar",
+        "handler": "app.tools.calendar.service:update_event",
+        "token_cost": 1200,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
                 "event_id": {"type": "string"},
+                "title": {"type": "string"},
                 "start": {"type": "string", "format": "date-time"},
                 "end": {"type": "string", "format": "date-time"},
                 "location": {"type": "string"},
@@ -319,6 +408,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Calendar/delete_event_tools_calendar_events__event_id__delete",
         "needs_confirmation": False,
         "guard_feature": "calendar",
+        "handler": "app.tools.calendar.service:delete_event",
+        "token_cost": 800,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": { "event_id": {"type": "string"} },
@@ -332,6 +425,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Calendar/list_events_tools_calendar_events_get",
         "needs_confirmation": False,
         "guard_feature": "calendar",
+        "handler": "app.tools.calendar.service:list_events",
+        "token_cost": 900,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -347,6 +444,10 @@ REGISTRY: list[ToolMeta] = [
         "doc_url": "/docs#/Tools:%20Calendar/mark_date_tools_calendar_mark_date_post",
         "needs_confirmation": False,
         "guard_feature": "calendar",
+        "handler": "app.tools.calendar.service:mark_date",
+        "token_cost": 600,
+        "timeout_s": 5,
+        "max_concurrency": 32,
         "input_schema": {
             "type": "object",
             "properties": {
@@ -358,3 +459,9 @@ REGISTRY: list[ToolMeta] = [
         "returns": "{ ok:boolean, marked:{date,label} }"
     }
 ]
+
+# O(1) lookup by tool name (dispatch, validation)
+BY_NAME: dict[str, ToolMeta] = {t["name"]: t for t in REGISTRY}
+
+def get_tool(name: str) -> ToolMeta | None:
+    return BY_NAME.get(name)
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Query, HTTPException
 from pydantic import BaseModel
 from typing import Any
 
-from .registry import REGISTRY
+from . import cache, limits
+from .registry import REGISTRY, get_tool
 from .schema_validator import validate_payload
 
 router = APIRouter(prefix="/tools", tags=["Tools"])
@@ -12,6 +13,10 @@ router = APIRouter(prefix="/tools", tags=["Tools"])
 def list_tools():
     return {"items": REGISTRY, "count": len(REGISTRY)}
 
+@router.get("/stats", summary="Per-feature tool concurrency, queue wait and execution time; result cache hits")
+def tool_stats():
+    return {"features": limits.stats(), "cache": cache.stats()}
+
 # New: search by keyword (name/summary)
 @router.get("/registry/search", summary="Search tools by name/summary")
 def search_tools(q: str = Query("", description="Keyword")):
@@ -32,7 +37,7 @@ class ValidateReq(BaseModel):
 
 @router.post("/registry/validate", summary="Validate payload against tool input_schema")
 def validate_tool_payload(body: ValidateReq):
-    meta = next((t for t in REGISTRY if t.get("name") == body.name), None)
+    meta = get_tool(body.name)
     if not meta:
         raise HTTPException(404, f"Unknown tool: {body.name}")
     ok, err = validate_payload(meta.get("input_schema"), body.payload)
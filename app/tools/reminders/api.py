@@ -2,19 +2,19 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import create_reminder
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
 
 router = APIRouter(prefix="/tools/reminders", tags=["Tools: Reminders"])
 
-def current_user_id() -> str: return "demo-user"
-
 class ReminderIn(BaseModel):
     text: str
     remind_at: str
 
 @router.post("/create")
-def api_reminders_create(inb: ReminderIn, ctx=Depends(guard_gate("reminders"))):
-    item = create_reminder(current_user_id(), inb.text, inb.remind_at)
-    bump_after_tool(ctx, token_cost=1000)
-    return ok(item)
+async def api_reminders_create(inb: ReminderIn, ctx=Depends(guard_gate("reminders"))):
+    try:
+        item = await run_gated("reminders.create", inb.model_dump(), ctx)
+        return ok(item)
+    except ValueError as e:
+        return err("invalid_input", status=400, details=str(e))
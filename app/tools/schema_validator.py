@@ -1,6 +1,6 @@
 from jsonschema import Draft202012Validator, ValidationError
 from typing import Any, Tuple
-from .registry import REGISTRY
+from .registry import get_tool
 
 def validate_payload(schema: dict | None, payload: Any) -> Tuple[bool, str | None]:
     if not schema:
@@ -14,7 +14,7 @@ def validate_payload(schema: dict | None, payload: Any) -> Tuple[bool, str | Non
         return False, msg
 def require_valid(tool_name: str, payload: dict):
     from fastapi import HTTPException
-    meta = next((t for t in REGISTRY if t.get("name") == tool_name), None)
+    meta = get_tool(tool_name)
     if not meta:
         raise HTTPException(404, f"Unknown tool: {tool_name}")
     ok, err = validate_payload(meta.get("input_schema"), payload)
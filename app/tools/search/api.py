@@ -1,12 +1,11 @@
 # app/tools/search/api.py
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
 
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from app.shared.db import get_db
-from .service import web_search
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
 
 router = APIRouter(prefix="/tools/search", tags=["Tools: Search"])
 
@@ -14,11 +13,14 @@ class WebSearchIn(BaseModel):
     q: str
 
 @router.post("/web")
-def api_search_web(inb: WebSearchIn, ctx=Depends(guard_gate("search")), db: Session = Depends(get_db)):
+async def api_search_web(inb: WebSearchIn, ctx=Depends(guard_gate("search"))):
     try:
-        links = web_search(inb.q)
-        bump_after_tool(ctx, token_cost=2500)
-        return ok({"links": links})
+        out = await run_gated("search.web", inb.model_dump(), ctx)
+        return ok({"links": out.get("links", [])})
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         return err("invalid_query", code="invalid_query", status=400, details=str(e))
     except Exception as e:
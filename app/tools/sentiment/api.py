@@ -2,8 +2,9 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.shared.http import ok, err
-from app.shared.guard import guard_gate, bump_after_tool
-from .service import analyze_sentiment
+from app.shared.guard import guard_gate
+from app.tools.executor import run_gated
+from app.tools.limits import ToolBusy
 
 router = APIRouter(prefix="/tools/sentiment", tags=["Tools: Sentiment"])
 
@@ -11,11 +12,14 @@ class SentimentIn(BaseModel):
     text: str
 
 @router.post("/analyze")
-def api_sentiment(inb: SentimentIn, ctx=Depends(guard_gate("sentiment"))):
+async def api_sentiment(inb: SentimentIn, ctx=Depends(guard_gate("sentiment"))):
     try:
-        out = analyze_sentiment(inb.text)
-        bump_after_tool(ctx, token_cost=1200)
+        out = await run_gated("sentiment.analyze", inb.model_dump(), ctx)
         return ok(out)
+    except ToolBusy as e:
+        return err("tool_busy", status=503, details=str(e))
+    except TimeoutError as e:
+        return err("tool_timeout", status=504, details=str(e) or "timed out")
     except ValueError as e:
         return err("invalid_input", status=400, details=str(e))
     except Exception as e:
@@ -23,10 +23,11 @@ def list_todos(user_id: str, status: Optional[Literal["pending","completed"]] =
         items = [i for i in items if i["status"] == status]
     return items
 
-def update_todo(user_id: str, todo_id: str, status: Optional[str] = None):
+def update_todo(user_id: str, todo_id: str, status: Optional[str] = None, title: Optional[str] = None):
     for i in _MEM.get(user_id, []):
         if i["id"] == todo_id:
             if status: i["status"] = status
+            if title: i["title"] = title
             return i
     raise KeyError("todo not found")
 
@@ -0,0 +1,102 @@
+"""
+SQLite write contention: concurrent clients posting chat messages (message
+row + queued run + scheduler steps) and calling tools (guard read + usage
+commit), against the old storage profile (rollback journal,
+synchronous=FULL, default pool) and the tuned one (WAL, synchronous=NORMAL,
+busy_timeout, bigger cache, larger pool). Each profile runs in its own
+process on a throwaway database.
+
+Keep --clients below the pool capacity (DB_POOL_SIZE + DB_MAX_OVERFLOW,
+minus the scheduler's workers): the chat and tool handlers are async but
+use sync sessions, so a checkout that has to wait for the pool blocks the
+event loop, and the requests holding connections cannot finish until
+pool_timeout expires.
+
+    python -m bench.db_contention [--clients 12] [--requests 20]
+"""
+import argparse, asyncio, json, os, subprocess, sys, tempfile, time
+
+PROFILES = {
+    "legacy": {
+        "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_CACHE_SIZE_KB": "2000", "SQLITE_MMAP_SIZE": "0", "DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10",
+    },
+    "tuned": {},  # the defaults in app/shared/config.py
+}
+
+
+def _pct(xs: list, q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+
+async def _child(clients: int, requests: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.runs import scheduler
+    from app.shared.auth import issue_dev_token
+    from app.shared.db import Base, engine, pragmas, run_sqlite_migrations
+
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+    lat = {"post_message": [], "tool_call": []}
+    errors = {"post_message": 0, "tool_call": 0}
+    headers = {"Authorization": f"Bearer {issue_dev_token('bench-user')}"}
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as c:
+        cids = [(await c.post("/conversations", json={"title": f"bench {i}"})).json()["id"] for i in range(clients)]
+
+        async def _client(i: int):
+            for n in range(requests):
+                if n % 2 == 0:
+                    op, req = "post_message", c.post(f"/conversations/{cids[i]}/messages", json={"text": f"hi {n}"})
+                else:
+                    op, req = "tool_call", c.post("/tools/todos/create", json={"title": f"todo {i}-{n}"})
+                t0 = time.perf_counter()
+                res = await req
+                lat[op].append((time.perf_counter() - t0) * 1000)
+                if res.status_code >= 400:
+                    errors[op] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[_client(i) for i in range(clients)])
+        wall = time.perf_counter() - t0
+    await scheduler.shutdown()
+    return {
+        "pragmas": pragmas(),
+        "wall_s": round(wall, 2),
+        "rps": round(clients * requests / wall, 1),
+        **{op: {"p50": round(_pct(xs, 0.5), 1), "p99": round(_pct(xs, 0.99), 1), "errors": errors[op]}
+           for op, xs in lat.items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=12)
+    ap.add_argument("--requests", type=int, default=20)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    a = ap.parse_args()
+    if a.child:
+        print(json.dumps(asyncio.run(_child(a.clients, a.requests))))
+        return
+
+    print(f"{a.clients} clients x {a.requests} requests (half post_message, half todos.create)")
+    print(f"{'profile':<8}{'journal':>9}{'rps':>8}{'msg p50':>9}{'msg p99':>9}{'tool p50':>10}{'tool p99':>10}{'errors':>8}")
+    for name, env in PROFILES.items():
+        db = os.path.join(tempfile.mkdtemp(prefix=f"bench-db-{name}-"), "bench.db")
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.db_contention", "--child", name,
+             "--clients", str(a.clients), "--requests", str(a.requests)],
+            env={**os.environ, **env, "DATABASE_URL": f"sqlite:///{db}", "RUN_POLL_MS": "50"},
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        m, t = r["post_message"], r["tool_call"]
+        print(f"{name:<8}{r['pragmas']['journal_mode']:>9}{r['rps']:>8}{m['p50']:>9}{m['p99']:>9}"
+              f"{t['p50']:>10}{t['p99']:>10}{m['errors'] + t['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Event-loop lag while async handlers write to SQLite: post_message's writes
+(message row, run row, queue update) through the sync Session on the loop
+(the old behaviour) vs the aiosqlite AsyncSession. A background thread
+keeps committing steps the way scheduler workers do, so some commits wait
+on the write lock. The ticker from bench.loop_lag measures how late the
+loop wakes up: every SSE stream on the worker sees that same delay.
+
+    python -m bench.db_loop_lag [--writers 8] [--messages 25]
+"""
+import argparse, asyncio, os, statistics, tempfile, threading, time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-loop-db-')}/bench.db")
+
+from app.main import app  # noqa: E402,F401  (registers every model on Base)
+from app.conversations.models import Conversation  # noqa: E402
+from app.conversations.service import create_message, create_message_async  # noqa: E402
+from app.runs import queue  # noqa: E402
+from app.runs.models import Step  # noqa: E402
+from app.runs.service import create_run, create_run_async  # noqa: E402
+from app.shared.db import AsyncSessionLocal, Base, SessionLocal, engine, run_sqlite_migrations  # noqa: E402
+from bench.loop_lag import _ticker  # noqa: E402
+
+
+def _background_writer(run_id: str, stop: threading.Event):
+    with SessionLocal() as db:
+        i = 0
+        while not stop.is_set():
+            for _ in range(20):
+                s = Step(run_id=run_id, idx=i, kind="token", status="completed")
+                s.data = {"text_chunk": "x " * 20}
+                db.add(s); i += 1
+            db.commit()
+
+
+async def _writer_sync(cid: str, n: int):
+    with SessionLocal() as db:
+        for i in range(n):
+            create_message(db, "bench", cid, f"hi {i}", [])
+            run = create_run(db, cid, mode="chat", plan=["generate_answer"])
+            queue.enqueue(db, run, "plain_chat", {}, "free")
+            await asyncio.sleep(0)  # the handler returns; the next request arrives
+
+
+async def _writer_async(cid: str, n: int):
+    async with AsyncSessionLocal() as db:
+        for i in range(n):
+            await create_message_async(db, "bench", cid, f"hi {i}", [])
+            run = await create_run_async(db, cid, mode="chat", plan=["generate_answer"])
+            await queue.enqueue_async(db, run, "plain_chat", {}, "free")
+
+
+async def _scenario(writers: int, messages: int, use_async: bool) -> tuple[list, float]:
+    with SessionLocal() as db:
+        convs = [Conversation(user_id="bench", title=f"lag {i}") for i in range(writers)]
+        db.add_all(convs); db.commit()
+        cids = [c.id for c in convs]
+        bg_run = create_run(db, cids[0])
+    stop_bg = threading.Event()
+    bg = threading.Thread(target=_background_writer, args=(bg_run.id, stop_bg), daemon=True)
+    bg.start()
+
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(0.05)
+    write = _writer_async if use_async else _writer_sync
+    t0 = time.perf_counter()
+    await asyncio.gather(*[write(cid, messages) for cid in cids])
+    wall = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    stop_bg.set(); bg.join()
+    return lags, wall
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=8)
+    ap.add_argument("--messages", type=int, default=25)
+    args = ap.parse_args()
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+    print(f"{args.writers} writers x {args.messages} messages, background step writer running")
+    for label, use_async in (("sync", False), ("async", True)):
+        lags, wall = asyncio.run(_scenario(args.writers, args.messages, use_async))
+        lags.sort()
+        p99 = lags[max(0, int(len(lags) * 0.99) - 1)]
+        rate = args.writers * args.messages / wall
+        print(f"{label:>6}: loop lag p50={statistics.median(lags):7.1f} ms  p99={p99:7.1f} ms  "
+              f"max={lags[-1]:7.1f} ms  wall={wall:5.2f} s  ({rate:6.1f} msg/s)  ticks={len(lags)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+JSON column decoding on list serialization: N runs with a plan and N
+messages with attachments, loaded once, then serialized the way
+/runs/by-conversation and _message_out shape them. "per access" runs
+json.loads on every read (the old properties); "decode once" reads the
+app.shared.jsoncol views. Each row is read --reads times per pass, as a
+row is when it goes through a handler and then a response model. Runs are
+encoded with jsonable_encoder (the endpoint without a response model) and,
+in the last column, through RunSummary as the endpoint does now.
+
+    python -m bench.json_columns [--rows 10000] [--reads 2]
+"""
+import argparse, json, os, statistics, tempfile, time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-jsoncol-')}/bench.db")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.main import app  # noqa: E402,F401  (registers every model on Base)
+from app.conversations.models import Conversation, Message, _id32  # noqa: E402
+from app.conversations.schemas import MessageOut  # noqa: E402
+from app.runs.models import Run  # noqa: E402
+from app.runs.schemas import RunSummary  # noqa: E402
+from app.shared.db import Base, SessionLocal, engine, run_sqlite_migrations  # noqa: E402
+
+PLAN = [{"id": f"n{i}", "tool": "todos.create", "args": {"title": f"step {i}"}, "after": [f"n{i - 1}"] if i else []}
+        for i in range(5)]
+
+
+def _old_plan(r: Run) -> list:
+    try: return json.loads(r.plan_json or "[]")
+    except Exception: return []
+
+
+def _old_attachments(m: Message) -> list:
+    try: return json.loads(m.attachments_json or "[]")
+    except Exception: return []
+
+
+_SUMMARIES = TypeAdapter(list[RunSummary])
+
+
+def _runs_out(runs, plan, reads: int, model: bool = False):
+    out = []
+    for r in runs:
+        for _ in range(reads - 1):
+            plan(r)
+        out.append({"id": r.id, "status": r.status, "mode": r.mode, "plan": plan(r),
+                    "started_at": r.started_at, "finished_at": r.finished_at})
+    if model:  # what FastAPI does with a response_model: validate, then serialize in pydantic-core
+        return _SUMMARIES.dump_python(_SUMMARIES.validate_python(out), mode="json")
+    return jsonable_encoder(out)
+
+
+def _messages_out(msgs, attachments, reads: int):
+    out = []
+    for m in msgs:
+        for _ in range(reads - 1):
+            attachments(m)
+        out.append(MessageOut(id=m.id, conversation_id=m.conversation_id, role=m.role, text=m.text,
+                              attachments=attachments(m), created_at=m.created_at).model_dump(mode="json"))
+    return out
+
+
+def _ms(fn, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--reads", type=int, default=2)
+    a = ap.parse_args()
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+
+    with SessionLocal() as db:
+        conv = Conversation(user_id="bench", title="json")
+        db.add(conv); db.commit()
+        cid, plan, att = conv.id, json.dumps(PLAN), json.dumps([f"file-{i}" for i in range(3)])
+        db.execute(insert(Run), [{"id": _id32(), "conversation_id": cid, "status": "completed", "mode": "dag",
+                                  "plan_json": plan} for _ in range(a.rows)])
+        db.execute(insert(Message), [{"id": _id32(), "conversation_id": cid, "text": f"message {i}",
+                                      "attachments_json": att} for i in range(a.rows)])
+        db.commit()
+        runs = db.scalars(select(Run).where(Run.conversation_id == cid)).all()
+        msgs = db.scalars(select(Message).where(Message.conversation_id == cid)).all()
+
+        print(f"{a.rows} rows, {a.reads} reads per row (median of 5, ms)")
+        print(f"{'':<22}{'per access':>12}{'decode once':>13}{'+ RunSummary':>14}")
+        for label, rows, old, new, shape in (
+            ("runs/by-conversation", runs, _old_plan, lambda r: r.plan, _runs_out),
+            ("message listing", msgs, _old_attachments, lambda m: m.attachments, _messages_out),
+        ):
+            assert shape(rows, old, a.reads) == shape(rows, new, a.reads)  # same output; warms the views too
+            per_access = _ms(lambda: shape(rows, old, a.reads))
+            once = _ms(lambda: shape(rows, new, a.reads))
+            model = f"{_ms(lambda: shape(rows, new, a.reads, model=True)):>14.1f}" if shape is _runs_out else ""
+            print(f"{label:<22}{per_access:>12.1f}{once:>13.1f}{model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Event-loop lag while tools do blocking work, inline (the old behaviour)
+vs offloaded to app.shared.offload. A ticker sleeps 5 ms in a loop and
+records how late each wake-up is: every SSE stream on the worker sees
+that same delay.
+
+    python -m bench.loop_lag [--jobs 8]
+"""
+import argparse, asyncio, statistics, subprocess, sys, time
+
+from app.shared import offload
+
+
+def blocking_io():
+    # stands in for _cli_screenshot / urlretrieve: a child process we wait on
+    subprocess.run([sys.executable, "-c", "import time; time.sleep(0.2)"], check=True)
+
+
+def cpu_parse(n: int = 1_500_000) -> int:
+    # stands in for WeasyPrint / pypdf: pure-Python work holding the GIL
+    acc = 0
+    for i in range(n):
+        acc = (acc * 31 + i) % 1_000_003
+    return acc
+
+
+async def _ticker(lags: list, stop: asyncio.Event, period: float = 0.005):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append((time.perf_counter() - t0 - period) * 1000)
+
+
+async def _scenario(jobs: int, offloaded: bool) -> tuple[list, float]:
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(0.05)
+
+    async def _io():
+        if offloaded:
+            await offload.run_io(blocking_io)
+        else:
+            blocking_io()
+
+    async def _cpu():
+        if offloaded:
+            await offload.run_cpu(cpu_parse)
+        else:
+            cpu_parse()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[(_io() if i % 2 else _cpu()) for i in range(jobs)])
+    wall = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    return lags, wall
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=8)
+    args = ap.parse_args()
+    for label, offloaded in (("inline", False), ("offloaded", True)):
+        lags, wall = asyncio.run(_scenario(args.jobs, offloaded))
+        lags.sort()
+        p99 = lags[max(0, int(len(lags) * 0.99) - 1)]
+        print(f"{label:>10}: loop lag p50={statistics.median(lags):7.1f} ms  p99={p99:7.1f} ms  "
+              f"max={lags[-1]:7.1f} ms  wall={wall:5.2f} s  ticks={len(lags)}")
+    offload.shutdown()
+
+
+if __name__ == "__main__":
+    main()
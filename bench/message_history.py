@@ -0,0 +1,64 @@
+"""
+Message history page cost vs depth: a conversation with N messages, one
+page read near the newest end, in the middle and at the oldest end, with
+app.conversations.service.list_messages (keyset on (created_at, id)) and,
+for comparison, the same page through LIMIT/OFFSET.
+
+    python -m bench.message_history [--messages 100000] [--limit 50]
+"""
+import argparse, os, statistics, tempfile, time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-history-')}/bench.db")
+
+from sqlalchemy import desc, insert, select  # noqa: E402
+
+from app.main import app  # noqa: E402,F401  (registers every model on Base)
+from app.conversations.models import Conversation, Message, _id32  # noqa: E402
+from app.conversations.service import encode_cursor, list_messages  # noqa: E402
+from app.shared.db import Base, SessionLocal, engine, run_sqlite_migrations  # noqa: E402
+
+
+def _ms(fn, repeat: int = 20) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=100_000)
+    ap.add_argument("--limit", type=int, default=50)
+    a = ap.parse_args()
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+
+    with SessionLocal() as db:
+        conv = Conversation(user_id="bench", title="long")
+        db.add(conv); db.commit()
+        cid, t0 = conv.id, datetime(2025, 1, 1)
+        rows = [{"id": _id32(), "conversation_id": cid, "role": "user", "text": f"message {i}",
+                 "attachments_json": "[]", "created_at": t0 + timedelta(milliseconds=i // 3)}  # ties on purpose
+                for i in range(a.messages)]
+        db.execute(insert(Message), rows)
+        db.commit()
+        rows.sort(key=lambda r: (r["created_at"], r["id"]))
+
+        print(f"{a.messages} messages, pages of {a.limit} (median of 20, ms)")
+        print(f"{'depth':<8}{'keyset':>10}{'lite':>10}{'offset':>10}")
+        for label, depth in (("newest", 0), ("middle", a.messages // 2), ("oldest", a.messages - a.limit)):
+            edge = rows[len(rows) - depth] if depth else None
+            before = encode_cursor(edge["created_at"], edge["id"]) if edge else None
+            keyset = _ms(lambda: list_messages(db, cid, a.limit, before=before))
+            lite = _ms(lambda: list_messages(db, cid, a.limit, before=before, lite=True))
+            stmt = (select(Message).where(Message.conversation_id == cid)
+                    .order_by(desc(Message.created_at), desc(Message.id)).offset(depth).limit(a.limit))
+            offset = _ms(lambda: db.scalars(stmt).all())
+            print(f"{label:<8}{keyset:>10.2f}{lite:>10.2f}{offset:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
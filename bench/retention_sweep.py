@@ -0,0 +1,95 @@
+"""
+Retention sweep vs concurrent writers: N idle conversations with M
+messages each are archived while a writer thread keeps committing
+messages to an active conversation. Compares batches of --batch rows with
+one transaction per conversation (batch = M), reporting the sweep time,
+the writer's commit latency and the file size before/after the sweep and
+incremental vacuum.
+
+    python -m bench.retention_sweep [--conversations 40] [--messages 2500] [--batch 500]
+"""
+import argparse, os, statistics, tempfile, threading, time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-retention-')}/bench.db")
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app.main import app  # noqa: E402,F401  (registers every model on Base)
+from app.conversations.models import Conversation, Message, _id32  # noqa: E402
+from app.shared import retention  # noqa: E402
+from app.shared.db import Base, SessionLocal, engine, run_sqlite_migrations  # noqa: E402
+
+OLD = datetime.now(timezone.utc) - timedelta(days=365)
+
+
+def _seed(conversations: int, messages: int):
+    with SessionLocal() as db:
+        for n in range(conversations):
+            conv = Conversation(user_id="bench", title=f"idle {n}", created_at=OLD, updated_at=OLD)
+            db.add(conv); db.flush()
+            db.execute(insert(Message), [{"id": _id32(), "conversation_id": conv.id, "text": f"message {i} " * 20,
+                                          "attachments_json": "[]", "created_at": OLD + timedelta(seconds=i)}
+                                         for i in range(messages)])
+        db.commit()
+
+
+def _size_mb() -> float:
+    with engine.connect() as conn:
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    return pages * size / 1e6
+
+
+def _writer(cid: str, stop: threading.Event, lat: list):
+    with SessionLocal() as db:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            db.add(Message(conversation_id=cid, text="live"))
+            db.commit()
+            lat.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.002)
+
+
+def _run(label: str, batch: int, a) -> None:
+    with engine.begin() as conn:
+        for table in ("messages", "archive_chunks", "conversations"):
+            conn.exec_driver_sql(f"DELETE FROM {table}")
+    _seed(a.conversations, a.messages)
+    with SessionLocal() as db:
+        live = Conversation(user_id="bench", title="live")
+        db.add(live); db.commit()
+        cid = live.id
+    before = _size_mb()
+
+    lat: list = []
+    stop = threading.Event()
+    w = threading.Thread(target=_writer, args=(cid, stop, lat))
+    w.start()
+    r = retention.Retention({"messages": 30}, batch=batch, pause_s=0.005, vacuum_pages=500, interval_s=0)
+    out = r.sweep()
+    stop.set(); w.join()
+
+    lat.sort()
+    p99 = lat[min(len(lat) - 1, int(0.99 * len(lat)))] if lat else 0.0
+    print(f"{label:<22}{out['ms']:>9}{out['messages']:>10}{len(lat):>9}{statistics.median(lat):>9.1f}"
+          f"{p99:>9.1f}{lat[-1]:>9.1f}{before:>9.1f}{_size_mb():>9.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=40)
+    ap.add_argument("--messages", type=int, default=2500)
+    ap.add_argument("--batch", type=int, default=500)
+    a = ap.parse_args()
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+    print(f"{a.conversations} idle conversations x {a.messages} messages; writer commit latency in ms, size in MB")
+    print(f"{'':<22}{'sweep ms':>9}{'archived':>10}{'commits':>9}{'p50':>9}{'p99':>9}{'max':>9}"
+          f"{'before':>9}{'after':>9}")
+    _run(f"batch {a.batch}", a.batch, a)
+    _run("per conversation", a.messages, a)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Write amplification of a 50-step run: add_step() per step + finish_run()
+(one commit + refresh each) vs the buffered Timeline writer, on a
+throwaway SQLite file.
+
+    python -m bench.run_timeline [--steps 50] [--runs 20]
+"""
+import argparse, os, statistics, tempfile, time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-timeline-')}/bench.db")
+
+from sqlalchemy import event  # noqa: E402
+
+from app.main import app  # noqa: E402,F401  (registers models)
+from app.runs.service import add_step, create_run, finish_run  # noqa: E402
+from app.runs.timeline import Timeline  # noqa: E402
+from app.shared.db import Base, SessionLocal, engine, run_sqlite_migrations  # noqa: E402
+
+
+def _per_step(db, run_id: str, steps: int):
+    for i in range(steps):
+        add_step(db, run_id, i, "token", {"text_chunk": f"tok{i} "})
+    finish_run(db, run_id, status="completed")
+
+
+def _timeline(db, run_id: str, steps: int):
+    tl = Timeline(db, run_id, max_delay_s=60)
+    for i in range(steps):
+        tl.step("token", {"text_chunk": f"tok{i} "})
+    tl.finish("completed")
+
+
+def _measure(write, steps: int, runs: int):
+    counts = {"commits": 0, "statements": 0}
+
+    def _stmt(*_):
+        counts["statements"] += 1
+
+    def _commit(*_):
+        counts["commits"] += 1
+
+    event.listen(engine, "before_cursor_execute", _stmt)
+    event.listen(engine, "commit", _commit)
+    lat = []
+    try:
+        for _ in range(runs):
+            with SessionLocal() as db:
+                run = create_run(db, "bench-conv")
+                c0, s0 = counts["commits"], counts["statements"]
+                t0 = time.perf_counter()
+                write(db, run.id, steps)
+                lat.append((time.perf_counter() - t0) * 1000)
+                per_run = (counts["commits"] - c0, counts["statements"] - s0)
+    finally:
+        event.remove(engine, "before_cursor_execute", _stmt)
+        event.remove(engine, "commit", _commit)
+    return per_run, lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, default=50)
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+    for label, write in (("add_step per step", _per_step), ("Timeline", _timeline)):
+        (commits, stmts), lat = _measure(write, args.steps, args.runs)
+        print(f"{label:>18}: {commits:3d} commits  {stmts:4d} statements  "
+              f"latency p50={statistics.median(lat):7.2f} ms  max={max(lat):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
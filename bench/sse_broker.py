@@ -0,0 +1,80 @@
+"""
+SSE broker benchmark: per-event publish overhead for each backend and
+cross-process delivery latency for the SQLite bus.
+
+    python -m bench.sse_broker [--events 2000]
+"""
+import argparse, asyncio, multiprocessing as mp, os, statistics, tempfile, time
+
+from app.shared import sse
+
+
+async def _publish_overhead(broker, n: int) -> float:
+    sse.set_broker(broker)
+    q = await sse.subscribe("bench")
+    t0 = time.perf_counter()
+    for i in range(n):
+        await sse.publish("bench", "token", {"text_chunk": f"tok{i} "})
+        if q.full():
+            while not q.empty():
+                q.get_nowait()
+    elapsed = time.perf_counter() - t0
+    sse.unsubscribe("bench", q)
+    await broker.stop()
+    return elapsed / n * 1e6
+
+
+def _remote_publisher(path: str, n: int, ready):
+    async def _run():
+        broker = sse.SQLiteBroker(path)
+        sse.set_broker(broker)
+        ready.wait()
+        for i in range(n):
+            await sse.publish("bench", "token", {"i": i, "ts": time.time()})
+            await asyncio.sleep(0.002)
+    asyncio.run(_run())
+
+
+async def _cross_process_latency(path: str, n: int, poll_ms: int) -> list[float]:
+    broker = sse.SQLiteBroker(path, poll_interval=poll_ms / 1000.0)
+    sse.set_broker(broker)
+    q = await sse.subscribe("bench")
+    ready = mp.Event()
+    proc = mp.Process(target=_remote_publisher, args=(path, n, ready))
+    proc.start()
+    await asyncio.sleep(0.2)
+    ready.set()
+    lat = []
+    try:
+        while len(lat) < n:
+            ev = await asyncio.wait_for(q.get(), timeout=10)
+            lat.append((time.time() - ev.data["ts"]) * 1000)
+    finally:
+        sse.unsubscribe("bench", q)
+        await broker.stop()
+        proc.join()
+    return lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2000)
+    ap.add_argument("--poll-ms", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bus.db")
+        mem_us = asyncio.run(_publish_overhead(sse.InProcessBroker(), args.events))
+        sql_us = asyncio.run(_publish_overhead(sse.SQLiteBroker(path), args.events))
+        print(f"publish overhead  memory: {mem_us:8.1f} us/event")
+        print(f"publish overhead  sqlite: {sql_us:8.1f} us/event")
+
+        lat = asyncio.run(_cross_process_latency(path, min(args.events, 500), args.poll_ms))
+        lat.sort()
+        p99 = lat[int(len(lat) * 0.99) - 1]
+        print(f"cross-process latency (poll {args.poll_ms} ms): "
+              f"p50={statistics.median(lat):.1f} ms p99={p99:.1f} ms max={lat[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Token streaming benchmark: raw per-token frames vs coalesced frames.
+
+Each conversation has one producer publishing whitespace tokens (like
+_execute_plain_chat) and one subscriber draining sse_stream. Reports
+delivered tokens/sec, frames written and CPU time per conversation.
+
+    python -m bench.sse_coalesce [--convs 50] [--tokens 2000]
+"""
+import argparse, asyncio, time
+
+from app.shared import sse
+
+
+async def _conversation(cid: str, tokens: int, coalesce_ms: int | None) -> int:
+    gen = sse.sse_stream(cid, coalesce_ms=coalesce_ms, coalesce_bytes=1024)
+    await gen.__anext__()  # ": connected"
+
+    async def _produce():
+        for i in range(tokens):
+            await sse.publish(cid, "token", {"text_chunk": f"word{i} "})
+            if i % 50 == 0:
+                await asyncio.sleep(0.001)  # tokens arrive in bursts, like a model stream
+        await sse.publish(cid, "final_answer", {"text": "done"})
+
+    producer = asyncio.create_task(_produce())
+    frames = 0
+    async for frame in gen:
+        frames += 1
+        if b"event: final_answer" in frame:
+            break
+    await producer
+    await gen.aclose()
+    return frames
+
+
+async def _run(convs: int, tokens: int, coalesce_ms: int | None):
+    sse.set_broker(sse.InProcessBroker())
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    frames = await asyncio.gather(*[_conversation(f"c{i}", tokens, coalesce_ms) for i in range(convs)])
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    sse.set_broker(None)
+    return wall, cpu, sum(frames)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--convs", type=int, default=50)
+    ap.add_argument("--tokens", type=int, default=2000)
+    args = ap.parse_args()
+
+    for label, window in (("per-token", None), ("coalesced 20ms/1KB", 20)):
+        wall, cpu, frames = asyncio.run(_run(args.convs, args.tokens, window))
+        total = args.convs * args.tokens
+        print(f"{label:>20}: {total / wall:10.0f} tokens/s  frames={frames:7d}  "
+              f"cpu/conv={cpu / args.convs * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
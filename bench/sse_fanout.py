@@ -0,0 +1,50 @@
+"""
+SSE fan-out microbenchmark: cost of publishing one event to a room with
+1/10/100 subscribers, comparing per-subscriber json.dumps (the old
+sse_stream behaviour) against the shared pre-encoded frame.
+
+    python -m bench.sse_fanout [--events 2000]
+"""
+import argparse, asyncio, json, time
+
+from app.shared import sse
+
+
+def _per_subscriber_encode(ev) -> bytes:
+    payload = f"event: {ev.event}\n" + f"data: {json.dumps(ev.data, ensure_ascii=False)}\n\n"
+    return payload.encode("utf-8")
+
+
+def _shared_frame(ev) -> bytes:
+    return ev.frame
+
+
+async def _run(subs: int, events: int, encode) -> float:
+    sse.set_broker(sse.InProcessBroker())
+    queues = [await sse.subscribe("room") for _ in range(subs)]
+    data = {"text_chunk": "lorem ipsum dolor ", "meta": {"n": 1, "tags": ["a", "b", "c"]}}
+    t0 = time.perf_counter()
+    for _ in range(events):
+        await sse.publish("room", "token", data)
+        for q in queues:
+            encode(q.get_nowait())
+    elapsed = time.perf_counter() - t0
+    for q in queues:
+        sse.unsubscribe("room", q)
+    sse.set_broker(None)
+    return elapsed / events * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2000)
+    args = ap.parse_args()
+    print(f"{'subs':>5} {'per-subscriber dumps':>22} {'shared frame':>14}")
+    for subs in (1, 10, 100):
+        old = asyncio.run(_run(subs, args.events, _per_subscriber_encode))
+        new = asyncio.run(_run(subs, args.events, _shared_frame))
+        print(f"{subs:>5} {old:>19.1f} us {new:>11.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Guard wall bookkeeping per tool call: the old path (SELECT for the quota
+check, then SELECT + UPDATE/INSERT + commit to bill) vs app.shared.usage
+(quota check and debit in memory, one UPSERT per user/day per flush).
+Concurrent callers bill a handful of users from offload threads.
+
+    python -m bench.usage_meter [--calls 2000] [--threads 8] [--users 4]
+"""
+import argparse, asyncio, os, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-usage-')}/bench.db")
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import IntegrityError  # noqa: E402
+
+from app.main import app  # noqa: E402,F401  (registers every model on Base)
+from app.shared import usage  # noqa: E402
+from app.shared.db import Base, SessionLocal, engine, run_sqlite_migrations  # noqa: E402
+
+
+def _old_call(uid: str) -> int:
+    # the pre-meter guard_gate read + _bump_usage, each call with its own session like a request;
+    # returns 1 when the read-then-insert race lost the charge (now a unique index violation)
+    with SessionLocal() as db:
+        day = usage.today()
+        usage.read(db, uid, day)
+        row = db.execute(text("SELECT id FROM user_usage WHERE user_id=:u AND day=:d"), {"u": uid, "d": day}).first()
+        if row:
+            db.execute(text("UPDATE user_usage SET tasks=tasks+1, tokens=tokens+:k WHERE id=:id"), {"k": 100, "id": row[0]})
+        else:
+            try:
+                db.execute(text("INSERT INTO user_usage(user_id, day, tasks, tokens) VALUES (:u,:d,1,:k)"),
+                           {"u": uid, "d": day, "k": 100})
+            except IntegrityError:
+                return 1
+        db.commit()
+    return 0
+
+
+def _meter_call(meter: usage.UsageMeter, uid: str) -> int:
+    with SessionLocal() as db:
+        meter.get(db, uid)
+    meter.debit(uid, tasks=1, tokens=100)
+    return 0
+
+
+def _totals(prefix: str) -> tuple[int, int]:
+    with SessionLocal() as db:
+        return tuple(db.execute(text("SELECT COALESCE(SUM(tasks), 0), COUNT(*) FROM user_usage WHERE user_id LIKE :p"),
+                                {"p": f"{prefix}%"}).one())
+
+
+async def _run(label: str, calls: int, threads: int, users: int) -> None:
+    meter = usage.UsageMeter(flush_s=1.0, max_pending_tasks=500, cache_s=30)
+    meter._ensure_started()
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(threads) as pool:
+        t0 = time.perf_counter()
+        if label == "old":
+            futs = [loop.run_in_executor(pool, _old_call, f"old-{i % users}") for i in range(calls)]
+        else:
+            futs = [loop.run_in_executor(pool, _meter_call, meter, f"meter-{i % users}") for i in range(calls)]
+        lost = sum(await asyncio.gather(*futs))
+        wall = time.perf_counter() - t0
+    await meter.stop()
+    tasks, rows = _totals(f"{label}-")
+    writes = calls if label == "old" else meter.counts["rows"]
+    print(f"{label:>6}: {calls / wall:8.0f} calls/s  {wall * 1e6 / calls:7.1f} us/call  "
+          f"usage writes={writes:5d}  tasks recorded={tasks} (rows={rows}, lost to races={lost})")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--users", type=int, default=4)
+    a = ap.parse_args()
+    Base.metadata.create_all(bind=engine)
+    run_sqlite_migrations()
+    print(f"{a.calls} calls from {a.threads} threads over {a.users} users")
+    for label in ("old", "meter"):
+        asyncio.run(_run(label, a.calls, a.threads, a.users))
+
+
+if __name__ == "__main__":
+    main()
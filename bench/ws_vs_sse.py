@@ -0,0 +1,68 @@
+"""
+Many conversations on one client: N SSE streams vs one multiplexed
+WebSocket joined to N rooms. Reports hub-side memory (tracemalloc) for the
+subscriber state, plus the connections/FDs each approach needs and the
+publish cost to reach every room.
+
+    python -m bench.ws_vs_sse [--rooms 10 50 200]
+"""
+import argparse, asyncio, time, tracemalloc
+
+from app.shared import sse
+
+
+async def _sse_streams(n: int):
+    gens = [sse.sse_stream(f"room{i}") for i in range(n)]
+    for g in gens:
+        await g.__anext__()  # ": connected" -> subscribed
+    return gens
+
+
+async def _close_streams(gens):
+    for g in gens:
+        await g.aclose()
+
+
+async def _ws_rooms(n: int):
+    sub = sse.Subscriber()
+    for i in range(n):
+        sse.join(f"room{i}", sub)
+    return sub
+
+
+async def _measure(n: int, kind: str):
+    sse.set_broker(sse.InProcessBroker())
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot()
+    state = await (_sse_streams(n) if kind == "sse" else _ws_rooms(n))
+    mem = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(base, "filename"))
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        await sse.publish(f"room{i}", "token", {"text_chunk": "x"})
+    publish_us = (time.perf_counter() - t0) / n * 1e6
+
+    if kind == "sse":
+        await _close_streams(state)
+    else:
+        for i in range(n):
+            sse.unsubscribe(f"room{i}", state)
+    await sse.shutdown()
+    sse.set_broker(None)
+    return mem, publish_us
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rooms", type=int, nargs="+", default=[10, 50, 200])
+    args = ap.parse_args()
+    print(f"{'rooms':>6} {'transport':>10} {'conns/FDs':>10} {'hub memory':>12} {'publish':>10}")
+    for n in args.rooms:
+        for kind, conns in (("sse", n), ("ws", 1)):
+            mem, us = asyncio.run(_measure(n, kind))
+            print(f"{n:>6} {kind:>10} {conns:>10} {mem / 1024:>9.1f} KB {us:>7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os, tempfile
+
+# Tests never touch storage/agenthub.db: point the app at a throwaway database
+# before anything imports app.shared.db.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='agenthub-test-')}/test.db")
+
+import pytest
+from sqlalchemy import text
+
+from app.main import app  # noqa: F401  (registers every model on Base)
+from app.conversations.models import Conversation
+from app.runs import scheduler
+from app.shared.db import Base, SessionLocal, engine, run_sqlite_migrations
+
+Base.metadata.create_all(bind=engine)
+run_sqlite_migrations()
+
+
+@pytest.fixture
+def db():
+    s = SessionLocal()
+    try:
+        yield s
+    finally:
+        s.close()
+
+
+@pytest.fixture
+def conv(db):
+    """A conversation whose runs are deleted afterwards."""
+    c = Conversation(user_id="test-user", title="test")
+    db.add(c); db.commit()
+    yield c.id
+    db.execute(text("DELETE FROM runs WHERE conversation_id=:c"), {"c": c.id})
+    db.commit()
+
+
+@pytest.fixture
+def job_kind():
+    yield "test_job"
+    scheduler.JOBS.pop("test_job", None)  # registered by the test; not a job the app has
@@ -0,0 +1,62 @@
+import asyncio, json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.shared.auth import issue_dev_token
+from app.shared.db import SessionLocal
+from app.shared.usage import get_meter, read
+from app.tools import cache
+from app.tools.registry import get_tool
+
+
+@pytest.fixture
+def client():
+    cache.reset()
+    with TestClient(app) as c:
+        yield c
+    cache.reset()
+
+
+def _headers(sub: str) -> dict:
+    return {"Authorization": f"Bearer {issue_dev_token(sub)}"}
+
+
+def test_batch_runs_calls_and_bills_once(client):
+    calls = [{"name": "sentiment.analyze", "args": {"text": f"good {i}"}, "id": f"s{i}"} for i in range(20)]
+    calls += [
+        {"name": "todos.create", "args": {"title": "batched"}},
+        {"name": "sentiment.analyze", "args": {}},          # schema violation: not run
+        {"name": "nope.tool", "args": {}},
+        {"name": "sentiment.analyze", "args": {"text": "good 0"}},  # cache hit: not billed
+    ]
+    res = client.post("/tools/batch", json={"calls": calls, "max_concurrency": 4}, headers=_headers("batch-user"))
+    assert res.status_code == 200
+    data = res.json()["data"]
+    results = data["results"]
+    assert [r["index"] for r in results] == list(range(len(calls)))
+    assert results[3]["id"] == "s3" and results[3]["data"]["label"] == "positive"
+    assert results[20]["data"]["title"] == "batched"
+    assert results[21]["error"]["code"] == "invalid_input" and results[22]["error"]["code"] == "unknown_tool"
+    assert data["succeeded"] == 22 and data["billed"]["tasks"] == 21
+
+    asyncio.run(get_meter().flush())
+    with SessionLocal() as db:
+        usage = read(db, "batch-user")
+    assert data["billed"]["tokens"] == 20 * get_tool("sentiment.analyze")["token_cost"] + get_tool("todos.create")["token_cost"]
+    assert usage == {"tasks": 21, "tokens": data["billed"]["tokens"]}  # one aggregate write
+
+
+def test_batch_streams_ndjson_and_checks_quota_up_front(client, monkeypatch):
+    calls = [{"name": "sentiment.analyze", "args": {"text": f"bad {i}"}} for i in range(5)]
+    with client.stream("POST", "/tools/batch", json={"calls": calls, "stream": True}, headers=_headers("stream-user")) as res:
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in res.iter_lines() if line]
+    assert sorted(r["index"] for r in lines[:-1]) == list(range(5))
+    assert lines[-1]["done"] and lines[-1]["billed"]["tasks"] == 5
+
+    monkeypatch.setattr("app.shared.guard.settings.FREE_TASK_LIMIT", 3)
+    free = {"Authorization": f"Bearer {issue_dev_token('free-user', tier='free')}"}
+    res = client.post("/tools/batch", json={"calls": calls}, headers=free)
+    assert res.status_code == 402
@@ -0,0 +1,151 @@
+import asyncio, http.server, os, sys, threading, time
+
+import pytest
+
+from app.runs import scheduler
+from app.runs.models import Run
+from app.runs.service import cancel_run, create_run
+from app.runs.timeline import Timeline
+from app.shared import offload
+from app.tools.browser import service as browser
+from app.tools.download import service as download
+from app.tools.executor import run_tool
+
+FAKE_CHROME = """#!/bin/sh
+# stands in for chrome: a long-lived main process with a helper child
+sleep 60 &
+echo $$ $! > "$FAKE_CHROME_PIDS"
+wait
+"""
+
+
+def _alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"  # zombies have released everything
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inspects /proc")
+def test_cancelled_cli_screenshot_leaves_no_processes(tmp_path, monkeypatch):
+    exe = tmp_path / "fake-chrome"
+    exe.write_text(FAKE_CHROME)
+    exe.chmod(0o755)
+    pids_file = tmp_path / "pids"
+    monkeypatch.setenv("FAKE_CHROME_PIDS", str(pids_file))
+    monkeypatch.setattr(browser.settings, "CHROME_PATH", str(exe))
+    monkeypatch.setattr(browser.settings, "BROWSER_ENGINE", "cli")
+
+    async def _run():
+        task = asyncio.create_task(run_tool("browser.screenshot", {"url": "https://example.com"}))
+        while not pids_file.exists() or not pids_file.read_text().strip():
+            await asyncio.sleep(0.02)
+        t0 = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.perf_counter() - t0
+
+    elapsed = asyncio.run(_run())
+    pids = [int(p) for p in pids_file.read_text().split()]
+    assert len(pids) == 2
+    assert elapsed < 2
+    assert not any(_alive(p) for p in pids)
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(1024 * 1024))
+        self.end_headers()
+        try:
+            for _ in range(1024):
+                self.wfile.write(b"x" * 1024)
+                time.sleep(0.01)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def test_cancelled_download_stops_and_removes_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "ARTIFACTS", tmp_path)
+    monkeypatch.setattr(download, "_CHUNK", 1024)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/big.bin"
+
+    async def _run():
+        task = asyncio.create_task(run_tool("download.fetch", {"url": url}))
+        while not list(tmp_path.iterdir()):
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return offload.stats()["inflight"]["io"]
+
+    try:
+        inflight = asyncio.run(_run())
+    finally:
+        server.shutdown()
+    assert inflight == 0  # the worker thread returned, it is not still streaming
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_scheduler_cancels_the_running_job(db, conv, job_kind):
+    cleaned = []
+
+    @scheduler.job(job_kind)
+    async def _job(run, db):
+        try:
+            async with Timeline(db, run.id) as tl:  # entering reads the step index off the loop
+                try:
+                    await asyncio.sleep(60)
+                finally:
+                    tl.status("completed")  # written on the way out; must not overwrite the cancel
+        finally:
+            cleaned.append(run.id)  # also when the cancel lands while the timeline is being entered
+
+    async def _run():
+        s = scheduler.RunScheduler(workers=1, queue_max=5, weights={"free": 1}, poll_s=0.05)
+        run = create_run(db, conv)
+        s.submit(db, run, job_kind, {}, tier="free")
+        while run.id not in s._live:
+            await asyncio.sleep(0.01)
+        cancel_run(db, run.id)
+        stopped = await s.cancel(run.id, wait_s=1)
+        while s.running:  # the worker's own bookkeeping runs right after the job task ends
+            await asyncio.sleep(0.01)
+        stats = s.stats()
+        await s.stop()
+        return run.id, stopped, stats
+
+    run_id, stopped, stats = asyncio.run(_run())
+    assert stopped and cleaned == [run_id]
+    assert stats["cancelled"] == 1 and stats["running"] == 0 and stats["live"] == []
+    db.expire_all()
+    assert db.get(Run, run_id).status == "cancelled"
+
+
+def test_cancelling_a_finished_run_keeps_its_outcome(db, conv):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.runs.service import finish_run
+
+    done, failed = create_run(db, conv), create_run(db, conv)
+    finish_run(db, done.id)
+    finish_run(db, failed.id, status="failed")
+    db.refresh(done)
+    finished_at = done.finished_at
+
+    assert cancel_run(db, done.id)  # the run exists; nothing to cancel
+    db.expire_all()
+    assert db.get(Run, done.id).status == "completed" and db.get(Run, done.id).finished_at == finished_at
+    with TestClient(app) as c:
+        res = c.post(f"/runs/{failed.id}/cancel").json()
+    assert res["status"] == "failed" and not res["stopped"]
+    db.expire_all()
+    assert db.get(Run, failed.id).status == "failed"
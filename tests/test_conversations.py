@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+from app.conversations import service
+from app.conversations.models import Conversation
+from app.main import app
+from app.shared.auth import issue_dev_token
+
+
+@pytest.fixture
+def inbox(db):
+    # six conversations created in the same timestamp tick, plus one older
+    tick = datetime(2025, 3, 1, 9, 0, 0)
+    convs = [Conversation(user_id="inbox-user", title=f"c{i}", created_at=tick) for i in range(6)]
+    convs.append(Conversation(user_id="inbox-user", title="old", created_at=datetime(2025, 2, 1)))
+    db.add_all(convs); db.commit()
+    yield sorted(convs, key=lambda c: (c.created_at, c.id), reverse=True)
+    db.execute(text("DELETE FROM messages WHERE conversation_id IN (SELECT id FROM conversations WHERE user_id='inbox-user')"))
+    db.execute(text("DELETE FROM conversations WHERE user_id='inbox-user'"))
+    db.commit()
+
+
+def test_cursor_pages_through_timestamp_ties(db, inbox):
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = service.list_conversations(db, "inbox-user", limit=2 if pages < 3 else 1, cursor=cursor)
+        seen += [c.id for c in rows]
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == [c.id for c in inbox]  # none skipped or repeated
+    assert pages == 4  # 2+2+2 then the last one; no empty trailing page
+
+    rows, cursor = service.list_conversations(db, "inbox-user", limit=7)
+    assert len(rows) == 7 and cursor is None  # an exactly full last page says so
+
+    rows, _ = service.list_conversations(db, "inbox-user", cursor="2025-03-01T09:00:00")  # old ISO cursors
+    assert [c.title for c in rows] == ["old"]
+    with pytest.raises(ValueError):
+        service.list_conversations(db, "inbox-user", cursor="not a cursor")
+
+
+def test_listing_uses_the_composite_index(db):
+    stmt = None
+    real_scalars = db.scalars
+
+    def _capture(s, *a, **kw):
+        nonlocal stmt
+        stmt = str(s.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        return real_scalars(s, *a, **kw)
+
+    db.scalars = _capture
+    service.list_conversations(db, "someone", cursor=service.encode_cursor(datetime(2025, 1, 1), "x"))
+    db.scalars = real_scalars
+    plan = " | ".join(r[-1] for r in db.execute(text(f"EXPLAIN QUERY PLAN {stmt}")).fetchall())
+    assert "ix_conversations_user_archived_created_id" in plan and "TEMP B-TREE" not in plan
+
+
+def test_preview_comes_from_the_denormalized_columns(monkeypatch):
+    monkeypatch.setattr("app.conversations.api.current_user_id", lambda: "preview-user")
+    with TestClient(app, headers={"Authorization": f"Bearer {issue_dev_token('chat-user')}"}) as c:
+        cid = c.post("/conversations", json={"title": "p"}).json()["id"]
+        c.post(f"/conversations/{cid}/messages", json={"text": "first"})
+        c.post(f"/conversations/{cid}/messages", json={"text": "x" * 500})
+        plain = c.get("/conversations").json()["items"][0]
+        item = c.get("/conversations", params={"preview": True}).json()["items"][0]
+    assert plain["last_message"] is None
+    assert item["id"] == cid and item["last_message"]["text"] == "x" * 200
+    assert item["last_message"]["role"] == "user"
@@ -0,0 +1,102 @@
+import asyncio, time
+
+import pytest
+
+from app.runs import dag
+
+
+def _plan():
+    return dag.parse_plan([
+        {"id": "a", "tool": "sentiment.analyze", "args": {"text": "great"}},
+        {"id": "b", "tool": "sentiment.analyze", "args": {"text": "awful"}},
+        {"id": "c", "tool": "sentiment.analyze", "args": {"text": "fine"}},
+        {"id": "note", "tool": "notes.create", "args": {"text": "${a.label}/${b.label}", "tags": ["${c.label}"]}},
+    ])
+
+
+def test_parse_plan_rejects_bad_graphs():
+    ok = {"id": "a", "tool": "sentiment.analyze", "args": {"text": "x"}}
+    for nodes, msg in [
+        ([ok, ok], "duplicate"),
+        ([{"id": "a", "tool": "nope.tool"}], "unknown tool"),
+        ([{**ok, "after": ["ghost"]}], "unknown node"),
+        ([{**ok, "args": {}}], "invalid args"),
+        ([{"id": "a", "tool": "sentiment.analyze", "args": {"text": "${b.label}"}},
+          {"id": "b", "tool": "sentiment.analyze", "args": {"text": "${a.label}"}}], "cycle"),
+    ]:
+        with pytest.raises(dag.PlanError, match=msg):
+            dag.parse_plan(nodes)
+    assert _plan()["note"].deps == {"a", "b", "c"}
+
+
+def test_fan_out_runs_concurrently_under_the_cap():
+    live, peak, seen = 0, 0, {}
+
+    async def call(tool, args):
+        nonlocal live, peak
+        live += 1
+        peak = max(peak, live)
+        await asyncio.sleep(0.05)
+        live -= 1
+        seen[tool, str(args)] = True
+        return {"label": args.get("text", "")[:1], "ok": True}
+
+    t0 = time.perf_counter()
+    out = asyncio.run(dag.execute(_plan(), call, max_parallel=3))
+    wall = time.perf_counter() - t0
+    assert peak == 3 and wall < 0.15  # two levels of ~50ms, not four calls in a row
+    assert ("notes.create", str({"text": "g/a", "tags": ["f"]})) in seen
+    assert set(out) == {"a", "b", "c", "note"}
+
+    peak = 0
+    asyncio.run(dag.execute(_plan(), call, max_parallel=1))
+    assert peak == 1
+
+
+def test_failure_cancels_siblings_and_skips_dependents():
+    started, cancelled = [], []
+
+    async def call(tool, args):
+        started.append(args.get("text"))
+        if args.get("text") == "awful":
+            raise RuntimeError("boom")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(args.get("text"))
+            raise
+        return {}
+
+    with pytest.raises(dag.NodeFailed) as e:
+        asyncio.run(dag.execute(_plan(), call, max_parallel=4))
+    assert e.value.node == "b"
+    assert sorted(cancelled) == ["fine", "great"] and len(started) == 3
+
+
+def test_plan_endpoint_persists_a_step_per_node():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.runs.models import Step
+    from app.shared.db import SessionLocal
+
+    with TestClient(app) as c:
+        cid = c.post("/conversations", json={"title": "dag"}).json()["id"]
+        bad = c.post("/runs/plan", json={"conversation_id": cid, "nodes": [{"id": "x", "tool": "nope"}]})
+        assert bad.status_code == 400
+        nodes = [{"id": n.id, "tool": n.tool, "args": n.args} for n in _plan().values()]
+        res = c.post("/runs/plan", json={"conversation_id": cid, "nodes": nodes, "max_parallel": 2})
+        assert res.status_code == 202
+        run_id = res.json()["run_id"]
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            run = c.get(f"/runs/by-conversation/{cid}").json()[0]
+            if run["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.05)
+        assert run["status"] == "completed" and run["mode"] == "dag"
+
+    with SessionLocal() as db:
+        steps = db.query(Step).filter(Step.run_id == run_id, Step.kind == "tool", Step.status == "completed").all()
+    results = {s.data["node"]: s.data["result"] for s in steps}
+    assert set(results) == {"a", "b", "c", "note"}
+    assert results["note"]["text"] == "positive/negative" and results["note"]["tags"] == ["neutral"]
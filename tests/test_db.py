@@ -0,0 +1,25 @@
+from app.shared import db as shared_db
+
+
+def test_storage_profile_is_applied_to_pooled_connections():
+    p = shared_db.pragmas()
+    assert p["journal_mode"] == "wal"
+    assert p["synchronous"] == 1  # NORMAL
+    assert p["busy_timeout"] == shared_db.settings.SQLITE_BUSY_TIMEOUT_MS
+    assert p["cache_size"] == -shared_db.settings.SQLITE_CACHE_SIZE_KB
+    assert shared_db.engine.pool.size() == shared_db.settings.DB_POOL_SIZE
+
+
+def test_chat_confirmation_flow_on_the_async_session():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.shared.auth import issue_dev_token
+
+    with TestClient(app, headers={"Authorization": f"Bearer {issue_dev_token('chat-user')}"}) as c:
+        cid = c.post("/conversations", json={"title": "async"}).json()["id"]
+        email = {"id": "mail", "tool": "email.draft_send", "args": {"to": "a@example.com", "subject": "s", "body": "b"}}
+        res = c.post("/runs/plan", json={"conversation_id": cid, "nodes": [email]})
+        assert res.json()["status"] == "awaiting_confirmation"
+        assert c.post(f"/conversations/{cid}/messages", json={"text": "no"}).status_code == 202
+        assert c.get(f"/runs/by-conversation/{cid}").json()[0]["status"] == "cancelled"
+        assert c.post("/conversations/nope/messages", json={"text": "hi"}).status_code == 404
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.tools import executor
+from app.tools.registry import REGISTRY
+
+
+def test_every_registry_entry_resolves_to_a_handler():
+    for meta in REGISTRY:
+        h = executor.resolve(meta["name"])
+        assert h.meta["token_cost"] > 0 and h.meta["timeout_s"] > 0
+        assert executor.resolve(meta["name"]) is h  # imported once, cached
+        assert h.var_kw or h.accepts <= h.params, meta["name"]  # every declared argument reaches the service
+
+
+def test_run_tool_injects_user_and_rejects_unknown_args():
+    async def _run():
+        item = await executor.run_tool("todos.create", {"title": "t", "labels": None}, user_id="u-exec", bill=False)
+        upd = await executor.run_tool(
+            "todos.update", {"todo_id": item["id"], "status": "completed", "title": "x"}, user_id="u-exec", bill=False,
+        )
+        with pytest.raises(executor.InvalidArgs, match="priority"):
+            await executor.run_tool("todos.update", {"todo_id": item["id"], "priority": 1}, user_id="u-exec", bill=False)
+        with pytest.raises(ValueError):  # no silent fallback to a dry run
+            await executor.run_tool("email.draft_send", {"to": "a@b.co", "subject": "s", "body": "b", "dry_run": False},
+                                    bill=False)
+        listed = await executor.run_tool("todos.list", {}, user_id="u-exec", bill=False)
+        return item, upd, listed
+
+    item, upd, listed = asyncio.run(_run())
+    assert item["labels"] == [] and upd["status"] == "completed" and upd["title"] == "x"
+    assert [i["id"] for i in listed] == [item["id"]]
+
+
+def test_unknown_tool_and_timeout(monkeypatch):
+    with pytest.raises(executor.UnknownTool):
+        asyncio.run(executor.run_tool("nope.nothing", {}))
+    assert not issubclass(executor.UnknownTool, KeyError)  # routes map KeyError to 404 not_found
+
+    async def _slow(q: str):
+        await asyncio.sleep(1)
+
+    h = executor.resolve("search.web")
+    monkeypatch.setattr(h, "fn", _slow)
+    monkeypatch.setattr(h, "is_async", True)
+    monkeypatch.setitem(h.meta, "timeout_s", 0.01)
+    with pytest.raises(TimeoutError):
+        asyncio.run(executor.run_tool("search.web", {"q": "x"}, bill=False))
+
+
+def test_sync_service_without_a_session_gets_its_own_on_the_pool(monkeypatch):
+    import threading
+    seen = {}
+
+    def _preview(db, user_id: str, file_id: str, limit: int = 50):
+        seen.update(thread=threading.current_thread().name, active=db.is_active, user=user_id)
+        return {"ok": True}
+
+    h = executor.resolve("csv.preview")
+    monkeypatch.setattr(h, "fn", _preview)
+    monkeypatch.setitem(h.meta, "cache_ttl_s", 0)
+    out = asyncio.run(executor.run_tool("csv.preview", {"file_id": "f1"}, user_id="u-exec", bill=False))
+    assert out == {"ok": True} and seen["active"] and seen["user"] == "u-exec"
+    assert seen["thread"].startswith("offload-io")  # opened there, not on the event loop
+
+
+def test_calendar_routes_update_titles_and_map_errors(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.shared.auth import issue_dev_token
+
+    headers = {"Authorization": f"Bearer {issue_dev_token('cal-user')}"}
+    with TestClient(app, headers=headers) as c:
+        ev = c.post("/tools/calendar/create_event", json={"title": "standup", "start": "2026-01-05T09:00:00Z"})
+        event_id = ev.json()["data"]["id"]
+        res = c.post("/tools/calendar/update_event", json={"event_id": event_id, "title": "retro"})
+        assert res.status_code == 200 and res.json()["data"]["title"] == "retro"
+        assert res.json()["data"]["start"] == "2026-01-05T09:00:00Z"  # fields sent as None are left alone
+        res = c.post("/tools/calendar/update_event", json={"event_id": "missing", "title": "x"})
+        assert res.status_code == 404 and res.json()["detail"]["error"]["message"] == "not_found"
+
+        async def _slow(**kw):
+            await asyncio.sleep(1)
+
+        h = executor.resolve("calendar.update_event")
+        monkeypatch.setattr(h, "fn", _slow)
+        monkeypatch.setattr(h, "is_async", True)
+        monkeypatch.setitem(h.meta, "timeout_s", 0.01)
+        res = c.post("/tools/calendar/update_event", json={"event_id": event_id})
+        assert res.status_code == 504 and res.json()["detail"]["error"]["code"] == "tool_timeout"
@@ -0,0 +1,96 @@
+import asyncio, datetime as dt
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app.main import app
+from app.shared import idem
+from app.shared.auth import issue_dev_token
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+    calls = []
+
+    async def _fake_run_gated(name, args, ctx):
+        calls.append(args["url"])
+        await asyncio.sleep(0.2)  # long enough for the other requests to arrive
+        if "fail" in args["url"] and len(calls) == 1:
+            raise RuntimeError("first attempt fails")
+        return {"path": f"/tmp/{len(calls)}"}
+
+    monkeypatch.setattr("app.tools.download.api.run_gated", _fake_run_gated)
+    idem.reset()
+    yield calls
+    idem.reset()
+
+
+def _post(c: httpx.AsyncClient, key: str, url: str):
+    headers = {"Authorization": f"Bearer {issue_dev_token('idem-user')}", "Idempotency-Key": key}
+    return c.post("/tools/download/fetch", json={"url": url}, headers=headers)
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_concurrent_requests_with_one_key_run_once(fetch):
+    async def _run():
+        async with _client() as c:
+            first = await asyncio.gather(*[_post(c, "k-same", "https://example.com/a") for _ in range(5)])
+            again = await _post(c, "k-same", "https://example.com/a")
+            other = await _post(c, "k-same", "https://example.com/b")
+        return first, again, other
+
+    first, again, other = asyncio.run(_run())
+    assert fetch == ["https://example.com/a"]
+    assert {r.status_code for r in first} == {200} and len({r.text for r in first}) == 1
+    assert sum(r.headers.get("Idempotent-Replay") == "true" for r in first) == 4
+    assert again.status_code == 200 and again.json() == first[0].json()
+    assert again.headers["Idempotent-Replay"] == "true"
+    assert other.status_code == 422  # same key, different request
+    s = idem.stats()
+    assert s["coalesced"] == 4 and s["saves"] == 1 and s["in_flight"] == 0
+
+
+def test_waiters_take_over_when_the_holder_fails(fetch):
+    async def _run():
+        async with _client() as c:
+            return await asyncio.gather(*[_post(c, "k-fail", "https://example.com/fail") for _ in range(2)])
+
+    res = asyncio.run(_run())
+    assert sorted(r.status_code for r in res) == [200, 500]
+    assert len(fetch) == 2 and idem.stats()["in_flight"] == 0
+
+
+def test_replays_survive_the_memory_tier_and_expire(db, fetch):
+    async def _once():
+        async with _client() as c:
+            return await _post(c, "k-db", "https://example.com/c")
+
+    assert asyncio.run(_once()).headers.get("Idempotent-Replay") is None
+    idem.reset()  # a fresh process: only the table has it
+    replay = asyncio.run(_once())
+    assert replay.headers["Idempotent-Replay"] == "true" and idem.stats()["db_hits"] == 1
+    assert fetch == ["https://example.com/c"]
+
+    old = dt.datetime.utcnow() - dt.timedelta(days=2)
+    db.execute(text("DELETE FROM idempotency_keys"))
+    db.add_all([idem.IdemRecord(key=f"old-{i}", request_sig="s", response_json="{}", created_at=old) for i in range(7)])
+    db.add(idem.IdemRecord(key="fresh", request_sig="s", response_json="{}"))
+    db.commit()
+    store = idem.IdemStore(size=8, ttl_s=86400, purge_batch=3)
+    assert store.purge() == 7  # batches of 3, 3, 1
+    assert db.execute(text("SELECT key FROM idempotency_keys")).scalars().all() == ["fresh"]
+
+
+def test_a_non_json_body_is_answered_not_crashed_on(fetch):
+    async def _run():
+        headers = {"Authorization": f"Bearer {issue_dev_token('idem-user')}", "Idempotency-Key": "k-raw",
+                   "Content-Type": "text/plain"}
+        async with _client() as c:
+            return await c.post("/tools/download/fetch", content=b"url=https://example.com/a", headers=headers)
+
+    res = asyncio.run(_run())
+    assert res.status_code == 422 and fetch == []  # the body is rejected by validation, not a 500
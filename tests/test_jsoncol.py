@@ -0,0 +1,46 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.conversations.models import Conversation, Message
+from app.main import app
+from app.runs.models import Run, Step
+
+
+def test_views_decode_once_and_follow_the_column(db, monkeypatch):
+    loads = []
+    real = __import__("json").loads
+    monkeypatch.setattr("app.shared.jsoncol.json.loads", lambda raw: loads.append(raw) or real(raw))
+
+    m = Message(attachments_json='["a", "b"]')
+    assert m.attachments == ["a", "b"] and m.attachments is m.attachments
+    assert len(loads) == 1
+
+    m.attachments = ["c"]  # re-encodes the column, drops the decoded copy
+    assert m.attachments_json == '["c"]' and m.attachments == ["c"] and len(loads) == 2
+    m.attachments_json = '["d"]'  # the column changed underneath
+    assert m.attachments == ["d"] and len(loads) == 3
+
+    s = Step(data_json="{not json")
+    assert s.data == {} and s.data is s.data
+    assert Run(plan_json=None).plan == [] and Run().pending_payload == {}
+
+
+def test_reloaded_rows_are_decoded_again(db):
+    conv = Conversation(user_id="jsoncol-user")
+    db.add(conv); db.flush()
+    run = Run(conversation_id=conv.id, mode="dag", status="completed")
+    run.plan = [{"id": "a", "tool": "todos.create", "args": {}}]
+    db.add(run); db.commit()
+    assert run.plan[0]["id"] == "a"
+
+    db.execute(text("UPDATE runs SET plan_json = '[\"x\"]' WHERE id = :id"), {"id": run.id})
+    db.commit()  # expires the instance; the next read loads the new text
+    assert run.plan == ["x"]
+
+    with TestClient(app) as c:
+        rows = c.get(f"/runs/by-conversation/{conv.id}").json()
+    assert rows == [{"id": run.id, "status": "completed", "mode": "dag", "plan": ["x"],
+                     "started_at": run.started_at.isoformat(), "finished_at": None}]
+    db.execute(text("DELETE FROM runs WHERE conversation_id = :c"), {"c": conv.id})
+    db.execute(text("DELETE FROM conversations WHERE id = :c"), {"c": conv.id})
+    db.commit()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+from app.conversations import service
+from app.conversations.models import Conversation, Message
+from app.conversations.service import encode_cursor
+from app.main import app
+
+
+@pytest.fixture
+def history(db):
+    # 10 messages, three of them sharing a timestamp with their neighbours
+    conv = Conversation(user_id="demo-user", title="history")
+    db.add(conv); db.commit()
+    t0 = datetime(2025, 1, 1, 12, 0, 0)
+    stamps = [t0, t0 + timedelta(seconds=1), t0 + timedelta(seconds=1), t0 + timedelta(seconds=1)]
+    stamps += [t0 + timedelta(seconds=2 + i) for i in range(6)]
+    for i, ts in enumerate(stamps):
+        m = Message(conversation_id=conv.id, role="user", text=f"m{i}", created_at=ts)
+        m.attachments = [f"f{i}"]
+        db.add(m)
+    db.commit()
+    ids = [m.id for m in db.query(Message).filter_by(conversation_id=conv.id).order_by(Message.created_at, Message.id)]
+    yield conv.id, ids
+    db.execute(text("DELETE FROM messages WHERE conversation_id=:c"), {"c": conv.id})
+    db.execute(text("DELETE FROM conversations WHERE id=:c"), {"c": conv.id})
+    db.commit()
+
+
+def test_pages_backwards_and_forwards_without_gaps(history):
+    cid, ids = history
+    with TestClient(app) as c:
+        url = f"/conversations/{cid}/messages"
+        page = c.get(url, params={"limit": 3}).json()
+        assert [m["id"] for m in page["items"]] == ids[-3:] and page["next_cursor"] is None
+
+        seen = [m["id"] for m in page["items"]]
+        while page["prev_cursor"]:
+            page = c.get(url, params={"limit": 3, "before": page["prev_cursor"]}).json()
+            seen = [m["id"] for m in page["items"]] + seen
+        assert seen == ids  # ties on created_at are neither skipped nor repeated
+
+        forward, cursor = [], encode_cursor(datetime(2000, 1, 1), "")
+        while cursor:
+            page = c.get(url, params={"limit": 4, "after": cursor}).json()
+            forward += [m["id"] for m in page["items"]]
+            cursor = page["next_cursor"]
+        assert forward == ids
+
+        full = c.get(url, params={"limit": 1}).json()["items"][0]
+        lite = c.get(url, params={"limit": 1, "fields": "lite"}).json()["items"][0]
+        assert full["attachments"] == ["f9"] and "attachments" not in lite
+
+        assert c.get(url, params={"before": "garbage"}).status_code == 400
+        assert c.get("/conversations/nope/messages").status_code == 404
+
+
+def test_history_pages_are_index_seeks(db):
+    captured = []
+    real_execute = db.execute
+
+    def _capture(stmt, *a, **kw):
+        captured.append(str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})))
+        return real_execute(stmt, *a, **kw)
+
+    db.execute = _capture
+    cursor = encode_cursor(datetime(2025, 1, 1), "x")
+    for kw in ({}, {"before": cursor}, {"after": cursor}):
+        service.list_messages(db, "c" * 32, limit=50, lite=True, **kw)
+    db.execute = real_execute
+    for sql in captured:
+        plan = " | ".join(r[-1] for r in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall())
+        assert "ix_messages_conv_created_id" in plan and "TEMP B-TREE" not in plan
@@ -0,0 +1,69 @@
+from sqlalchemy import create_engine, select, text
+
+from app.conversations.models import Message
+from app.runs.service import _latest_pending
+from app.shared import migrations, usage
+from app.shared.db import Base
+
+
+def _plan(db, sql: str, params: dict | None = None) -> str:
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params or {}).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def _literal(stmt) -> str:
+    return str(stmt.compile(compile_kwargs={"literal_binds": True}))
+
+
+def test_unversioned_database_is_migrated_once(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=eng)
+    with eng.begin() as conn:
+        # a pre-versioning database, with the duplicate rows the old read-then-insert could race into
+        conn.exec_driver_sql("CREATE TABLE user_usage (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+                             "day TEXT NOT NULL, tasks INTEGER NOT NULL DEFAULT 0, tokens INTEGER NOT NULL DEFAULT 0)")
+        conn.exec_driver_sql("INSERT INTO user_usage (user_id, day, tasks, tokens) "
+                             "VALUES ('u', '20250101', 1, 10), ('u', '20250101', 2, 20), ('v', '20250101', 1, 5)")
+        # a conversation whose inbox preview columns need backfilling
+        conn.exec_driver_sql("INSERT INTO conversations (id, user_id, title, archived, created_at, updated_at) "
+                             "VALUES ('c1', 'u', 't', 0, '2025-01-01 00:00:00', '2025-01-01 00:00:00')")
+        conn.exec_driver_sql("INSERT INTO messages (id, conversation_id, role, text, attachments_json, created_at) "
+                             "VALUES ('m1', 'c1', 'user', 'older', '[]', '2025-01-01 00:00:01'), "
+                             "('m2', 'c1', 'user', 'newest', '[]', '2025-01-01 00:00:02')")
+        # runs the old startup recovery would have picked up: 'running' without a lease
+        for rid, job in (("r1", '{"kind": "plain_chat", "args": {}}'), ("r2", "{}")):
+            conn.exec_driver_sql("INSERT INTO runs (id, conversation_id, status, mode, plan_json, needs_confirmation, "
+                                 "pending_payload_json, started_at, tier, job_json, attempts) "
+                                 f"VALUES ('{rid}', 'c1', 'running', 'chat', '[]', 0, '{{}}', '2025-01-01 00:00:00', 'free', '{job}', 0)")
+
+    assert migrations.migrate(eng) == [name for _, name, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(eng) == []
+    with eng.connect() as conn:
+        assert migrations.current_version(conn) == migrations.LATEST
+        rows = conn.exec_driver_sql("SELECT user_id, tasks, tokens FROM user_usage ORDER BY user_id").fetchall()
+        assert [tuple(r) for r in rows] == [("u", 3, 30), ("v", 1, 5)]
+        indexes = {r[1] for r in conn.exec_driver_sql("PRAGMA index_list(user_usage)")}
+        preview = conn.exec_driver_sql("SELECT last_message_preview, last_message_at FROM conversations").one()
+        runs = dict(conn.exec_driver_sql("SELECT id, status FROM runs").fetchall())
+    assert tuple(preview) == ("newest", "2025-01-01 00:00:02")
+    assert "ux_user_usage_user_day" in indexes
+    assert runs == {"r1": "queued", "r2": "failed"}
+    eng.dispose()
+
+
+def test_usage_lookup_uses_the_unique_index(db):
+    plan = _plan(db, usage._READ.text, {"u": "someone", "d": "20250101"})
+    assert "ux_user_usage_user_day" in plan
+
+
+def test_latest_pending_run_uses_the_composite_index(db):
+    plan = _plan(db, _literal(_latest_pending("c" * 32)))
+    assert "ix_runs_conv_status_started" in plan
+    assert "TEMP B-TREE" not in plan  # ordered by the index, no sort step
+
+
+def test_conversation_messages_use_the_composite_index(db):
+    stmt = select(Message).where(Message.conversation_id == "c" * 32).order_by(Message.created_at).limit(50)
+    plan = _plan(db, _literal(stmt))
+    assert "ix_messages_conv_created_id" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,24 @@
+import asyncio, os, threading
+
+from app.files.service import FileRef, bundle_for_refs
+from app.shared import offload
+
+
+def test_offload_pools_keep_work_off_the_loop(tmp_path):
+    note = tmp_path / "note.txt"
+    note.write_text("hello from a file")
+
+    async def _run():
+        loop_thread = threading.get_ident()
+        io_thread = await offload.run_io(threading.get_ident)
+        cpu_pid = await offload.run_cpu(os.getpid)
+        bundle = await offload.run_cpu(bundle_for_refs, [FileRef("f1", "note.txt", "text/plain", str(note))])
+        return loop_thread, io_thread, cpu_pid, bundle
+
+    try:
+        loop_thread, io_thread, cpu_pid, bundle = asyncio.run(_run())
+    finally:
+        offload.shutdown()
+    assert io_thread != loop_thread
+    assert cpu_pid != os.getpid() or offload.settings.OFFLOAD_CPU_PROCS == 0
+    assert "hello from a file" in bundle["text"]
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.conversations.models import Conversation, Message
+from app.main import app
+from app.runs.models import Run, Step
+from app.shared import retention
+from app.shared.db import pragmas
+
+OLD = datetime.now(timezone.utc) - timedelta(days=200)
+
+
+@pytest.fixture
+def history(db):
+    """An idle conversation (10 messages, 2 finished runs + 1 queued) and an active one."""
+    idle = Conversation(user_id="demo-user", title="idle", created_at=OLD, updated_at=OLD,
+                        last_message_at=OLD, last_message_role="user", last_message_preview="idle 9")
+    active = Conversation(user_id="demo-user", title="active")
+    db.add_all([idle, active]); db.flush()
+    for conv in (idle, active):
+        for i in range(10):
+            db.add(Message(conversation_id=conv.id, text=f"{conv.title} {i} " + "x" * 200,
+                           created_at=OLD + timedelta(minutes=i)))
+        for status in ("completed", "failed", "queued"):
+            run = Run(conversation_id=conv.id, status=status, started_at=OLD,
+                      finished_at=OLD if status != "queued" else None)
+            run.plan = ["answer"]
+            db.add(run); db.flush()
+            db.add_all([Step(run_id=run.id, idx=i, data={"i": i}) for i in range(5)])
+    db.commit()
+    yield idle.id, active.id
+    for cid in (idle.id, active.id):
+        db.execute(text("DELETE FROM steps WHERE run_id IN (SELECT id FROM runs WHERE conversation_id = :c)"), {"c": cid})
+        for table in ("runs", "messages", "archive_chunks"):
+            db.execute(text(f"DELETE FROM {table} WHERE conversation_id = :c"), {"c": cid})
+        db.execute(text("DELETE FROM conversations WHERE id = :c"), {"c": cid})
+    db.commit()
+
+
+def _count(db, table: str, cid: str) -> int:
+    if table == "steps":
+        sql = "SELECT COUNT(*) FROM steps WHERE run_id IN (SELECT id FROM runs WHERE conversation_id = :c)"
+    else:
+        sql = f"SELECT COUNT(*) FROM {table} WHERE conversation_id = :c"
+    return db.execute(text(sql), {"c": cid}).scalar()
+
+
+def test_sweep_archives_idle_history_in_batches_and_restores_it(db, history):
+    idle, active = history
+    before = db.execute(text("SELECT * FROM messages WHERE conversation_id = :c ORDER BY id"), {"c": idle}).all()
+    r = retention.Retention({"runs": 30, "messages": 90}, batch=3, pause_s=0, vacuum_pages=1000, interval_s=0)
+    out = r.sweep()
+    assert out["runs"] == 2 and out["messages"] == 10
+
+    assert [_count(db, t, idle) for t in ("messages", "runs", "steps")] == [0, 1, 5]  # the queued run stays
+    assert [_count(db, t, active) for t in ("messages", "runs", "steps")] == [10, 3, 15]
+    kinds = db.execute(text("SELECT kind, COUNT(*), SUM(row_count) FROM archive_chunks WHERE conversation_id = :c "
+                            "GROUP BY kind ORDER BY kind"), {"c": idle}).all()
+    assert [tuple(k) for k in kinds] == [("messages", 4, 10), ("runs", 1, 2)]  # 3+3+3+1 messages per batch
+
+    with TestClient(app) as c:
+        listed = {i["id"]: i for i in c.get("/conversations", params={"preview": True, "limit": 100}).json()["items"]}
+        assert listed[idle]["cold_at"] is not None and listed[idle]["last_message"]["text"].startswith("idle 9")
+        page = c.get(f"/conversations/{idle}/messages", params={"limit": 100}).json()  # restores on demand
+        assert [m["text"][:7] for m in page["items"]] == [f"idle {i} " for i in range(10)]
+        assert _count(db, "runs", idle) == 1  # only the messages came back
+        runs = c.get(f"/runs/by-conversation/{idle}").json()  # restores the runs on demand
+        assert len(runs) == 3 and _count(db, "runs", idle) == 3 and _count(db, "steps", idle) == 15
+        assert c.post(f"/conversations/{idle}/restore").json()["restored"] == {"messages": 0, "runs": 0, "steps": 0}
+
+    after = db.execute(text("SELECT * FROM messages WHERE conversation_id = :c ORDER BY id"), {"c": idle}).all()
+    assert after == before and _count(db, "archive_chunks", idle) == 0
+    db.expire_all()
+    assert db.get(Conversation, idle).cold_at is None
+    assert db.get(Run, db.execute(text("SELECT id FROM runs WHERE conversation_id = :c AND status = 'failed'"),
+                                  {"c": idle}).scalar()).plan == ["answer"]
+    assert r.sweep()["messages"] == 0  # restoring counts as activity
+
+
+def test_incremental_vacuum_releases_freed_pages(db):
+    assert pragmas()["auto_vacuum"] == 2  # INCREMENTAL, set before the test database got its tables
+    db.execute(text("CREATE TABLE IF NOT EXISTS vacuum_probe (blob TEXT)"))
+    db.execute(text("INSERT INTO vacuum_probe SELECT hex(randomblob(2000)) FROM (SELECT 1 FROM sqlite_master LIMIT 1) "
+                    "JOIN (WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 300) SELECT i FROM n)"))
+    db.commit()
+    db.execute(text("DROP TABLE vacuum_probe")); db.commit()
+    free = db.execute(text("PRAGMA freelist_count")).scalar()
+    assert free > 100
+    r = retention.Retention({}, batch=500, pause_s=0, vacuum_pages=64, interval_s=0)
+    assert r.vacuum() == free
+    assert db.execute(text("PRAGMA freelist_count")).scalar() == 0
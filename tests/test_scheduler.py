@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from app.runs import queue, scheduler
+from app.runs.models import Run
+from app.runs.service import create_run, finish_run
+
+
+def test_bounded_workers_admission_and_tier_weights(db, conv, job_kind):
+    order, live, peak = [], 0, 0
+
+    @scheduler.job(job_kind)
+    async def _job(run, db):
+        nonlocal live, peak
+        live += 1
+        peak = max(peak, live)
+        await asyncio.sleep(0.02)
+        order.append(run.job["args"]["tag"])
+        live -= 1
+        finish_run(db, run.id)
+
+    async def _run():
+        s = scheduler.RunScheduler(workers=2, queue_max=3, weights={"paid": 2, "free": 1}, poll_s=0.05)
+        runs = {}
+        for tag, tier in [("f0", "free"), ("f1", "free"), ("f2", "free"), ("p0", "paid"), ("p1", "paid")]:
+            runs[tag] = create_run(db, conv)
+            s.admit(db, tier)
+            queue.enqueue(db, runs[tag], job_kind, {"tag": tag}, tier)  # queued before workers start
+        with pytest.raises(scheduler.SchedulerFull):
+            s.submit(db, create_run(db, conv), job_kind, {"tag": "f3"}, tier="free")
+        assert s.stats()["queued"] == {"paid": 2, "free": 3}
+
+        s._ensure_started()
+        while len(order) < 5:
+            await asyncio.sleep(0.01)
+        await s.stop()
+        return peak, order, s.stats()
+
+    peak, order, stats = asyncio.run(_run())
+    assert peak == 2
+    assert order.index("p1") < order.index("f2")  # paid is served ahead of queued free work
+    assert stats["rejected"] == 1 and stats["running"] == 0
+    db.expire_all()
+    done = [r for r in db.query(Run).filter(Run.conversation_id == conv) if r.job.get("kind") == job_kind]
+    assert len(done) == 5 and {r.status for r in done} == {"completed"} and not any(r.lease_owner for r in done)
+
+
+def test_orphaned_runs_are_requeued_and_claimed_once(db, conv):
+    run = create_run(db, conv)
+    queue.enqueue(db, run, "plain_chat", {}, "free")
+    assert queue.claim(db, "dead-worker", "free", lease_s=0.001) == run.id
+    assert queue.claim(db, "other", "free") is None  # already leased
+
+    # a run another process created but has not queued yet is not an orphan
+    fresh = create_run(db, conv)
+    res = queue.requeue_expired(db)
+    assert res["requeued"] >= 1
+    db.expire_all()
+    assert db.get(Run, run.id).status == "queued" and db.get(Run, run.id).attempts == 1
+    assert db.get(Run, fresh.id).status == "pending"
+    assert queue.claim(db, "new-worker", "free") == run.id
+    assert not queue.heartbeat(db, run.id, "dead-worker")
+
+
+def test_claim_uses_the_queue_index(db):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM runs WHERE status='queued' AND tier='free' ORDER BY queued_at LIMIT 1"
+    )).fetchall()
+    assert any("ix_runs_claim" in row[-1] for row in plan)
+
+
+def test_chat_message_runs_through_the_durable_queue(db):
+    import time
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.shared.auth import issue_dev_token
+
+    with TestClient(app, headers={"Authorization": f"Bearer {issue_dev_token('chat-user')}"}) as c:
+        cid = c.post("/conversations", json={"title": "queued"}).json()["id"]
+        assert c.post(f"/conversations/{cid}/messages", json={"text": "hello"}).status_code == 202
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            runs = c.get(f"/runs/by-conversation/{cid}").json()
+            if runs and runs[0]["status"] == "completed":
+                break
+            time.sleep(0.05)
+        assert runs[0]["status"] == "completed"
+        assert c.get("/__debug/scheduler").json()["completed"] >= 1
+        assert db.get(Run, runs[0]["id"]).tier == "dev"  # the caller's tier, not DEFAULT_TIER
+        assert TestClient(app).post(f"/conversations/{cid}/messages", json={"text": "hi"}).status_code == 401
+
+
+def test_a_failing_job_marks_its_run_failed(db, conv, job_kind):
+    @scheduler.job(job_kind)
+    async def _job(run, db):
+        raise RuntimeError("boom")
+
+    async def _run():
+        s = scheduler.RunScheduler(workers=1, queue_max=5, weights={"free": 1}, poll_s=0.05)
+        run = create_run(db, conv)
+        s.submit(db, run, job_kind, {}, tier="free")
+        deadline = asyncio.get_running_loop().time() + 5
+        while (not s.counts["failed"] or s.running) and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)  # failure recorded, then the run finished
+        await s.stop()
+        return run.id, s.last_error
+
+    run_id, last_error = asyncio.run(_run())
+    assert last_error == f"{run_id}: RuntimeError: boom"
+    db.expire_all()
+    r = db.get(Run, run_id)
+    assert r.status == "failed" and r.finished_at is not None and r.lease_owner is None
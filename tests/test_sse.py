@@ -0,0 +1,245 @@
+import asyncio
+
+from app.shared import sse
+
+
+def test_sqlite_broker_delivers_other_workers_events(tmp_path):
+    async def _run():
+        path = str(tmp_path / "bus.db")
+        local = sse.SQLiteBroker(path, poll_interval=0.01)
+        remote = sse.SQLiteBroker(path)
+        sse.set_broker(local)
+        q = await sse.subscribe("c1")
+        try:
+            await sse.publish("c1", "token", {"text_chunk": "local"})
+            await asyncio.sleep(0.05)
+            await asyncio.to_thread(remote._insert, "c1", "token", '{"text_chunk": "remote"}')
+            got = [await asyncio.wait_for(q.get(), 1), await asyncio.wait_for(q.get(), 1)]
+            await asyncio.sleep(0.05)
+            assert q.empty()  # own rows are not delivered twice
+            return got
+        finally:
+            sse.unsubscribe("c1", q)
+            await local.stop()
+            sse.set_broker(None)
+
+    got = asyncio.run(_run())
+    assert [ev.data["text_chunk"] for ev in got] == ["local", "remote"]
+    assert got[0].id < got[1].id  # bus row ids double as event ids
+
+
+def test_last_event_id_replays_missed_events():
+    async def _run():
+        sse.set_broker(sse.InProcessBroker())
+        try:
+            for i in range(5):
+                await sse.publish("c2", "token", {"text_chunk": str(i)})
+            missed, _ = await sse.get_broker().replay("c2", 0)
+            resume_from = missed[1].id  # client saw the first two events
+
+            gen = sse.sse_stream("c2", last_event_id=str(resume_from))
+            assert await gen.__anext__() == b": connected\n\n"
+            frames = [await gen.__anext__() for _ in range(3)]
+            await sse.publish("c2", "final_answer", {"text": "done"})
+            frames.append(await gen.__anext__())
+            await gen.aclose()
+            return resume_from, frames
+        finally:
+            sse.set_broker(None)
+
+    resume_from, frames = asyncio.run(_run())
+    assert [f.split(b"\n")[0] for f in frames[:3]] == [
+        f"id: {resume_from + i}".encode() for i in (1, 2, 3)
+    ]
+    assert b'"text_chunk": "2"' in frames[0]
+    assert b"event: final_answer" in frames[3]
+
+
+def test_coalesced_stream_batches_tokens_until_next_event():
+    async def _run():
+        sse.set_broker(sse.InProcessBroker())
+        try:
+            gen = sse.sse_stream("c3", coalesce_ms=20, coalesce_bytes=1024)
+            await gen.__anext__()
+            for tok in ("Hello ", "there ", "friend "):
+                await sse.publish("c3", "token", {"text_chunk": tok})
+            await sse.publish("c3", "final_answer", {"text": "Hello there friend"})
+            frames = [await gen.__anext__(), await gen.__anext__()]
+            await gen.aclose()
+            return frames
+        finally:
+            sse.set_broker(None)
+
+    token_frame, final_frame = asyncio.run(_run())
+    assert b'"text_chunk": "Hello there friend "' in token_frame
+    assert b'"tokens": 3' in token_frame
+    assert b"event: final_answer" in final_frame
+
+
+def test_ping_mid_window_is_sent_after_the_merged_tokens():
+    async def _run():
+        sse.set_broker(sse.InProcessBroker())
+        try:
+            gen = sse.sse_stream("c6", coalesce_ms=1000, coalesce_bytes=1024)
+            await gen.__anext__()
+            (q,) = sse._SUBS["c6"]
+            await sse.publish("c6", "token", {"text_chunk": "Hel"})
+            nxt = asyncio.ensure_future(gen.__anext__())
+            await asyncio.sleep(0.01)  # the window is open
+            await sse.publish("c6", "token", {"text_chunk": "lo"})
+            q.ping()  # the heartbeat lands mid-window
+            frames = [await asyncio.wait_for(nxt, 0.5), await asyncio.wait_for(gen.__anext__(), 0.5)]
+            await gen.aclose()
+            return frames
+        finally:
+            sse.set_broker(None)
+
+    token_frame, ping = asyncio.run(_run())
+    assert b'"text_chunk": "Hello"' in token_frame and b'"tokens": 2' in token_frame
+    assert ping == b": ping\n\n"
+    merged = sse._merge_tokens([sse.Event(1, "token", {"text_chunk": "ab", "tokens": 2}),
+                                sse.Event(2, "token", {"text_chunk": "c"})], 1024)
+    assert [ev.data for ev in merged] == [{"text_chunk": "abc", "tokens": 3}]  # counts already-merged frames
+
+
+def test_publish_encodes_once_for_all_subscribers():
+    async def _run():
+        sse.set_broker(sse.InProcessBroker())
+        queues = [await sse.subscribe("c4") for _ in range(3)]
+        try:
+            await sse.publish("c4", "token", {"text_chunk": "hi"})
+            return [q.get_nowait() for q in queues]
+        finally:
+            for q in queues:
+                sse.unsubscribe("c4", q)
+            sse.set_broker(None)
+
+    a, b, c = asyncio.run(_run())
+    assert a is b is c
+    assert a.frame is b.frame
+
+
+def test_overflow_policies_and_room_cleanup():
+    async def _run():
+        sse.set_broker(sse.InProcessBroker())
+        try:
+            subs = {p: await sse.subscribe("c5", p) for p in sse.OVERFLOW_POLICIES}
+            for s in subs.values():
+                s._maxsize = 2
+            for i in range(4):
+                await sse.publish("c5", "token", {"text_chunk": str(i)})
+            result = {
+                "drop_oldest": [ev.data["text_chunk"] for ev in list(subs["drop_oldest"]._queue)],
+                "coalesce": [ev.data["text_chunk"] for ev in list(subs["coalesce"]._queue)],
+                "disconnect": subs["disconnect"].get_nowait() is sse._CLOSE,
+                "lag": (subs["drop_oldest"].dropped, subs["coalesce"].merged),
+            }
+            for s in subs.values():
+                sse.unsubscribe("c5", s)
+            result["room_gone"] = "c5" not in sse._SUBS
+            return result
+        finally:
+            sse.set_broker(None)
+
+    r = asyncio.run(_run())
+    assert r["drop_oldest"] == ["2", "3"]
+    assert r["coalesce"] == ["0", "123"]
+    assert r["disconnect"] is True
+    assert r["lag"] == (2, 2)
+    assert r["room_gone"] is True
+
+
+def test_websocket_multiplexes_rooms():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    sse.set_broker(sse.InProcessBroker())
+    try:
+        with TestClient(app).websocket_connect("/conversations/ws") as ws:
+            for cid in ("w1", "w2"):
+                ws.send_json({"op": "subscribe", "conversation_id": cid})
+                assert ws.receive_json()["event"] == "subscribed"
+            ws.portal.call(sse.publish, "w1", "token", {"text_chunk": "a"})
+            ws.portal.call(sse.publish, "w2", "token", {"text_chunk": "b"})
+            got = [ws.receive_json(), ws.receive_json()]
+            assert [(m["conversation_id"], m["data"]["text_chunk"]) for m in got] == [("w1", "a"), ("w2", "b")]
+
+            ws.send_json({"op": "unsubscribe", "conversation_id": "w1"})
+            assert ws.receive_json()["event"] == "unsubscribed"
+            ws.portal.call(sse.publish, "w1", "token", {"text_chunk": "x"})
+            ws.portal.call(sse.publish, "w2", "token", {"text_chunk": "c"})
+            assert ws.receive_json()["data"]["text_chunk"] == "c"
+
+            # resubscribing with last_event_id replays what was missed in w1
+            ws.send_json({"op": "subscribe", "conversation_id": "w1", "last_event_id": got[0]["id"]})
+            assert ws.receive_json()["event"] == "subscribed"
+            assert ws.receive_json()["data"]["text_chunk"] == "x"
+        assert "w1" not in sse._SUBS and "w2" not in sse._SUBS
+    finally:
+        sse.set_broker(None)
+
+
+
+def test_websocket_replay_is_not_overtaken_by_live_events():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    class SlowReplay(sse.InProcessBroker):
+        async def replay(self, cid, last_id):
+            missed = await super().replay(cid, last_id)
+            await sse.publish(cid, "token", {"text_chunk": "live"})  # arrives mid-replay
+            await asyncio.sleep(0.05)
+            return missed
+
+    sse.set_broker(SlowReplay())
+    try:
+        with TestClient(app).websocket_connect("/conversations/ws") as ws:
+            for i in range(3):
+                ws.portal.call(sse.publish, "w3", "token", {"text_chunk": str(i)})
+            ws.send_json({"op": "subscribe", "conversation_id": "w3", "last_event_id": "0"})
+            assert ws.receive_json()["event"] == "subscribed"
+            got = [ws.receive_json()["data"]["text_chunk"] for _ in range(4)]
+        assert got == ["0", "1", "2", "live"]
+    finally:
+        sse.set_broker(None)
+
+def test_sqlite_tail_skips_backlog_while_nobody_listens(tmp_path):
+    async def _run():
+        path = str(tmp_path / "bus.db")
+        local = sse.SQLiteBroker(path, poll_interval=0.01)
+        remote = sse.SQLiteBroker(path)
+        sse.set_broker(local)
+        local.ensure_started()
+        try:
+            await asyncio.sleep(0.05)
+            await asyncio.to_thread(remote._insert, "c9", "token", '{"text_chunk": "stale"}')
+            await asyncio.sleep(0.05)  # nobody subscribed: the cursor moves past it
+            q = await sse.subscribe("c9")
+            await asyncio.to_thread(remote._insert, "c9", "token", '{"text_chunk": "live"}')
+            got = await asyncio.wait_for(q.get(), 1)
+            await asyncio.sleep(0.05)
+            sse.unsubscribe("c9", q)
+            return got, q.empty()
+        finally:
+            await local.stop()
+            sse.set_broker(None)
+
+    got, drained = asyncio.run(_run())
+    assert got.data["text_chunk"] == "live" and drained
+
+
+def test_sqlite_replay_flags_gaps_per_conversation(tmp_path, monkeypatch):
+    monkeypatch.setattr(sse.settings, "SSE_REPLAY_MAX_EVENTS", 3)
+    bus = sse.SQLiteBroker(str(tmp_path / "bus.db"))
+    ids = [bus._insert("a", "token", f'{{"i": {i}}}') for i in range(5)]
+    events, truncated = bus._read_since("a", 0)
+    assert [e.id for e in events] == ids[2:] and truncated  # newest window, flagged
+    events, truncated = bus._read_since("a", ids[1])
+    assert [e.id for e in events] == ids[2:] and not truncated  # exactly what was missed
+
+    bus._insert("b", "token", "{}")
+    bus._db().execute("UPDATE sse_bus SET created_at = 0 WHERE cid = 'b'")
+    bus._prune(bus._db(), 1.0)
+    assert bus._read_since("a", ids[1])[1] is False  # b's pruned rows are not a's gap
+    events, truncated = bus._read_since("b", 0)
+    assert events == [] and truncated
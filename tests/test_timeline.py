@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, select
+
+from app.runs.models import Run, Step
+from app.runs.service import create_run
+from app.runs.timeline import Timeline
+
+
+def test_timeline_batches_steps_and_status_in_order(db):
+    run = create_run(db, "conv-timeline")
+    commits = []
+
+    def _count(session):
+        commits.append(1)
+
+    event.listen(db, "after_commit", _count)
+    try:
+        tl = Timeline(db, run.id, max_steps=32, max_delay_s=60)
+        for i in range(50):
+            tl.step("token", {"i": i})
+        tl.finish("completed")
+    finally:
+        event.remove(db, "after_commit", _count)
+
+    assert len(commits) == 2  # one size-triggered flush at 32, one on finish
+    steps = db.scalars(select(Step).where(Step.run_id == run.id).order_by(Step.idx)).all()
+    assert [s.idx for s in steps] == list(range(50))
+    assert [s.data["i"] for s in steps] == list(range(50))
+    db.expire_all()
+    r = db.get(Run, run.id)
+    assert r.status == "completed" and r.finished_at is not None
+
+    # a second writer on the same run continues the idx sequence
+    tl2 = Timeline(db, run.id)
+    assert tl2.step("final", {}) == 50
+
+
+def test_timeline_on_a_loop_writes_off_it_and_flushes_on_error(db):
+    run = create_run(db, "conv-timeline-async")
+    main_commits = []
+
+    def _count(session):
+        main_commits.append(1)
+
+    def _steps():
+        db.expire_all()
+        return [s.kind for s in db.scalars(select(Step).where(Step.run_id == run.id).order_by(Step.idx))]
+
+    async def _run():
+        with pytest.raises(RuntimeError):
+            async with Timeline(db, run.id, max_steps=32, max_delay_s=0.02) as tl:
+                tl.step("plan")
+                await asyncio.sleep(0.2)  # the timer queues the write; it lands from the I/O pool
+                timed = _steps()
+                tl.step("token")
+                raise RuntimeError("job failed")
+        return tl, timed
+
+    event.listen(db, "after_commit", _count)
+    try:
+        tl, timed = asyncio.run(_run())
+    finally:
+        event.remove(db, "after_commit", _count)
+    assert timed == ["plan"]
+    assert _steps() == ["plan", "token"]  # buffered when the job raised, written on the way out
+    assert tl._timer is None and tl.flushes == 2 and main_commits == []
@@ -0,0 +1,68 @@
+import asyncio, time
+
+import pytest
+
+from app.tools import cache, executor
+
+
+@pytest.fixture
+def sentiment(monkeypatch):
+    """sentiment.analyze with a call counter, and an empty cache."""
+    h = executor.resolve("sentiment.analyze")
+    real, calls = h.fn, []
+
+    def counted(text: str):
+        calls.append(text)
+        return real(text) if text != "boom" else {"ok": False, "error": "boom"}
+
+    monkeypatch.setattr(h, "fn", counted)
+    cache.reset()
+    yield h, calls
+    cache.reset()
+
+
+def _run(*calls):
+    async def _go():
+        return [await executor.run_tool(name, args, user_id=uid, bill=False) for name, args, uid in calls]
+    return asyncio.run(_go())
+
+
+def test_identical_args_are_served_from_the_lru(sentiment):
+    h, calls = sentiment
+    outs = _run(
+        ("sentiment.analyze", {"text": "great day"}, "u1"),
+        ("sentiment.analyze", {"text": "great day"}, "u2"),  # another user: the cache scope is global
+        ("sentiment.analyze", {"text": "sad day"}, "u1"),
+        ("sentiment.analyze", {"text": "boom"}, "u1"),
+        ("sentiment.analyze", {"text": "boom"}, "u1"),  # errors are never stored
+    )
+    assert calls == ["great day", "sad day", "boom", "boom"]
+    assert outs[0] == outs[1] and outs[0] is not outs[1]
+    outs[1]["label"] = "mutated"
+    assert _run(("sentiment.analyze", {"text": "great day"}, "u1"))[0]["label"] == "positive"
+    assert cache.stats()["tools"]["sentiment.analyze"] == {"hits": 2, "sqlite_hits": 0, "misses": 4, "stores": 2}
+
+
+def test_user_scope_and_ttl(sentiment, monkeypatch):
+    h, calls = sentiment
+    monkeypatch.setitem(h.meta, "cache_scope", "user")
+    monkeypatch.setitem(h.meta, "cache_ttl_s", 0.05)
+    _run(("sentiment.analyze", {"text": "nice"}, "u1"), ("sentiment.analyze", {"text": "nice"}, "u2"))
+    assert len(calls) == 2  # per-user entries
+    _run(("sentiment.analyze", {"text": "nice"}, "u1"))
+    assert len(calls) == 2
+    time.sleep(0.06)
+    _run(("sentiment.analyze", {"text": "nice"}, "u1"))
+    assert len(calls) == 3  # expired
+
+
+def test_sqlite_tier_is_shared_across_processes(sentiment, monkeypatch):
+    h, calls = sentiment
+    monkeypatch.setattr(cache, "_CACHE", cache.ToolCache(size=8, sqlite=True))
+    _run(("sentiment.analyze", {"text": "love it"}, None))
+    # a fresh process: empty LRU, same table
+    monkeypatch.setattr(cache, "_CACHE", cache.ToolCache(size=8, sqlite=True))
+    out = _run(("sentiment.analyze", {"text": "love it"}, None), ("sentiment.analyze", {"text": "love it"}, None))
+    assert calls == ["love it"] and out[0]["label"] == "positive"
+    assert cache.stats()["tools"]["sentiment.analyze"]["sqlite_hits"] == 1
+    assert cache.stats()["tools"]["sentiment.analyze"]["hits"] == 1  # promoted into the LRU
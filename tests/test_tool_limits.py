@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.shared.auth import issue_dev_token
+from app.tools import cache, limits
+from app.tools.executor import run_tool
+
+
+@pytest.fixture
+def features(monkeypatch):
+    monkeypatch.setattr(limits.settings, "TOOL_FEATURE_CONCURRENCY", "sentiment:1,*:16")
+    monkeypatch.setattr(limits.settings, "TOOL_FEATURE_WAIT_S", "sentiment:0.05,*:5")
+    monkeypatch.setattr(limits.settings, "TOOL_FEATURE_TIMEOUT_S", "sentiment:0.2,*:30")
+    limits.reset()
+    cache.reset()  # sentiment results are cached; these tests need real calls
+    yield
+    limits.reset()
+    cache.reset()
+
+
+def test_saturated_feature_is_busy_without_starving_others(features):
+    async def _run():
+        busy = limits.feature("sentiment")
+        async with busy.slot():  # a long call already holds the only sentiment slot
+            with pytest.raises(limits.ToolBusy):
+                await run_tool("sentiment.analyze", {"text": "good"})
+            todo = await run_tool("todos.create", {"title": "still served"}, user_id="u-limits", bill=False)
+        out = await run_tool("sentiment.analyze", {"text": "good"})
+        return todo, out
+
+    todo, out = asyncio.run(_run())
+    assert todo["title"] == "still served" and out["label"] == "positive"
+    s = limits.stats()
+    assert s["sentiment"]["busy"] == 1 and s["sentiment"]["ok"] == 2 and s["sentiment"]["in_flight"] == 0
+    assert s["sentiment"]["wait_ms"]["count"] == 2 and s["todos"]["exec_ms"]["count"] == 1
+
+
+def test_feature_deadline_caps_execution(features):
+    f = limits.feature("sentiment")
+    assert f.deadline(30) == 0.2 and f.deadline(0.1) == 0.1
+    assert limits.feature("calendar").deadline(None) == 30
+
+    async def _slow():
+        async with f.slot():
+            await asyncio.wait_for(asyncio.sleep(1), timeout=f.deadline(30))
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(_slow())
+    assert f.counts["timeout"] == 1 and f.exec_ms.max < 1000
+
+
+def test_busy_feature_maps_to_503_on_rest_routes(features):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    headers = {"Authorization": f"Bearer {issue_dev_token('limits-user')}"}
+    with TestClient(app) as c:
+        for name in ("sentiment", "todos"):
+            limits.feature(name).sem = asyncio.Semaphore(0)  # every slot taken
+        limits.feature("todos").wait_s = 0.05
+        # sentiment catches ToolBusy in its router; todos relies on the app-wide handler
+        res = c.post("/tools/sentiment/analyze", json={"text": "good"}, headers=headers)
+        assert res.status_code == 503 and res.json()["detail"]["error"]["message"] == "tool_busy"
+        res = c.post("/tools/todos/create", json={"title": "x"}, headers=headers)
+        assert res.status_code == 503 and res.headers["Retry-After"] == "1"
+        assert res.json()["detail"]["error"]["code"] == "tool_busy"
+        stats = c.get("/tools/stats").json()["features"]
+        assert stats["sentiment"]["busy"] == 1 and stats["todos"]["busy"] == 1
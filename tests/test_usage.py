@@ -0,0 +1,147 @@
+import asyncio, threading
+
+import pytest
+from sqlalchemy import text
+
+from app.shared import usage
+
+
+@pytest.fixture
+def meter(db):
+    m = usage.UsageMeter(flush_s=60, max_pending_tasks=1000, cache_s=60)
+    yield m
+    db.execute(text("DELETE FROM user_usage WHERE user_id LIKE 'meter-%'"))
+    db.commit()
+
+
+def test_debits_are_served_from_memory_and_flushed_as_one_upsert(db, meter):
+    db.execute(text("INSERT INTO user_usage (user_id, day, tasks, tokens) VALUES ('meter-a', :d, 2, 200)"),
+               {"d": usage.today()})
+    db.commit()
+    assert meter.get(db, "meter-a") == {"tasks": 2, "tokens": 200}
+
+    def _bill(n: int):
+        for _ in range(n):
+            meter.debit("meter-a", tasks=1, tokens=10)
+
+    threads = [threading.Thread(target=_bill, args=(250,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    meter.debit("meter-b", tasks=1, tokens=5)
+
+    # the quota view includes the unflushed debits; the table does not have them yet
+    assert meter.get(db, "meter-a") == {"tasks": 1002, "tokens": 10200}
+    assert usage.read(db, "meter-a") == {"tasks": 2, "tokens": 200}
+
+    assert asyncio.run(meter.flush()) == 2  # one row per user/day, not one per call
+    db.expire_all()
+    assert usage.read(db, "meter-a") == {"tasks": 1002, "tokens": 10200}
+    assert usage.read(db, "meter-b") == {"tasks": 1, "tokens": 5}
+    assert meter.get(db, "meter-a") == {"tasks": 1002, "tokens": 10200}  # no double count after the flush
+    assert meter.stats()["pending_tasks"] == 0 and meter.counts["loads"] == 1
+
+
+def test_pending_bound_triggers_an_early_flush(db, meter):
+    meter.max_pending_tasks = 5
+
+    async def _run():
+        for _ in range(5):
+            meter.debit("meter-c", tasks=1, tokens=1)
+        for _ in range(100):  # well before the 60 s interval
+            if meter.counts["flushes"]:
+                break
+            await asyncio.sleep(0.01)
+        await meter.stop()
+
+    asyncio.run(_run())
+    assert meter.counts["flushes"] == 1
+    assert usage.read(db, "meter-c") == {"tasks": 5, "tokens": 5}
+
+
+def test_failed_flush_keeps_the_deltas(db, meter, monkeypatch):
+    meter.debit("meter-d", tasks=3, tokens=30)
+    monkeypatch.setattr(usage, "_UPSERT", text("INSERT INTO no_such_table VALUES (:u, :d, :t, :k)"))
+    with pytest.raises(Exception):
+        asyncio.run(meter.flush())
+    assert meter.stats()["pending_tasks"] == 3 and meter.counts["errors"] == 1
+    monkeypatch.undo()
+    assert asyncio.run(meter.flush()) == 1
+    assert usage.read(db, "meter-d") == {"tasks": 3, "tokens": 30}
+
+
+def test_a_read_overlapping_a_flush_does_not_replace_the_base(db, meter, monkeypatch):
+    meter.debit("meter-e", tasks=4, tokens=40)
+    real = usage.read_async
+
+    async def _read_then_flush(adb, user_id, day=None):
+        persisted = await real(adb, user_id, day)  # before the flush commits the 4 tasks...
+        await meter.flush()  # ...which lands before the read is used
+        return persisted
+
+    async def _run():
+        from app.shared.db import AsyncSessionLocal
+        monkeypatch.setattr(usage, "read_async", _read_then_flush)
+        async with AsyncSessionLocal() as adb:
+            first = await meter.get_async(adb, "meter-e")
+        monkeypatch.undo()
+        return first
+
+    assert asyncio.run(_run()) == {"tasks": 4, "tokens": 40}  # not 0: the flush's base won
+    assert meter.counts["stale_loads"] == 1 and meter.counts["loads"] == 0
+
+
+def test_holds_are_reserved_atomically_and_settled_once(db, meter):
+    holds = []
+
+    def _reserve():
+        for _ in range(50):
+            hold, _ = meter.reserve("meter-f", 1, 100, max_tasks=20, max_tokens=10**6)
+            if hold is not None:
+                holds.append(hold)
+
+    threads = [threading.Thread(target=_reserve) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(holds) == 20 and meter.counts["rejected"] == 180
+    assert meter.get(db, "meter-f") == {"tasks": 20, "tokens": 2000}  # held counts as used
+
+    meter.settle(holds[0], tasks=1, tokens=40)  # billed what it cost
+    meter.settle(holds[0], tasks=1, tokens=40)  # a second settle is a no-op
+    for h in holds[1:]:
+        meter.settle(h)  # refunded
+    assert meter.get(db, "meter-f") == {"tasks": 1, "tokens": 40}
+    assert meter.stats()["held_users"] == 0 and meter.stats()["pending_tasks"] == 1
+
+
+def test_concurrent_guarded_calls_cannot_overshoot_the_quota(db, monkeypatch):
+    import httpx
+    from app.main import app
+    from app.shared import guard
+    from app.shared.auth import issue_dev_token
+    from app.tools import executor
+
+    async def _slow_create(user_id: str, title: str, **kw):
+        await asyncio.sleep(0.05)
+        return {"title": title}
+
+    h = executor.resolve("todos.create")
+    monkeypatch.setattr(h, "fn", _slow_create)
+    monkeypatch.setattr(h, "is_async", True)
+    monkeypatch.setattr(guard.settings, "FREE_TASK_LIMIT", 3)
+    headers = {"Authorization": f"Bearer {issue_dev_token('meter-race', tier='free')}"}
+
+    async def _run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            res = await asyncio.gather(*(c.post("/tools/todos/create", json={"title": f"t{i}"}, headers=headers)
+                                         for i in range(8)))
+            await usage.get_meter().flush()
+        return sorted(r.status_code for r in res)
+
+    assert asyncio.run(_run()) == [200] * 3 + [402] * 5
+    assert usage.read(db, "meter-race")["tasks"] == 3
+    db.execute(text("DELETE FROM user_usage WHERE user_id = 'meter-race'"))
+    db.commit()